@@ -0,0 +1,48 @@
+"""render placeholder images on request
+
+Revision ID: 09dd88082f8b
+Revises: 94404b2e4890
+Create Date: 2026-10-19 10:12:41.318205
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "09dd88082f8b"
+down_revision: Union[str, Sequence[str], None] = "94404b2e4890"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "products",
+        sa.Column(
+            "image_is_placeholder",
+            sa.Boolean(),
+            nullable=False,
+            server_default=sa.false(),
+        ),
+    )
+
+    # Stored placeholders are replaced by ones rendered on request
+    op.execute(
+        "UPDATE products SET image_data = NULL, image_mime_type = NULL, "
+        "image_filename = NULL, image_is_placeholder = 1 "
+        "WHERE image_filename LIKE 'placeholder\\_%' ESCAPE '\\'"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema.
+
+    Products that showed a placeholder are left without an image.
+    """
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.drop_column("image_is_placeholder")
@@ -0,0 +1,170 @@
+"""deduplicate product images
+
+Revision ID: 21ab61ffa4d9
+Revises: 986387d4c8e3
+Create Date: 2026-10-19 13:05:22.184730
+
+"""
+
+import hashlib
+import io
+from datetime import UTC, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from PIL import Image
+
+
+# revision identifiers, used by Alembic.
+revision: str = "21ab61ffa4d9"
+down_revision: Union[str, Sequence[str], None] = "986387d4c8e3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Copied from app.models and app.images as they were at this revision, so
+# later changes there don't change what replaying it does
+IMAGE_BLOB_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS image_blob_ref_insert
+    AFTER INSERT ON products WHEN NEW.image_blob_id IS NOT NULL
+    BEGIN
+        UPDATE image_blobs SET ref_count = ref_count + 1
+        WHERE id = NEW.image_blob_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS image_blob_ref_update
+    AFTER UPDATE OF image_blob_id ON products
+    WHEN OLD.image_blob_id IS NOT NEW.image_blob_id
+    BEGIN
+        UPDATE image_blobs SET ref_count = ref_count + 1
+        WHERE id = NEW.image_blob_id;
+        UPDATE image_blobs SET ref_count = ref_count - 1
+        WHERE id = OLD.image_blob_id;
+        DELETE FROM image_blobs WHERE id = OLD.image_blob_id AND ref_count <= 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS image_blob_ref_delete
+    AFTER DELETE ON products WHEN OLD.image_blob_id IS NOT NULL
+    BEGIN
+        UPDATE image_blobs SET ref_count = ref_count - 1
+        WHERE id = OLD.image_blob_id;
+        DELETE FROM image_blobs WHERE id = OLD.image_blob_id AND ref_count <= 0;
+    END
+    """,
+]
+
+
+def perceptual_hash(image: Image.Image) -> str:
+    """64-bit difference hash (dHash) as 16 hex digits"""
+    pixels = image.convert("L").resize((9, 8), Image.Resampling.BOX).tobytes()
+    bits = 0
+    for row in range(8):
+        for column in range(8):
+            left, right = pixels[row * 9 + column], pixels[row * 9 + column + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:016x}"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "image_blobs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("sha256", sa.String(), nullable=False),
+        sa.Column("phash", sa.String(), nullable=True),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("sha256"),
+    )
+    op.create_index(
+        op.f("ix_image_blobs_phash"), "image_blobs", ["phash"], unique=False
+    )
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.add_column(sa.Column("image_blob_id", sa.Integer(), nullable=True))
+        batch_op.create_index(
+            batch_op.f("ix_products_image_blob_id"), ["image_blob_id"], unique=False
+        )
+        batch_op.create_foreign_key(
+            "fk_products_image_blob_id", "image_blobs", ["image_blob_id"], ["id"]
+        )
+
+    # Move every stored image into image_blobs, one copy per distinct content
+    connection = op.get_bind()
+    ids = connection.execute(
+        sa.text("SELECT id FROM products WHERE image_data IS NOT NULL")
+    ).scalars()
+    for product_id in list(ids):
+        data = connection.execute(
+            sa.text("SELECT image_data FROM products WHERE id = :id"),
+            {"id": product_id},
+        ).scalar_one()
+        digest = hashlib.sha256(data).hexdigest()
+        try:
+            phash = perceptual_hash(Image.open(io.BytesIO(data)))
+        except OSError:
+            phash = None
+
+        connection.execute(
+            sa.text(
+                "INSERT INTO image_blobs "
+                "(sha256, phash, size, ref_count, data, created_at) "
+                "VALUES (:sha256, :phash, :size, 0, :data, :created_at) "
+                "ON CONFLICT (sha256) DO NOTHING"
+            ),
+            {
+                "sha256": digest,
+                "phash": phash,
+                "size": len(data),
+                "data": data,
+                "created_at": datetime.now(UTC).replace(tzinfo=None),
+            },
+        )
+        connection.execute(
+            sa.text(
+                "UPDATE products SET image_blob_id = "
+                "(SELECT id FROM image_blobs WHERE sha256 = :sha256) WHERE id = :id"
+            ),
+            {"sha256": digest, "id": product_id},
+        )
+
+    connection.execute(
+        sa.text(
+            "UPDATE image_blobs SET ref_count = "
+            "(SELECT count(*) FROM products WHERE image_blob_id = image_blobs.id)"
+        )
+    )
+
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.drop_column("image_data")
+
+    # After the batch rebuild, which would drop triggers on the old table
+    for trigger in IMAGE_BLOB_TRIGGERS:
+        op.execute(trigger)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name in ("insert", "update", "delete"):
+        op.execute(f"DROP TRIGGER IF EXISTS image_blob_ref_{name}")
+
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.add_column(sa.Column("image_data", sa.LargeBinary(), nullable=True))
+
+    op.execute(
+        "UPDATE products SET image_data = "
+        "(SELECT data FROM image_blobs WHERE image_blobs.id = products.image_blob_id)"
+    )
+
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.drop_constraint("fk_products_image_blob_id", type_="foreignkey")
+        batch_op.drop_index(batch_op.f("ix_products_image_blob_id"))
+        batch_op.drop_column("image_blob_id")
+
+    op.drop_index(op.f("ix_image_blobs_phash"), table_name="image_blobs")
+    op.drop_table("image_blobs")
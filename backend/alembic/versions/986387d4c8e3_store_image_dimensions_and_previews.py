@@ -0,0 +1,80 @@
+"""store image dimensions and previews
+
+Revision ID: 986387d4c8e3
+Revises: 09dd88082f8b
+Create Date: 2026-10-19 11:40:07.552914
+
+"""
+
+import base64
+import io
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from PIL import Image
+
+
+# revision identifiers, used by Alembic.
+revision: str = "986387d4c8e3"
+down_revision: Union[str, Sequence[str], None] = "09dd88082f8b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PREVIEW_SIZE = 16
+
+
+def render_preview(image: Image.Image) -> str:
+    """app.images.render_preview as it was at this revision, so later
+    changes there don't change what replaying it does"""
+    has_alpha = "A" in image.mode or "transparency" in image.info
+    thumb = image.convert("RGBA" if has_alpha else "RGB")
+    thumb.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE), Image.Resampling.BOX)
+
+    buffer = io.BytesIO()
+    thumb.save(buffer, format="WEBP", quality=40)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("products", sa.Column("image_width", sa.Integer(), nullable=True))
+    op.add_column("products", sa.Column("image_height", sa.Integer(), nullable=True))
+    op.add_column("products", sa.Column("image_preview", sa.String(), nullable=True))
+
+    # Backfill images stored before previews were computed at ingestion
+    connection = op.get_bind()
+    ids = connection.execute(
+        sa.text("SELECT id FROM products WHERE image_data IS NOT NULL")
+    ).scalars()
+    for product_id in list(ids):
+        image_data = connection.execute(
+            sa.text("SELECT image_data FROM products WHERE id = :id"),
+            {"id": product_id},
+        ).scalar_one()
+        try:
+            image = Image.open(io.BytesIO(image_data))
+            image.load()
+        except OSError:
+            continue  # Undecodable; served as-is without a preview
+
+        connection.execute(
+            sa.text(
+                "UPDATE products SET image_width = :width, image_height = :height, "
+                "image_preview = :preview WHERE id = :id"
+            ),
+            {
+                "id": product_id,
+                "width": image.width,
+                "height": image.height,
+                "preview": render_preview(image),
+            },
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.drop_column("image_preview")
+        batch_op.drop_column("image_height")
+        batch_op.drop_column("image_width")
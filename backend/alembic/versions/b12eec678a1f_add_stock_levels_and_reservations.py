@@ -0,0 +1,71 @@
+"""add stock levels and reservations
+
+Revision ID: b12eec678a1f
+Revises: 21ab61ffa4d9
+Create Date: 2026-10-19 12:10:42.318204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlmodel.sql.sqltypes import AutoString
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b12eec678a1f"
+down_revision: Union[str, Sequence[str], None] = "21ab61ffa4d9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "stock_levels",
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("on_hand", sa.Integer(), nullable=False),
+        sa.Column("reserved", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.CheckConstraint("reserved >= 0 AND reserved <= on_hand", name="stock_held"),
+        sa.ForeignKeyConstraint(
+            ["product_id"],
+            ["products.id"],
+        ),
+        sa.PrimaryKeyConstraint("product_id"),
+    )
+    op.create_table(
+        "stock_reservations",
+        sa.Column("id", AutoString(), nullable=False),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column(
+            "status",
+            sa.Enum(
+                "HELD", "COMMITTED", "RELEASED", "EXPIRED", name="reservationstatus"
+            ),
+            nullable=False,
+        ),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["product_id"],
+            ["products.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_stock_reservations_held",
+        "stock_reservations",
+        ["product_id", "status", "expires_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_stock_reservations_held", table_name="stock_reservations")
+    op.drop_table("stock_reservations")
+    op.drop_table("stock_levels")
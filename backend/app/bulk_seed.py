@@ -0,0 +1,330 @@
+"""
+Bulk-load mode for seeding large catalogs.
+
+    python -m app.seed --bulk [--file catalog.json] [--skip-images]
+
+The regular seeder goes through the ORM one product at a time, which is fine
+for products.json but slow for a large catalog. This mode streams the file
+(a JSON array or JSON Lines) instead of loading it whole. Categories, products
+and delivery-option links are written in a single transaction, using
+executemany and set-based INSERT ... SELECT, under PRAGMAs tuned for a one-off
+load. Existing products are left untouched, and images are only fetched for
+products that don't have one yet.
+"""
+
+import json
+import time
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from sqlalchemy import Engine
+from sqlmodel import Session, SQLModel
+
+from .image_ingest import ImageFetcher
+from .seed import DELIVERY_OPTION_SPECS, seed_product_images
+
+BULK_BATCH_SIZE = 5000
+READ_CHUNK_SIZE = 64 * 1024
+
+# Safe for a load that is simply rerun if the machine dies midway
+BULK_PRAGMAS = [
+    "PRAGMA synchronous=OFF",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-262144",  # 256MB
+]
+# Connection defaults from db.create_db_and_tables, restored afterwards
+RESTORE_PRAGMAS = [
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=DEFAULT",
+    "PRAGMA cache_size=10000",
+]
+
+_SEPARATORS = " \t\r\n,"
+
+
+@dataclass
+class BulkSeedReport:
+    products_read: int = 0
+    products_inserted: int = 0
+    categories_created: int = 0
+    links_inserted: int = 0
+    images_requested: int = 0
+    load_seconds: float = 0.0
+
+    @property
+    def products_per_second(self) -> float:
+        return self.products_read / self.load_seconds if self.load_seconds else 0.0
+
+
+def iter_json_array(f: TextIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """Yield the objects of a top-level JSON array, reading chunk_size
+    characters at a time rather than parsing the whole document."""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array of products")
+
+    pos = 1
+    while True:
+        while pos < len(buffer) and buffer[pos] in _SEPARATORS:
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+
+        try:
+            if pos == len(buffer):
+                raise json.JSONDecodeError("Need more input", buffer, pos)
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # The next item straddles the chunk boundary
+            more = f.read(chunk_size)
+            if not more:
+                raise ValueError("Truncated JSON array of products")
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+        yield item
+
+
+def iter_products_file(path: Path) -> Iterator[Dict[str, Any]]:
+    """Stream products from a JSON array or a JSON Lines file"""
+    with open(path, encoding="utf-8") as f:
+        start = f.read(READ_CHUNK_SIZE).lstrip()
+        f.seek(0)
+        if start.startswith("["):
+            yield from iter_json_array(f)
+        else:
+            decoder = json.JSONDecoder()
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield decoder.raw_decode(line)[0]
+
+
+def bulk_seed_database(
+    db_engine: Engine,
+    path: Path,
+    with_images: bool = True,
+    fetcher: Optional[ImageFetcher] = None,
+    batch_size: int = BULK_BATCH_SIZE,
+) -> BulkSeedReport:
+    """Load every product in `path` in one transaction, then fetch missing
+    images. Rerunning with the same file is a no-op apart from images that
+    still failed to download."""
+    return bulk_load_products(
+        db_engine, iter_products_file(path), with_images, fetcher, batch_size
+    )
+
+
+def bulk_load_products(
+    db_engine: Engine,
+    products: Iterable[Dict[str, Any]],
+    with_images: bool = True,
+    fetcher: Optional[ImageFetcher] = None,
+    batch_size: int = BULK_BATCH_SIZE,
+) -> BulkSeedReport:
+    """Bulk-load product dicts in the products.json shape.
+
+    A product may list its delivery options by name under "delivery_options";
+    if none do, options are assigned the way the regular seeder assigns them.
+    """
+    SQLModel.metadata.create_all(db_engine)
+    report = BulkSeedReport()
+    image_jobs: List[Dict[str, Any]] = []
+    start = time.perf_counter()
+
+    raw_connection = db_engine.raw_connection()
+    conn = raw_connection.driver_connection
+    assert conn is not None
+    try:
+        for pragma in BULK_PRAGMAS:
+            conn.execute(pragma)
+        conn.execute("BEGIN IMMEDIATE")
+
+        categories: Dict[str, int] = dict(
+            conn.execute("SELECT name, id FROM categories").fetchall()
+        )
+        # Products that already have an image; placeholders are retried
+        with_image = {
+            row[0]
+            for row in conn.execute(
+                "SELECT id FROM products WHERE image_blob_id IS NOT NULL"
+            )
+        }
+        # Building indexes once at the end beats updating them per row
+        (has_products,) = conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM products)"
+        ).fetchone()
+        dropped_indexes = [] if has_products else _drop_indexes(conn, "products")
+        now = f"{datetime.now(UTC):%Y-%m-%d %H:%M:%S.%f}"
+        option_ids = _ensure_delivery_options(conn, DELIVERY_OPTION_SPECS, now)
+
+        batch: List[Tuple[Any, ...]] = []
+        links: List[Tuple[int, int]] = []
+        explicit_links = False
+        for product in products:
+            report.products_read += 1
+            category_name = product["category"]
+            category_id = categories.get(category_name)
+            if category_id is None:
+                cursor = conn.execute(
+                    "INSERT INTO categories (name, created_at, updated_at) "
+                    "VALUES (?, ?, ?)",
+                    (category_name, now, now),
+                )
+                category_id = categories[category_name] = cursor.lastrowid or 0
+                report.categories_created += 1
+
+            batch.append(
+                (
+                    product["id"],
+                    product["title"],
+                    product["description"],
+                    float(product["price"]),
+                    category_id,
+                    now,
+                    now,
+                )
+            )
+            if "delivery_options" in product:
+                explicit_links = True
+                for name in product["delivery_options"]:
+                    if name not in option_ids:
+                        raise ValueError(f"Unknown delivery option: {name}")
+                    links.append((product["id"], option_ids[name]))
+            if product.get("image") and product["id"] not in with_image:
+                image_jobs.append({"id": product["id"], "image": product["image"]})
+
+            if len(batch) >= batch_size:
+                report.products_inserted += _insert_products(conn, batch)
+                report.links_inserted += _insert_links(conn, links)
+                batch.clear()
+                links.clear()
+
+        report.products_inserted += _insert_products(conn, batch)
+        report.links_inserted += _insert_links(conn, links)
+        for create_index in dropped_indexes:
+            conn.execute(create_index)
+        if not explicit_links:
+            report.links_inserted = _assign_delivery_options(conn, option_ids)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        for pragma in RESTORE_PRAGMAS:
+            conn.execute(pragma)
+        raw_connection.close()
+
+    report.load_seconds = time.perf_counter() - start
+    print(
+        f"Loaded {report.products_read} products "
+        f"({report.products_inserted} new, "
+        f"{report.categories_created} new categories) in "
+        f"{report.load_seconds:.2f}s - {report.products_per_second:,.0f} products/s"
+    )
+
+    if with_images and image_jobs:
+        report.images_requested = len(image_jobs)
+        with Session(db_engine) as session:
+            seed_product_images(session, image_jobs, fetcher)
+
+    return report
+
+
+def _drop_indexes(conn: Any, table: str) -> List[str]:
+    """Drop the table's secondary indexes; return the SQL to recreate them"""
+    indexes = conn.execute(
+        "SELECT name, sql FROM sqlite_master "
+        "WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+        (table,),
+    ).fetchall()
+    for name, _ in indexes:
+        conn.execute(f'DROP INDEX "{name}"')
+    return [sql for _, sql in indexes]
+
+
+def _insert_products(conn: Any, rows: List[Tuple[Any, ...]]) -> int:
+    if not rows:
+        return 0
+    cursor = conn.executemany(
+        "INSERT INTO products (id, title, description, price, category_id, "
+        "is_saved, image_is_placeholder, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, 0, 0, ?, ?) ON CONFLICT (id) DO NOTHING",
+        rows,
+    )
+    return cursor.rowcount
+
+
+def _insert_links(conn: Any, rows: List[Tuple[int, int]]) -> int:
+    if not rows:
+        return 0
+    cursor = conn.executemany(
+        "INSERT INTO product_delivery_options (product_id, delivery_option_id) "
+        "VALUES (?, ?) ON CONFLICT DO NOTHING",
+        rows,
+    )
+    return cursor.rowcount
+
+
+def _ensure_delivery_options(
+    conn: Any, specs: List[Dict[str, Any]], now: str
+) -> Dict[str, int]:
+    """Insert any missing seed delivery options; return ids by name"""
+    existing = dict(conn.execute("SELECT name, id FROM delivery_options").fetchall())
+    columns = [
+        column.name
+        for column in SQLModel.metadata.tables["delivery_options"].columns
+        if column.name != "id"
+    ]
+    defaults = {"created_at": now, "updated_at": now}
+    missing = [
+        tuple(
+            # Enums are stored by name
+            spec[column].name
+            if column == "speed"
+            else spec.get(column, defaults.get(column))
+            for column in columns
+        )
+        for spec in specs
+        if spec["name"] not in existing
+    ]
+    if missing:
+        conn.executemany(
+            f"INSERT INTO delivery_options ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})",
+            missing,
+        )
+        existing = dict(
+            conn.execute("SELECT name, id FROM delivery_options").fetchall()
+        )
+    return {spec["name"]: existing[spec["name"]] for spec in specs}
+
+
+def _assign_delivery_options(conn: Any, option_ids: Dict[str, int]) -> int:
+    """Set-based version of seed.assign_delivery_options_to_products: every
+    product gets Standard and Express, the lowest third of ids Next Day and
+    the lowest fifth Same Day as well."""
+    (product_count,) = conn.execute("SELECT count(*) FROM products").fetchone()
+    conn.execute(
+        f"DELETE FROM product_delivery_options WHERE delivery_option_id IN "
+        f"({', '.join('?' for _ in option_ids)})",
+        list(option_ids.values()),
+    )
+
+    links = 0
+    for name, limit in (
+        ("Standard Shipping", -1),
+        ("Express Delivery", -1),
+        ("Next Day Delivery", max(1, product_count // 3)),
+        ("Same Day Delivery", max(1, product_count // 5)),
+    ):
+        cursor = conn.execute(
+            "INSERT INTO product_delivery_options (product_id, delivery_option_id) "
+            "SELECT id, ? FROM products ORDER BY id LIMIT ?",
+            (option_ids[name], limit),
+        )
+        links += cursor.rowcount
+    return links
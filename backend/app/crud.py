@@ -1,8 +1,22 @@
-from sqlmodel import Session, select
-from typing import List, Optional, Union
-from .models import Product, Category
+from sqlmodel import Session, col, select
+from sqlalchemy import Row, bindparam, func, update
+from sqlalchemy import select as sa_select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import UTC, datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from pathlib import Path
+import hashlib
+import json
+import sqlite3
+from .models import (
+    Category,
+    DeliveryOption,
+    ImageBlob,
+    Product,
+    ProductDeliveryLink,
+)
 from .schemas import ProductCreate, ProductUpdate, CategoryCreate
-import requests
+from .images import EncodedImage, ImageMeta, perceptual_hash, render_preview
 from PIL import Image
 import io
 
@@ -37,19 +51,312 @@ def create_product(session: Session, product: ProductCreate) -> Product:
     return db_product
 
 
-def get_products(session: Session, category_id: Optional[int] = None) -> List[Product]:
-    from sqlmodel import select
+# What a listing shows of a product and its category; never the image data
+PRODUCT_LISTING_COLUMNS: Tuple[Any, ...] = (
+    col(Product.id),
+    col(Product.title),
+    col(Product.description),
+    col(Product.price),
+    col(Product.category_id),
+    col(Product.is_saved),
+    col(Product.created_at),
+    col(Product.updated_at),
+    col(Product.image_blob_id),
+    col(Product.image_is_placeholder),
+    col(Product.image_width),
+    col(Product.image_height),
+    col(Product.image_preview),
+    col(Category.name).label("category_name"),
+    col(Category.created_at).label("category_created_at"),
+    col(Category.updated_at).label("category_updated_at"),
+)
+
+
+def list_products(
+    session: Session,
+    category_id: Optional[int] = None,
+    delivery_option_id: Optional[int] = None,
+    sort: Optional[str] = None,
+    with_delivery_option_ids: bool = False,
+) -> Sequence[Row]:
+    """Listing rows of PRODUCT_LISTING_COLUMNS, in one column-only query
+    that builds no ORM objects.
+
+    sort is price_asc, price_desc, delivery_fastest (by the fastest active
+    option, then price), created_desc, or None for table order. With
+    with_delivery_option_ids, each row's delivery_option_ids holds its
+    product's option ids, comma-separated, or None.
+    """
+    link_product_id = col(ProductDeliveryLink.product_id)
+    link_option_id = col(ProductDeliveryLink.delivery_option_id)
+    columns: List[Any] = list(PRODUCT_LISTING_COLUMNS)
+    if with_delivery_option_ids:
+        columns.append(
+            sa_select(func.group_concat(link_option_id))
+            .where(link_product_id == col(Product.id))
+            .scalar_subquery()
+            .label("delivery_option_ids")
+        )
+    stmt = sa_select(*columns).join(
+        Category, col(Category.id) == col(Product.category_id)
+    )
 
-    statement = select(Product).join(Category)
     if category_id:
-        statement = statement.where(Product.category_id == category_id)
-    return list(session.exec(statement).all())
+        stmt = stmt.where(col(Product.category_id) == category_id)
+    if delivery_option_id:
+        # A semi-join, so products aren't repeated per matching link
+        stmt = stmt.where(
+            col(Product.id).in_(
+                sa_select(link_product_id).where(link_option_id == delivery_option_id)
+            )
+        )
+
+    if sort == "delivery_fastest":
+        fastest_days = (
+            sa_select(func.min(DeliveryOption.estimated_days_min))
+            .join(
+                ProductDeliveryLink,
+                link_option_id == col(DeliveryOption.id),
+            )
+            .where(link_product_id == col(Product.id), col(DeliveryOption.is_active))
+            .scalar_subquery()
+        )
+        stmt = stmt.order_by(fastest_days.asc().nulls_last(), col(Product.price).asc())
+    elif sort == "price_asc":
+        stmt = stmt.order_by(col(Product.price).asc())
+    elif sort == "price_desc":
+        stmt = stmt.order_by(col(Product.price).desc())
+    elif sort is not None:  # created_desc
+        stmt = stmt.order_by(col(Product.created_at).desc())
+
+    return session.connection().execute(stmt).all()
+
+
+# The cart's distinct product ids, bound as one JSON array. An IN list binds
+# a parameter per id, which SQLAlchemy renders afresh on every execution;
+# that and building the statements per call cost more than running them.
+_cart_product_ids = sa_select(
+    func.json_each(bindparam("product_ids")).table_valued("value").c.value
+)
+CART_PRODUCTS = sa_select(
+    col(Product.id), col(Product.title), col(Product.price)
+).where(col(Product.id).in_(_cart_product_ids))
+_option_ids_shared_by_cart = (
+    sa_select(col(ProductDeliveryLink.delivery_option_id))
+    .where(col(ProductDeliveryLink.product_id).in_(_cart_product_ids))
+    .group_by(col(ProductDeliveryLink.delivery_option_id))
+    .having(func.count() == bindparam("product_count"))
+)
+COMMON_DELIVERY_OPTIONS = select(DeliveryOption).where(
+    col(DeliveryOption.is_active),
+    col(DeliveryOption.id).in_(_option_ids_shared_by_cart),
+)
+
+
+def _cart_params(product_ids: Sequence[int]) -> Dict[str, Any]:
+    distinct_ids = sorted(set(product_ids))
+    return {"product_ids": json.dumps(distinct_ids), "product_count": len(distinct_ids)}
+
+
+def get_cart_products(session: Session, product_ids: Sequence[int]) -> Sequence[Row]:
+    """(id, title, price) of each of the products that exist, in one query"""
+    return session.connection().execute(CART_PRODUCTS, _cart_params(product_ids)).all()
+
+
+def get_common_delivery_options(
+    session: Session, product_ids: Sequence[int]
+) -> List[DeliveryOption]:
+    """The active delivery options linked to every one of the products"""
+    return list(
+        session.exec(COMMON_DELIVERY_OPTIONS, params=_cart_params(product_ids)).all()
+    )
 
 
 def get_product(session: Session, product_id: int) -> Optional[Product]:
     return session.get(Product, product_id)
 
 
+def get_product_image_meta(session: Session, product_id: int) -> Optional[ImageMeta]:
+    """Return image metadata without loading the BLOB.
+
+    Returns None if the product doesn't exist;
+    a size of 0 means the product has no image, unless it's a placeholder.
+    """
+    statement = (
+        select(
+            Product.image_mime_type,
+            Product.image_filename,
+            func.coalesce(ImageBlob.size, 0),
+            Product.updated_at,
+        )
+        .join(ImageBlob, isouter=True)
+        .where(Product.id == product_id)
+    )
+    row = session.exec(statement).first()
+    if row is None:
+        return None
+
+    mime_type, filename, size, updated_at = row
+    if not size and _is_placeholder(session, product_id):
+        return ImageMeta(
+            product_id=product_id,
+            mime_type="image/png",
+            filename=f"placeholder_{product_id}.png",
+            size=0,
+            version=f"{updated_at:%Y%m%d%H%M%S%f}-placeholder",
+            placeholder=True,
+        )
+
+    return ImageMeta(
+        product_id=product_id,
+        mime_type=mime_type or "image/jpeg",
+        filename=filename or f"product_{product_id}.jpg",
+        size=size,
+        version=f"{updated_at:%Y%m%d%H%M%S%f}-{size}",
+    )
+
+
+def _is_placeholder(session: Session, product_id: int) -> bool:
+    statement = select(Product.image_is_placeholder).where(Product.id == product_id)
+    return bool(session.exec(statement).first())
+
+
+def get_product_image_data(session: Session, product_id: int) -> Optional[bytes]:
+    statement = (
+        select(ImageBlob.data)
+        .join(Product, col(Product.image_blob_id) == ImageBlob.id)
+        .where(Product.id == product_id)
+    )
+    return session.exec(statement).first()
+
+
+def store_image_blob(session: Session, data: bytes, phash: Optional[str] = None) -> int:
+    """Return the id of the blob holding `data`, inserting it if no product
+    has this image yet. Point a product's image_blob_id at it to use it; the
+    reference count follows automatically."""
+    digest = hashlib.sha256(data).hexdigest()
+    existing = select(ImageBlob.id).where(ImageBlob.sha256 == digest)
+    blob_id = session.exec(existing).first()
+    if blob_id is not None:
+        return blob_id
+
+    # A concurrent writer may store the same image first; keep theirs
+    session.exec(
+        sqlite_insert(ImageBlob)
+        .values(
+            sha256=digest,
+            phash=phash,
+            size=len(data),
+            ref_count=0,
+            data=data,
+            created_at=datetime.now(UTC),
+        )
+        .on_conflict_do_nothing(index_elements=["sha256"])
+    )
+    blob_id = session.exec(existing).one()
+    assert blob_id is not None
+    return blob_id
+
+
+def get_product_placeholder_text(
+    session: Session, product_id: int
+) -> Optional[Tuple[str, Optional[str]]]:
+    """(title, category name) drawn on a product's placeholder image"""
+    statement = (
+        select(Product.title, Category.name)
+        .join(Category, isouter=True)
+        .where(Product.id == product_id)
+    )
+    row = session.exec(statement).first()
+    return (row[0], row[1]) if row else None
+
+
+IMAGE_CHUNK_SIZE = 64 * 1024
+
+
+def iter_product_image(
+    session: Session,
+    product_id: int,
+    start: int = 0,
+    length: Optional[int] = None,
+    chunk_size: int = IMAGE_CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """Stream a product image in fixed-size chunks via SQLite incremental blob
+    I/O, so memory per request is bounded by chunk_size, not the image size.
+
+    The returned iterator opens its own read-only connection: it runs after the
+    request session is closed and would otherwise pin a pooled connection for
+    the whole transfer.
+    """
+    blob_id = session.exec(
+        select(Product.image_blob_id).where(Product.id == product_id)
+    ).first()
+    if blob_id is None:
+        return iter([])
+
+    database = session.get_bind().engine.url.database
+    if not database or database == ":memory:":
+        # No file to reopen; fall back to reading the value in one go
+        image_data = get_product_image_data(session, product_id) or b""
+        end = len(image_data) if length is None else start + length
+        return iter([image_data[start:end]])
+
+    database_uri = f"{Path(database).resolve().as_uri()}?mode=ro"
+
+    def chunks() -> Iterator[bytes]:
+        # Iteration hops between threadpool threads, hence check_same_thread
+        conn = sqlite3.connect(database_uri, uri=True, check_same_thread=False)
+        # Blob pages are read once, sequentially; a small page cache keeps
+        # RSS flat however many streams are open
+        conn.execute("PRAGMA cache_size=-64")
+        try:
+            with conn.blobopen("image_blobs", "data", blob_id, readonly=True) as blob:
+                blob.seek(start)
+                remaining = len(blob) - start if length is None else length
+                while remaining > 0:
+                    chunk = blob.read(min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+        finally:
+            conn.close()
+
+    return chunks()
+
+
+def set_product_image(
+    session: Session,
+    product_id: int,
+    image: EncodedImage,
+    mime_type: str,
+    filename: str,
+) -> bool:
+    """Replace a product's image. Bumps updated_at so cached variants of the
+    old image are no longer used. Returns False if the product doesn't exist."""
+    if not session.get(Product, product_id):
+        return False
+
+    blob_id = store_image_blob(session, image.data, image.phash)
+    statement = (
+        update(Product)
+        .where(col(Product.id) == product_id)
+        .values(
+            image_blob_id=blob_id,
+            image_width=image.width,
+            image_height=image.height,
+            image_preview=image.preview,
+            image_mime_type=mime_type,
+            image_filename=filename,
+            image_is_placeholder=False,
+            updated_at=datetime.now(UTC),
+        )
+    )
+    result = session.exec(statement)
+    session.commit()
+    return result.rowcount > 0
+
+
 def update_product(
     session: Session, product_id: int, product_update: ProductUpdate
 ) -> Optional[Product]:
@@ -82,101 +389,22 @@ def delete_product(session: Session, product_id: int) -> bool:
     return True
 
 
-def create_placeholder_image(session: Session, product: Product) -> bool:
-    """Create a placeholder image for the product"""
-    try:
-        from PIL import ImageDraw, ImageFont
-
-        # Create a simple placeholder image with beige background (sand.100)
-        width, height = 300, 300
-        image = Image.new("RGB", (width, height), color=(245, 245, 244))
-        draw = ImageDraw.Draw(image)
-
-        # Draw a border
-        draw.rectangle(
-            [10, 10, width - 10, height - 10], outline=(200, 200, 200), width=2
-        )
-
-        # Add text (product title truncated)
-        title = product.title[:30] + "..." if len(product.title) > 30 else product.title
-
-        # Try to use a font, fallback to default if not available
-        try:
-            font: Union[ImageFont.FreeTypeFont, ImageFont.ImageFont] = (
-                ImageFont.truetype("Arial", 16)
-            )
-        except OSError:
-            font = ImageFont.load_default()
-
-        # Calculate text position (center it)
-        text_bbox = draw.textbbox((0, 0), title, font=font)
-        text_width = text_bbox[2] - text_bbox[0]
-        text_height = text_bbox[3] - text_bbox[1]
-        x = (width - text_width) // 2
-        y = (height - text_height) // 2
-
-        draw.text((x, y), title, fill=(100, 100, 100), font=font)
-
-        # Add category text below
-        category_text = (
-            f"Category: {product.category.name if product.category else 'Unknown'}"
-        )
-        cat_bbox = draw.textbbox((0, 0), category_text, font=font)
-        cat_width = cat_bbox[2] - cat_bbox[0]
-        cat_x = (width - cat_width) // 2
-        draw.text((cat_x, y + 30), category_text, fill=(150, 150, 150), font=font)
-
-        # Save image to bytes buffer
-        img_buffer = io.BytesIO()
-        image.save(img_buffer, format="JPEG", quality=85)
-        img_buffer.seek(0)
-
-        # Store in database
-        product.image_data = img_buffer.getvalue()
-        product.image_mime_type = "image/jpeg"
-        product.image_filename = f"placeholder_{product.id}.jpg"
-
-        session.add(product)
-        session.commit()
-        return True
-
-    except Exception as e:
-        print(f"Error creating placeholder image for product {product.id}: {e}")
-        return False
-
-
-def download_and_store_image(
-    session: Session, product: Product, image_url: str
-) -> bool:
-    """Download image from URL and store as BLOB in database. Fallback to placeholder if failed."""
-    try:
-        # Add user agent to avoid bot detection
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
-        }
-
-        # Download image
-        response = requests.get(image_url, timeout=30, headers=headers)
-        response.raise_for_status()
-
-        # Open image with PIL to validate and get format
-        raw_image: Image.Image = Image.open(io.BytesIO(response.content))
-
-        # Save image to bytes buffer as PNG to preserve transparency
-        img_buffer = io.BytesIO()
-        raw_image.save(img_buffer, format="PNG", optimize=True)
-        img_buffer.seek(0)
-
-        # Store in database
-        product.image_data = img_buffer.getvalue()
-        product.image_mime_type = "image/png"
-        product.image_filename = f"product_{product.id}.png"
-
-        session.add(product)
-        session.commit()
-        return True
-
-    except Exception as e:
-        print(f"Error downloading image for product {product.id}: {e}")
-        print("Creating placeholder image instead...")
-        return create_placeholder_image(session, product)
+def encode_product_image(raw_data: Union[bytes, memoryview]) -> EncodedImage:
+    """Validate downloaded image bytes and re-encode them as optimized PNG,
+    along with the dimensions and preview thumbnail listings show.
+
+    CPU-bound; raises if the bytes aren't a decodable image.
+    """
+    # Open image with PIL to validate and get format
+    raw_image: Image.Image = Image.open(io.BytesIO(raw_data))
+
+    # Save image to bytes buffer as PNG to preserve transparency
+    img_buffer = io.BytesIO()
+    raw_image.save(img_buffer, format="PNG", optimize=True)
+    return EncodedImage(
+        data=img_buffer.getvalue(),
+        width=raw_image.width,
+        height=raw_image.height,
+        preview=render_preview(raw_image),
+        phash=perceptual_hash(raw_image),
+    )
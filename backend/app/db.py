@@ -1,14 +1,42 @@
 from sqlmodel import SQLModel, create_engine, Session
-from sqlalchemy import text
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+from typing import Callable, TypeVar
 import os
+import random
+import time
+
+from .metrics import InstrumentedQueuePool, register_db_pool
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./store.db")
+# How long a connection waits for another's write lock (SQLite's
+# busy_timeout) before failing with "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# SQLite only
+SQLITE_CONNECT_ARGS = {
+    "check_same_thread": False,
+    "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+}
+# Tries at a transaction that finds the database locked
+WRITE_ATTEMPTS = 5
 engine = create_engine(
     DATABASE_URL,
-    connect_args={
-        "check_same_thread": False,  # SQLite only
-    },
+    connect_args=SQLITE_CONNECT_ARGS,
+    # The default for file databases, plus checkout wait metrics
+    poolclass=InstrumentedQueuePool,
 )
+register_db_pool(engine.pool)
+
+
+def set_sqlite_pragmas(dbapi_connection, _connection_record) -> None:
+    """Run on each new connection; unlike journal_mode, synchronous is per
+    connection. NORMAL is safe in WAL mode and commits skip the fsync, so
+    writers hold the lock for less time."""
+    dbapi_connection.execute("PRAGMA synchronous=NORMAL")
+
+
+event.listen(engine, "connect", set_sqlite_pragmas)
 
 
 def get_session():
@@ -16,6 +44,30 @@ def get_session():
         yield session
 
 
+T = TypeVar("T")
+
+
+def write_transaction(session: Session, operation: Callable[[Connection], T]) -> T:
+    """Run operation in a transaction and commit it, retrying while the
+    database is locked"""
+    for attempt in range(WRITE_ATTEMPTS):
+        try:
+            result = operation(session.connection())
+            session.commit()
+            return result
+        except OperationalError as exc:
+            session.rollback()
+            locked = "database is locked" in str(exc.orig)
+            if not locked or attempt == WRITE_ATTEMPTS - 1:
+                raise
+        except Exception:
+            session.rollback()
+            raise
+        # Jittered, so writers that collided don't retry in step
+        time.sleep(random.uniform(0, 0.005 * 2**attempt))
+    raise AssertionError("unreachable")
+
+
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
 
@@ -23,5 +75,4 @@ def create_db_and_tables():
     with engine.connect() as conn:
         conn.execute(text("PRAGMA journal_mode=WAL;"))
         conn.execute(text("PRAGMA cache_size=10000;"))  # 10MB cache
-        conn.execute(text("PRAGMA synchronous=NORMAL;"))  # better write throughput
         conn.commit()
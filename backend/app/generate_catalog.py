@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic catalogs for scale testing.
+
+    python -m app.generate_catalog --products 100k --database /tmp/catalog.db
+    python -m app.generate_catalog --products 1m --output catalog.jsonl
+    python -m app.generate_catalog --products 10k --database /tmp/c.db --images
+
+The same --seed always produces the same catalog. Category sizes follow a
+long-tailed (Zipf) distribution, prices are log-normal per category and
+delivery options are mixed roughly as a real store would offer them. With
+--images, products share a pool of --image-variety synthetic photos of
+--image-size pixels, stored once each like downloaded images are.
+
+Databases are filled through the bulk seeder, so this is also the standard
+dataset for the benchmarks.
+"""
+
+import argparse
+import io
+import json
+import math
+import random
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from PIL import Image, ImageDraw
+from sqlalchemy import Engine, text
+from sqlmodel import Session, create_engine
+
+from .bulk_seed import BulkSeedReport, bulk_load_products
+from .crud import encode_product_image, store_image_blob
+
+DEFAULT_SEED = 42
+STANDARD_SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+# The products.json categories first, so they are the largest
+CATEGORY_NAMES = [
+    "electronics",
+    "women clothing",
+    "men clothing",
+    "jewelery",
+    "home & kitchen",
+    "books",
+    "sports & outdoors",
+    "beauty",
+    "toys & games",
+    "health",
+    "garden",
+    "automotive",
+    "office supplies",
+    "pet supplies",
+    "tools",
+    "baby",
+    "grocery",
+    "music",
+    "luggage",
+    "arts & crafts",
+]
+
+# Chance a product offers each option. Same Day's is conditional: it's only
+# drawn for products with Next Day, so 0.30 * 0.40 = 12% of products get it
+DELIVERY_MIX = {
+    "Standard Shipping": 0.97,
+    "Express Delivery": 0.85,
+    "Next Day Delivery": 0.30,
+    "Same Day Delivery": 0.40,
+}
+
+_ADJECTIVES = [
+    "Classic",
+    "Compact",
+    "Deluxe",
+    "Eco",
+    "Essential",
+    "Heavy-Duty",
+    "Lightweight",
+    "Modern",
+    "Portable",
+    "Premium",
+    "Rugged",
+    "Slim",
+    "Smart",
+    "Soft",
+    "Vintage",
+    "Wireless",
+]
+_MATERIALS = [
+    "Bamboo",
+    "Canvas",
+    "Ceramic",
+    "Cotton",
+    "Glass",
+    "Leather",
+    "Linen",
+    "Oak",
+    "Silicone",
+    "Steel",
+    "Titanium",
+    "Wool",
+]
+_NOUNS = [
+    "Backpack",
+    "Blender",
+    "Bottle",
+    "Bracelet",
+    "Chair",
+    "Charger",
+    "Desk Lamp",
+    "Headphones",
+    "Jacket",
+    "Kettle",
+    "Keyboard",
+    "Mug",
+    "Notebook",
+    "Pillow",
+    "Ring",
+    "Sneakers",
+    "Speaker",
+    "Sweater",
+    "Tent",
+    "Watch",
+]
+_FEATURES = [
+    "built to last",
+    "easy to clean",
+    "made from recycled materials",
+    "backed by a two-year warranty",
+    "designed for everyday use",
+    "available in several colours",
+    "tested for durability",
+    "perfect as a gift",
+]
+
+
+def parse_count(value: str) -> int:
+    """argparse type accepting 10k, 100k, 1m or a plain number"""
+    value = value.strip().lower()
+    if value in STANDARD_SIZES:
+        return STANDARD_SIZES[value]
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(value[-1:], 1)
+    number = value[:-1] if multiplier > 1 else value
+    try:
+        count = int(float(number) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid product count: {value}")
+    if count < 1:
+        raise argparse.ArgumentTypeError("Product count must be positive")
+    return count
+
+
+def generate_products(
+    count: int, seed: int = DEFAULT_SEED, categories: int = len(CATEGORY_NAMES)
+) -> Iterator[Dict[str, Any]]:
+    """Yield `count` products in the products.json shape, plus an explicit
+    "delivery_options" list, with ids 1..count"""
+    rng = random.Random(seed)
+    names = [
+        CATEGORY_NAMES[i] if i < len(CATEGORY_NAMES) else f"category {i + 1}"
+        for i in range(categories)
+    ]
+    weights = [1 / (rank + 1) ** 1.1 for rank in range(categories)]
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    # Each category gets its own typical price, from a few dollars to hundreds
+    medians = [math.exp(rng.uniform(math.log(8), math.log(400))) for _ in names]
+
+    for product_id in range(1, count + 1):
+        index = rng.choices(range(categories), cum_weights=cumulative)[0]
+        noun = rng.choice(_NOUNS)
+        price = rng.lognormvariate(math.log(medians[index]), 0.5)
+
+        options = [
+            name
+            for name in ("Standard Shipping", "Express Delivery", "Next Day Delivery")
+            if rng.random() < DELIVERY_MIX[name]
+        ]
+        if "Next Day Delivery" in options and (
+            rng.random() < DELIVERY_MIX["Same Day Delivery"]
+        ):
+            options.append("Same Day Delivery")
+        if not options:
+            options = ["Standard Shipping"]
+
+        yield {
+            "id": product_id,
+            "title": f"{rng.choice(_ADJECTIVES)} {rng.choice(_MATERIALS)} {noun}",
+            "price": max(0.99, round(price) - 0.01),
+            "description": (
+                f"A {noun.lower()} from our {names[index]} range, "
+                f"{rng.choice(_FEATURES)} and {rng.choice(_FEATURES)}."
+            ),
+            "category": names[index],
+            "image": "",
+            "delivery_options": options,
+        }
+
+
+def render_synthetic_image(index: int, size: int, seed: int = DEFAULT_SEED) -> bytes:
+    """A deterministic, photo-sized JPEG: a gradient with a few shapes"""
+    rng = random.Random(f"{seed}-{index}")
+    start = [rng.randrange(256) for _ in range(3)]
+    end = [rng.randrange(256) for _ in range(3)]
+    gradient = Image.linear_gradient("L").resize((size, size))
+    image = Image.merge(
+        "RGB",
+        [
+            gradient.point(lambda v, a=a, b=b: a + (b - a) * v // 255)
+            for a, b in zip(start, end)
+        ],
+    )
+
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(2, 6)):
+        x0, y0 = rng.randrange(size), rng.randrange(size)
+        x1 = min(size, x0 + rng.randint(size // 10, size // 2))
+        y1 = min(size, y0 + rng.randint(size // 10, size // 2))
+        fill = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.ellipse((x0, y0, x1, y1), fill=fill)
+        else:
+            draw.rectangle((x0, y0, x1, y1), fill=fill)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def attach_synthetic_images(
+    db_engine: Engine,
+    count: int,
+    variety: int,
+    size: int,
+    seed: int = DEFAULT_SEED,
+) -> int:
+    """Give products 1..count one of `variety` synthetic images each
+    (product id modulo variety); returns the number of distinct images"""
+    variety = min(variety, count)
+    with Session(db_engine) as session:
+        connection = session.connection()
+        connection.execute(
+            text(
+                "CREATE TEMP TABLE synthetic_images (slot INTEGER PRIMARY KEY, "
+                "blob_id INTEGER, width INTEGER, height INTEGER, preview TEXT)"
+            )
+        )
+        for slot in range(variety):
+            image = encode_product_image(render_synthetic_image(slot, size, seed))
+            connection.execute(
+                text(
+                    "INSERT INTO synthetic_images VALUES "
+                    "(:slot, :blob_id, :width, :height, :preview)"
+                ),
+                {
+                    "slot": slot,
+                    "blob_id": store_image_blob(session, image.data, image.phash),
+                    "width": image.width,
+                    "height": image.height,
+                    "preview": image.preview,
+                },
+            )
+
+        # One pass over products rather than one UPDATE per image
+        connection.execute(
+            text(
+                "UPDATE products SET image_blob_id = s.blob_id, "
+                "image_width = s.width, image_height = s.height, "
+                "image_preview = s.preview, image_mime_type = 'image/png', "
+                "image_filename = 'product_' || products.id || '.png', "
+                "image_is_placeholder = 0 "
+                "FROM synthetic_images AS s "
+                "WHERE s.slot = products.id % :variety AND products.id <= :count"
+            ),
+            {"variety": variety, "count": count},
+        )
+        connection.execute(text("DROP TABLE synthetic_images"))
+        session.commit()
+    return variety
+
+
+def generate_catalog_database(
+    db_engine: Engine,
+    count: int,
+    seed: int = DEFAULT_SEED,
+    categories: int = len(CATEGORY_NAMES),
+    images: bool = False,
+    image_size: int = 300,
+    image_variety: int = 500,
+) -> BulkSeedReport:
+    """Bulk-load a generated catalog into `db_engine`"""
+    report = bulk_load_products(
+        db_engine, generate_products(count, seed, categories), with_images=False
+    )
+    if images:
+        distinct = attach_synthetic_images(
+            db_engine, count, image_variety, image_size, seed
+        )
+        print(f"Attached {distinct} distinct {image_size}px images")
+    return report
+
+
+def write_catalog(
+    path: Path,
+    count: int,
+    seed: int = DEFAULT_SEED,
+    categories: int = len(CATEGORY_NAMES),
+) -> None:
+    """Write a generated catalog as JSON Lines, for `app.seed --bulk --file`"""
+    with open(path, "w", encoding="utf-8") as f:
+        for product in generate_products(count, seed, categories):
+            f.write(json.dumps(product) + "\n")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic catalog")
+    parser.add_argument(
+        "--products",
+        type=parse_count,
+        default=STANDARD_SIZES["10k"],
+        help="Number of products: 10k, 100k, 1m or any count (default 10k)",
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--categories", type=int, default=len(CATEGORY_NAMES))
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--database", type=Path, help="SQLite file to load into")
+    target.add_argument("--output", type=Path, help="JSON Lines file to write")
+    parser.add_argument(
+        "--images", action="store_true", help="Attach synthetic images (--database)"
+    )
+    parser.add_argument("--image-size", type=int, default=300, metavar="PX")
+    parser.add_argument("--image-variety", type=int, default=500, metavar="N")
+    args = parser.parse_args(argv)
+
+    if args.images and not args.database:
+        parser.error("--images requires --database")
+
+    if args.output:
+        write_catalog(args.output, args.products, args.seed, args.categories)
+        print(f"Wrote {args.products} products to {args.output}")
+        return
+
+    db_engine = create_engine(f"sqlite:///{args.database}")
+    try:
+        generate_catalog_database(
+            db_engine,
+            args.products,
+            seed=args.seed,
+            categories=args.categories,
+            images=args.images,
+            image_size=args.image_size,
+            image_variety=args.image_variety,
+        )
+    finally:
+        db_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
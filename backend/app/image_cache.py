@@ -0,0 +1,154 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+
+@dataclass
+class _Flight:
+    """An in-progress render that concurrent requests for the same key wait on"""
+
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Optional[bytes] = None
+    error: Optional[BaseException] = None
+
+
+class VariantCache:
+    """Size-bounded LRU cache of rendered image variants on local disk.
+
+    The LRU index lives in memory and is rebuilt from file mtimes on startup.
+    Renders are single-flighted: concurrent misses for the same key share one
+    render instead of each resizing the source image.
+
+    The index and byte budget are per process. Server processes sharing a
+    directory each keep it under max_bytes for the variants they wrote, so
+    together they can hold up to max_bytes per process, and may evict each
+    other's files; a variant found missing is rendered again.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._in_flight: Dict[str, _Flight] = {}
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        existing = []
+        for path in self.directory.iterdir():
+            if path.name.startswith(".tmp-"):
+                path.unlink(missing_ok=True)  # Interrupted write
+            elif path.is_file():
+                existing.append(path)
+
+        for path in sorted(existing, key=lambda p: p.stat().st_mtime):
+            size = path.stat().st_size
+            self._entries[path.name] = size
+            self._total_bytes += size
+        with self._lock:
+            self._evict()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+
+        try:
+            return (self.directory / key).read_bytes()
+        except FileNotFoundError:
+            # Evicted between the index lookup and the read, or removed from
+            # under us (by another process or a tmp cleaner); forget it so
+            # it's rendered again
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+            return None
+
+    def put(self, key: str, data: bytes) -> None:
+        # Write to a temp file first so readers never see a partial variant
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.directory / key)
+
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def get_or_create(self, key: str, render: Callable[[], bytes]) -> bytes:
+        """Return the cached variant, rendering it at most once if missing"""
+        while True:
+            data = self.get(key)
+            if data is not None:
+                self.hits += 1
+                return data
+
+            with self._lock:
+                flight = self._in_flight.get(key)
+                is_leader = flight is None and key not in self._entries
+                if is_leader:
+                    flight = self._in_flight[key] = _Flight()
+            if flight is not None:
+                break
+            # Another render finished between our lookup and taking the lock
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            self.hits += 1
+            return flight.result or b""
+
+        self.misses += 1
+        try:
+            data = render()
+            self.put(key, data)
+            flight.result = data
+            return data
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            flight.done.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in self._entries:
+                (self.directory / key).unlink(missing_ok=True)
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _evict(self) -> None:
+        # Caller holds self._lock
+        while self._total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            (self.directory / key).unlink(missing_ok=True)
+
+
+variant_cache = VariantCache(
+    Path(
+        os.getenv(
+            "IMAGE_CACHE_DIR",
+            os.path.join(tempfile.gettempdir(), "ecommerce-image-variants"),
+        )
+    ),
+    max_bytes=int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+)
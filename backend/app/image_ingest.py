@@ -0,0 +1,118 @@
+"""
+Concurrent image ingestion for seeding and bulk imports.
+
+Downloads run on a bounded thread pool sharing one keep-alive httpx connection
+pool, with a per-host concurrency cap so a single supplier CDN isn't hammered.
+Decoding and PNG re-encoding go to the image process pipeline, so CPU work
+never holds a download slot or the downloaders' GIL.
+"""
+
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from .image_pipeline import ImagePipeline, get_image_pipeline
+from .images import EncodedImage
+
+# Add user agent to avoid bot detection
+IMAGE_REQUEST_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"
+}
+
+
+@dataclass
+class IngestedImage:
+    product_id: int
+    url: str
+    image: Optional[EncodedImage] = None  # None if ingestion failed
+    error: Optional[str] = None
+
+
+class ImageFetcher:
+    def __init__(
+        self,
+        max_workers: int = 16,
+        per_host_limit: int = 6,
+        timeout: float = 30.0,
+        pipeline: Optional[ImagePipeline] = None,
+    ):
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.pipeline = pipeline
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_limits_lock = threading.Lock()
+
+    def fetch_all(self, jobs: Iterable[Tuple[int, str]]) -> Iterator[IngestedImage]:
+        """Download and encode (product_id, url) jobs, yielding results in
+        completion order. At most a few batches of jobs are in flight at once,
+        so arbitrarily large job iterables are fine."""
+        pipeline = self.pipeline or get_image_pipeline()
+        limits = httpx.Limits(
+            max_connections=self.max_workers,
+            max_keepalive_connections=self.max_workers,
+        )
+        max_pending = self.max_workers * 4
+
+        with (
+            httpx.Client(
+                headers=IMAGE_REQUEST_HEADERS,
+                timeout=self.timeout,
+                limits=limits,
+                follow_redirects=True,
+            ) as client,
+            ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="image-download"
+            ) as downloader,
+        ):
+            pending: Dict[Future, Tuple[str, IngestedImage]] = {}
+            job_iter = iter(jobs)
+            exhausted = False
+
+            while True:
+                while not exhausted and len(pending) < max_pending:
+                    job = next(job_iter, None)
+                    if job is None:
+                        exhausted = True
+                        break
+                    product_id, url = job
+                    result = IngestedImage(product_id=product_id, url=url)
+                    download = downloader.submit(self._download, client, url)
+                    pending[download] = ("download", result)
+
+                if not pending:
+                    break
+
+                done: Set[Future] = wait(pending, return_when=FIRST_COMPLETED)[0]
+                for future in done:
+                    stage, result = pending.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        result.error = f"{type(error).__name__}: {error}"
+                        yield result
+                    elif stage == "download":
+                        # Hand CPU work to the encoder, freeing the download slot
+                        encoded = pipeline.encode_png(future.result())
+                        pending[encoded] = ("encode", result)
+                    else:
+                        result.image = future.result()
+                        yield result
+
+    def _download(self, client: httpx.Client, url: str) -> bytes:
+        with self._host_limit(url):
+            response = client.get(url)
+            response.raise_for_status()
+            return response.content
+
+    def _host_limit(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._host_limits_lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(
+                    self.per_host_limit
+                )
+            return self._host_limits[host]
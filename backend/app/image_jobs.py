@@ -0,0 +1,125 @@
+"""
+Background processing for uploaded product images.
+
+Uploads are streamed to a temp file by the API and queued here; validation,
+re-encoding, storage and variant pre-rendering happen on a small worker pool
+so request latency doesn't depend on image size.
+
+Jobs live in the memory of the process that accepted the upload and are
+lost on restart. With several server processes (uvicorn --workers), a
+status poll answered by another process gets 404 for a job that exists;
+run one process, or route a client's polls to the process that took its
+upload, until job state is persisted.
+"""
+
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from enum import Enum
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Engine
+from sqlmodel import Session
+
+from . import crud
+from .image_cache import variant_cache
+from .image_pipeline import get_image_pipeline
+from .images import NEGOTIABLE_FORMATS, variant_key
+
+# Variants worth having before the first request: grid-sized cards in the
+# encodings browsers negotiate.
+PREWARM_VARIANTS: List[Tuple[Optional[int], str]] = [
+    (300, fmt) for fmt in NEGOTIABLE_FORMATS
+]
+
+
+class ImageJobStatus(str, Enum):
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+
+@dataclass
+class ImageJob:
+    id: str
+    product_id: int
+    status: ImageJobStatus = ImageJobStatus.QUEUED
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=lambda: datetime.now(UTC))
+    finished_at: Optional[datetime] = None
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+
+class ImageJobQueue:
+    """Runs image jobs on a thread pool and remembers the most recent ones"""
+
+    def __init__(self, max_workers: int = 2, max_tracked_jobs: int = 1000):
+        self.max_tracked_jobs = max_tracked_jobs
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="image-job"
+        )
+        self._jobs: "OrderedDict[str, ImageJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, engine: Engine, product_id: int, upload_path: Path) -> ImageJob:
+        job = ImageJob(id=uuid.uuid4().hex, product_id=product_id)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_tracked_jobs:
+                self._jobs.popitem(last=False)
+
+        self._executor.submit(self._run, job, engine, upload_path)
+        return job
+
+    def get(self, job_id: str) -> Optional[ImageJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: ImageJob, engine: Engine, upload_path: Path) -> None:
+        job.status = ImageJobStatus.PROCESSING
+        pipeline = get_image_pipeline()
+        try:
+            # Validates the upload too: undecodable bytes raise here
+            image = pipeline.encode_png(upload_path.read_bytes()).result()
+
+            with Session(engine) as session:
+                if not crud.set_product_image(
+                    session,
+                    job.product_id,
+                    image,
+                    "image/png",
+                    f"product_{job.product_id}.png",
+                ):
+                    raise LookupError("Product was deleted before processing")
+                meta = crud.get_product_image_meta(session, job.product_id)
+
+            if meta:
+                for width, fmt in PREWARM_VARIANTS:
+                    variant_cache.get_or_create(
+                        variant_key(meta, width, fmt),
+                        lambda: pipeline.render_variant(
+                            image.data, width, fmt
+                        ).result(),
+                    )
+
+            job.status = ImageJobStatus.DONE
+        except Exception as e:
+            job.status = ImageJobStatus.FAILED
+            job.error = f"{type(e).__name__}: {e}"
+            print(f"Error processing uploaded image for product {job.product_id}: {e}")
+        finally:
+            upload_path.unlink(missing_ok=True)
+            job.finished_at = datetime.now(UTC)
+            job._done.set()
+
+
+image_jobs = ImageJobQueue(max_workers=int(os.getenv("IMAGE_JOB_WORKERS", "2")))
@@ -0,0 +1,159 @@
+"""
+Process-pool pipeline for CPU-bound image work (decode, resize, encode).
+
+Pillow holds the GIL for most of its work, so threads only ever use one core.
+The pipeline runs each operation in a worker process instead. Large inputs
+travel through shared memory rather than being pickled down the worker pipe:
+the parent copies the bytes into a segment once and the worker maps it,
+skipping the pickle/pipe/unpickle copies. Pillow decodes from a file object,
+so the worker still makes one copy of the input, into an io.BytesIO.
+
+    pipeline = get_image_pipeline()
+    image = pipeline.encode_png(raw_bytes).result()
+    thumb = pipeline.render_variant(image.data, 300, "webp").result()
+
+IMAGE_PROCESS_WORKERS sets the pool size (default: CPU count); 0 runs the
+same operations inline, which is what the test suite uses.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING, Any, Callable, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    from .images import EncodedImage
+
+# Inputs below this size are cheaper to pickle than to set up a segment for
+SHARED_MEMORY_THRESHOLD = 256 * 1024
+
+# What a worker receives: raw bytes, or (segment name, length)
+_Source = Union[bytes, Tuple[str, int]]
+
+
+def _run_operation(operation: str, source: _Source, *args: Any) -> Any:
+    """Worker entry point: resolve the source buffer and run one operation"""
+    if isinstance(source, bytes):
+        return _OPERATIONS[operation](source, *args)
+
+    name, length = source
+    # track=False: the parent owns the segment's lifetime
+    segment = SharedMemory(name=name, track=False)
+    try:
+        assert segment.buf is not None
+        # Not zero-copy: the decoders wrap the view in io.BytesIO, which
+        # copies it, but that is the only copy on this side of the pool
+        view = segment.buf[:length]
+        try:
+            return _OPERATIONS[operation](view, *args)
+        finally:
+            view.release()
+    finally:
+        segment.close()
+
+
+def _encode_png(data: Union[bytes, memoryview]) -> "EncodedImage":
+    from .crud import encode_product_image
+
+    return encode_product_image(data)
+
+
+def _render_variant(
+    data: Union[bytes, memoryview], width: Optional[int], fmt: str
+) -> bytes:
+    from .images import render_variant
+
+    return render_variant(data, width, fmt)
+
+
+_OPERATIONS: dict[str, Callable[..., Any]] = {
+    "encode_png": _encode_png,
+    "render_variant": _render_variant,
+}
+
+
+class ImagePipeline:
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        if max_workers > 0:
+            # forkserver/spawn: forking a process that already runs threads
+            # (uvicorn, the threadpool) is unsafe
+            method = (
+                "forkserver"
+                if "forkserver" in multiprocessing.get_all_start_methods()
+                else "spawn"
+            )
+            self._executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context(method),
+            )
+
+    def encode_png(self, data: bytes) -> "Future[EncodedImage]":
+        """Validate and re-encode downloaded/uploaded bytes as optimized PNG,
+        with dimensions and a preview (see crud.encode_product_image)"""
+        return self._submit("encode_png", data)
+
+    def render_variant(
+        self, data: bytes, width: Optional[int], fmt: str
+    ) -> "Future[bytes]":
+        """Resize and re-encode a stored image (see images.render_variant)"""
+        return self._submit("render_variant", data, width, fmt)
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _submit(self, operation: str, data: bytes, *args: Any) -> Future:
+        if self._executor is None:
+            return _completed(lambda: _run_operation(operation, data, *args))
+
+        if len(data) < SHARED_MEMORY_THRESHOLD:
+            return self._executor.submit(_run_operation, operation, data, *args)
+
+        segment = SharedMemory(create=True, size=len(data))
+        assert segment.buf is not None
+        segment.buf[: len(data)] = data
+        future = self._executor.submit(
+            _run_operation, operation, (segment.name, len(data)), *args
+        )
+
+        def release(_: Future) -> None:
+            segment.close()
+            segment.unlink()
+
+        future.add_done_callback(release)
+        return future
+
+
+def _completed(fn: Callable[[], Any]) -> Future:
+    future: Future = Future()
+    try:
+        future.set_result(fn())
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+_pipeline: Optional[ImagePipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_image_pipeline() -> ImagePipeline:
+    """The shared pipeline, created on first use"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            workers = int(os.getenv("IMAGE_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+            _pipeline = ImagePipeline(max_workers=workers)
+        return _pipeline
+
+
+def shutdown_image_pipeline() -> None:
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.shutdown()
+            _pipeline = None
@@ -0,0 +1,281 @@
+import base64
+import io
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from PIL import Image, features
+
+# Widths the grid and detail pages actually request. Anything else is rejected
+# so arbitrary ?w= values can't fill the variant cache.
+ALLOWED_WIDTHS: Tuple[int, ...] = (150, 300, 600, 1200)
+
+
+@dataclass(frozen=True)
+class VariantFormat:
+    pil_format: str
+    mime_type: str
+    extension: str
+    save_options: Dict[str, Any]
+
+
+VARIANT_FORMATS: Dict[str, VariantFormat] = {
+    "webp": VariantFormat("WEBP", "image/webp", "webp", {"quality": 80, "method": 4}),
+    "jpeg": VariantFormat(
+        "JPEG", "image/jpeg", "jpg", {"quality": 85, "optimize": True}
+    ),
+    "png": VariantFormat("PNG", "image/png", "png", {"optimize": True}),
+}
+
+if features.check("avif"):
+    VARIANT_FORMATS["avif"] = VariantFormat(
+        "AVIF", "image/avif", "avif", {"quality": 60, "speed": 8}
+    )
+
+# Formats offered via Accept negotiation, most compact first
+NEGOTIABLE_FORMATS: List[str] = [f for f in ("avif", "webp") if f in VARIANT_FORMATS]
+
+# Only re-encode stored formats where the modern codecs are a clear win;
+# converting a GIF would drop its animation.
+_NEGOTIABLE_SOURCE_TYPES = ("image/png", "image/jpeg")
+
+# Longest side of the inline preview thumbnail
+PREVIEW_SIZE = 16
+
+# Stored mime type -> variant format used when only ?w= is given
+_FORMAT_BY_MIME = {
+    "image/webp": "webp",
+    "image/jpeg": "jpeg",
+    "image/png": "png",
+}
+
+
+@dataclass(frozen=True)
+class ImageMeta:
+    """Stored metadata for a product image, read without touching the BLOB"""
+
+    product_id: int
+    mime_type: str
+    filename: str
+    size: int
+    version: str = ""  # Changes whenever the stored image may have changed
+    placeholder: bool = False  # Nothing stored; rendered on request
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    """A product image ready to store, with what listings show before it loads"""
+
+    data: bytes
+    width: int
+    height: int
+    preview: str  # data: URI of a PREVIEW_SIZE px thumbnail
+    phash: str  # See perceptual_hash
+
+
+@dataclass(frozen=True)
+class ByteRange:
+    start: int
+    end: int  # Inclusive, as in Content-Range
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start + 1
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a syntactically valid Range cannot be served (HTTP 416)"""
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[ByteRange]:
+    """Parse a single `bytes=` range against a representation of `size` bytes.
+
+    Returns None when the full representation should be sent instead: no header,
+    an unknown unit, malformed syntax or a multi-range request (which we are
+    allowed to ignore per RFC 9110).
+    """
+    if not header:
+        return None
+
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec or "," in spec:
+        return None
+
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+
+    try:
+        if first == "":
+            # Suffix range: the last N bytes
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            start, end = max(size - suffix, 0), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if end < start:
+        if last:
+            return None  # Invalid range-spec, ignore the header
+        raise RangeNotSatisfiable()
+    if start >= size:
+        raise RangeNotSatisfiable()
+
+    return ByteRange(start=start, end=min(end, size - 1))
+
+
+def image_headers(meta: ImageMeta, filename: Optional[str] = None) -> Dict[str, str]:
+    """Headers shared by every GET/HEAD response for a product image"""
+    filename = filename or meta.filename or f"product_{meta.product_id}.jpg"
+    return {
+        "Content-Disposition": f'inline; filename="{filename}"',
+        "Cache-Control": "public, max-age=86400",
+        "Accept-Ranges": "bytes",
+    }
+
+
+def default_variant_format(mime_type: str) -> str:
+    return _FORMAT_BY_MIME.get(mime_type, "png")
+
+
+def variant_key(meta: ImageMeta, width: Optional[int], fmt: str) -> str:
+    """Cache key (and file name) for a rendered variant"""
+    size_label = f"w{width}" if width else "orig"
+    extension = VARIANT_FORMATS[fmt].extension
+    return f"{meta.product_id}-{meta.version}-{size_label}.{extension}"
+
+
+def variant_filename(meta: ImageMeta, width: Optional[int], fmt: str) -> str:
+    size_label = f"_w{width}" if width else ""
+    extension = VARIANT_FORMATS[fmt].extension
+    return f"product_{meta.product_id}{size_label}.{extension}"
+
+
+def render_variant(
+    image_data: Union[bytes, memoryview], width: Optional[int], fmt: str
+) -> bytes:
+    """Resize (never upscale) and re-encode an image. Raises OSError if the
+    source can't be decoded."""
+    variant_format = VARIANT_FORMATS[fmt]
+
+    image: Image.Image = Image.open(io.BytesIO(image_data))
+    image.load()
+
+    if width and image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.Resampling.LANCZOS)
+
+    if variant_format.pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    elif image.mode == "P":
+        image = image.convert("RGBA")
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=variant_format.pil_format, **variant_format.save_options)
+    return buffer.getvalue()
+
+
+def render_preview(image: Image.Image) -> str:
+    """Encode a tiny WebP thumbnail as a data: URI. Clients stretch it behind
+    a CSS blur while the full image loads."""
+    has_alpha = "A" in image.mode or "transparency" in image.info
+    thumb = image.convert("RGBA" if has_alpha else "RGB")
+    thumb.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE), Image.Resampling.BOX)
+
+    buffer = io.BytesIO()
+    thumb.save(buffer, format="WEBP", quality=40)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def perceptual_hash(image: Image.Image) -> str:
+    """64-bit difference hash (dHash) as 16 hex digits. Re-encodes, resizes
+    and small edits of the same photo land within a few bits of each other."""
+    pixels = image.convert("L").resize((9, 8), Image.Resampling.BOX).tobytes()
+    bits = 0
+    for row in range(8):
+        for column in range(8):
+            left, right = pixels[row * 9 + column], pixels[row * 9 + column + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:016x}"
+
+
+def hamming_distance(first: str, second: str) -> int:
+    return (int(first, 16) ^ int(second, 16)).bit_count()
+
+
+def accepted_types(accept: str) -> Dict[str, float]:
+    """Map explicitly listed media types in an Accept header to their q-values"""
+    accepted: Dict[str, float] = {}
+    for media_range in accept.split(","):
+        media_type, *params = (part.strip() for part in media_range.split(";"))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[media_type.lower()] = quality
+    return accepted
+
+
+def varies_on_accept(source_mime_type: str) -> bool:
+    return bool(NEGOTIABLE_FORMATS) and source_mime_type in _NEGOTIABLE_SOURCE_TYPES
+
+
+def negotiate_format(accept: Optional[str], source_mime_type: str) -> Optional[str]:
+    """Pick a smaller encoding the client explicitly accepts, if any: the
+    one it gives the highest q, with NEGOTIABLE_FORMATS' order (smallest
+    first) breaking ties.
+
+    Wildcards like image/* or */* don't count: clients that send them only
+    are served the stored format unchanged.
+    """
+    if not accept or not varies_on_accept(source_mime_type):
+        return None
+
+    accepted = accepted_types(accept)
+    best, best_quality = None, 0.0
+    for fmt in NEGOTIABLE_FORMATS:
+        quality = accepted.get(VARIANT_FORMATS[fmt].mime_type, 0.0)
+        if quality > best_quality:
+            best, best_quality = fmt, quality
+    return best
+
+
+class ImageStats:
+    """Bytes served per image format, to measure savings from negotiation.
+
+    `source_bytes` is what serving the stored image unchanged would have cost,
+    so `source_bytes - bytes` is the saving attributable to variants.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._formats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, mime_type: str, bytes_served: int, source_bytes: int) -> None:
+        fmt = mime_type.split("/")[-1]
+        with self._lock:
+            stats = self._formats.setdefault(
+                fmt, {"responses": 0, "bytes": 0, "source_bytes": 0}
+            )
+            stats["responses"] += 1
+            stats["bytes"] += bytes_served
+            stats["source_bytes"] += source_bytes
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {fmt: dict(stats) for fmt, stats in self._formats.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._formats.clear()
+
+
+image_stats = ImageStats()
@@ -0,0 +1,343 @@
+"""
+Stock levels and reservations.
+
+A product's stock is a stock_levels row of on-hand and reserved units.
+Every change to it is one conditional UPDATE that checks and moves the
+counts in the same statement, never a read followed by a write, so two
+checkouts can't both take the last unit however they interleave:
+
+    reserve   reserved += q                  where on_hand - reserved >= q
+    commit    on_hand -= q, reserved -= q    of a held reservation
+    release   reserved -= q                  of a held reservation
+    order     on_hand -= q                   where on_hand - reserved >= q
+
+A reservation leaves the held status the same way, by an UPDATE that only
+matches while it is held, so it's committed or released at most once.
+Reservations lapse after RESERVATION_TTL_SECONDS; their units go back to
+stock before the product is next reserved, restocked or ordered, and
+reads count them as available meanwhile. Orders (orders.place_order) take
+their units with take_stock, inside the transaction placing the order;
+products whose stock isn't tracked aren't limited there.
+
+SQLite runs one write transaction at a time. A writer waits up to
+busy_timeout (db.SQLITE_BUSY_TIMEOUT_MS) for the lock, and the operations
+here retry the transaction (db.write_transaction) if it still finds it
+locked.
+"""
+
+import json
+import os
+import secrets
+from datetime import UTC, datetime, timedelta
+from typing import Any, Dict, Optional, Sequence
+
+from sqlalchemy import bindparam, func, insert, update
+from sqlalchemy import select as sa_select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, SQLModel, col
+
+from .db import write_transaction
+from .models import ReservationStatus, StockLevel, StockReservation
+
+RESERVATION_TTL_SECONDS = int(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+
+_reservations = SQLModel.metadata.tables["stock_reservations"]
+
+
+# Product ids bound as one JSON array, as crud binds a cart's
+_product_ids = sa_select(
+    func.json_each(bindparam("product_ids")).table_valued("value").c.value
+)
+EXPIRE_LAPSED = (
+    update(StockReservation)
+    .where(
+        col(StockReservation.product_id).in_(_product_ids),
+        col(StockReservation.status) == ReservationStatus.HELD,
+        col(StockReservation.expires_at) <= bindparam("now"),
+    )
+    .values(status=ReservationStatus.EXPIRED, updated_at=bindparam("now"))
+    .returning(col(StockReservation.product_id), col(StockReservation.quantity))
+)
+UNRESERVE = (
+    update(StockLevel)
+    .where(col(StockLevel.product_id) == bindparam("level_product_id"))
+    .values(
+        reserved=col(StockLevel.reserved) - bindparam("units"),
+        updated_at=bindparam("now"),
+    )
+)
+AVAILABLE = sa_select(
+    col(StockLevel.product_id), col(StockLevel.on_hand) - col(StockLevel.reserved)
+).where(col(StockLevel.product_id).in_(_product_ids))
+TAKE = (
+    update(StockLevel)
+    .where(
+        col(StockLevel.product_id) == bindparam("level_product_id"),
+        col(StockLevel.on_hand) - col(StockLevel.reserved) >= bindparam("units"),
+    )
+    .values(
+        on_hand=col(StockLevel.on_hand) - bindparam("units"),
+        updated_at=bindparam("now"),
+    )
+)
+
+
+class InsufficientStock(Exception):
+    """Raised when fewer units are available than a change needs"""
+
+    def __init__(self, product_id: int, available: int):
+        super().__init__(f"Insufficient stock: {available} available")
+        self.product_id = product_id
+        self.available = available
+
+
+class ReservationNotHeld(Exception):
+    """Raised on committing or releasing a reservation that's no longer held"""
+
+    def __init__(self, status: ReservationStatus):
+        super().__init__(f"Reservation is {status.value}")
+        self.status = status
+
+
+def _now() -> datetime:
+    # Naive UTC, as datetimes come back from SQLite
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def _lapsed_units(product_id: int, now: datetime) -> Any:
+    """Units of the product's expired holds not yet returned to stock"""
+    return (
+        sa_select(func.coalesce(func.sum(col(StockReservation.quantity)), 0))
+        .where(
+            col(StockReservation.product_id) == product_id,
+            col(StockReservation.status) == ReservationStatus.HELD,
+            col(StockReservation.expires_at) <= now,
+        )
+        .scalar_subquery()
+    )
+
+
+def _return_lapsed(conn: Connection, product_ids: Sequence[int], now: datetime) -> None:
+    """Mark the products' expired holds expired and release their units"""
+    lapsed: Dict[int, int] = {}
+    for product_id, quantity in conn.execute(
+        EXPIRE_LAPSED, {"product_ids": json.dumps(sorted(set(product_ids))), "now": now}
+    ):
+        lapsed[product_id] = lapsed.get(product_id, 0) + quantity
+    if lapsed:
+        conn.execute(
+            UNRESERVE,
+            [
+                {"level_product_id": product_id, "units": units, "now": now}
+                for product_id, units in lapsed.items()
+            ],
+        )
+
+
+def _read_stock(
+    conn: Connection, product_id: int, now: datetime
+) -> Optional[StockLevel]:
+    row = conn.execute(
+        sa_select(
+            col(StockLevel.on_hand),
+            (col(StockLevel.reserved) - _lapsed_units(product_id, now)).label(
+                "reserved"
+            ),
+            col(StockLevel.updated_at),
+        ).where(col(StockLevel.product_id) == product_id)
+    ).first()
+    if row is None:
+        return None
+    return StockLevel(
+        product_id=product_id,
+        on_hand=row.on_hand,
+        reserved=row.reserved,
+        updated_at=row.updated_at,
+    )
+
+
+def get_stock(session: Session, product_id: int) -> Optional[StockLevel]:
+    """The product's stock, with expired holds counted as available; None
+    if its stock isn't tracked"""
+    return _read_stock(session.connection(), product_id, _now())
+
+
+def set_stock(session: Session, product_id: int, on_hand: int) -> StockLevel:
+    """Set the product's on-hand units, starting to track its stock if it
+    wasn't; InsufficientStock if more units than that are reserved"""
+
+    def operation(conn: Connection) -> StockLevel:
+        now = _now()
+        _return_lapsed(conn, [product_id], now)
+        stmt = sqlite_insert(StockLevel).values(
+            product_id=product_id, on_hand=on_hand, reserved=0, updated_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[col(StockLevel.product_id)],
+            set_={"on_hand": stmt.excluded.on_hand, "updated_at": now},
+            where=col(StockLevel.reserved) <= stmt.excluded.on_hand,
+        )
+        row = conn.execute(
+            stmt.returning(col(StockLevel.on_hand), col(StockLevel.reserved))
+        ).first()
+        if row is None:
+            level = _read_stock(conn, product_id, now)
+            raise InsufficientStock(product_id, level.available if level else 0)
+        return StockLevel(
+            product_id=product_id,
+            on_hand=row.on_hand,
+            reserved=row.reserved,
+            updated_at=now,
+        )
+
+    return write_transaction(session, operation)
+
+
+def reserve(
+    session: Session,
+    product_id: int,
+    quantity: int,
+    ttl_seconds: Optional[int] = None,
+) -> StockReservation:
+    """Hold quantity units of the product until the reservation is
+    committed, released or expires; InsufficientStock if fewer are
+    available, including when its stock isn't tracked"""
+
+    ttl = RESERVATION_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+
+    def operation(conn: Connection) -> StockReservation:
+        now = _now()
+        _return_lapsed(conn, [product_id], now)
+        held = conn.execute(
+            update(StockLevel)
+            .where(
+                col(StockLevel.product_id) == product_id,
+                col(StockLevel.on_hand) - col(StockLevel.reserved) >= quantity,
+            )
+            .values(reserved=col(StockLevel.reserved) + quantity, updated_at=now)
+        ).rowcount
+        if not held:
+            level = _read_stock(conn, product_id, now)
+            raise InsufficientStock(product_id, level.available if level else 0)
+
+        reservation = StockReservation(
+            id=secrets.token_hex(16),
+            product_id=product_id,
+            quantity=quantity,
+            status=ReservationStatus.HELD,
+            expires_at=now + timedelta(seconds=ttl),
+            created_at=now,
+            updated_at=now,
+        )
+        conn.execute(insert(StockReservation).values(**reservation.model_dump()))
+        return reservation
+
+    return write_transaction(session, operation)
+
+
+def take_stock(conn: Connection, quantities: Dict[int, int], now: datetime) -> None:
+    """Take the units an order needs, {product_id: quantity}, out of stock in
+    the caller's write transaction; InsufficientStock if a product whose
+    stock is tracked has fewer available"""
+    _return_lapsed(conn, list(quantities), now)
+    # _return_lapsed's UPDATE took the write lock, so these stay current
+    available: Dict[int, int] = {
+        product_id: units
+        for product_id, units in conn.execute(
+            AVAILABLE, {"product_ids": json.dumps(sorted(quantities))}
+        )
+    }
+    for product_id, quantity in quantities.items():
+        if product_id in available and available[product_id] < quantity:
+            raise InsufficientStock(product_id, available[product_id])
+    if available:
+        conn.execute(
+            TAKE,
+            [
+                {
+                    "level_product_id": product_id,
+                    "units": quantities[product_id],
+                    "now": now,
+                }
+                for product_id in available
+            ],
+        )
+
+
+def _read_reservation(
+    conn: Connection, reservation_id: str, now: datetime
+) -> Optional[StockReservation]:
+    row = conn.execute(
+        sa_select(_reservations).where(col(StockReservation.id) == reservation_id)
+    ).first()
+    if row is None:
+        return None
+    reservation = StockReservation(**row._mapping)
+    if reservation.status == ReservationStatus.HELD and reservation.expires_at <= now:
+        # Lapsed, though its units aren't back in stock yet
+        reservation.status = ReservationStatus.EXPIRED
+    return reservation
+
+
+def get_reservation(
+    session: Session, reservation_id: str
+) -> Optional[StockReservation]:
+    return _read_reservation(session.connection(), reservation_id, _now())
+
+
+def _settle(
+    session: Session, reservation_id: str, status: ReservationStatus
+) -> Optional[StockReservation]:
+    def operation(conn: Connection) -> Optional[StockReservation]:
+        now = _now()
+        conditions = [
+            col(StockReservation.id) == reservation_id,
+            col(StockReservation.status) == ReservationStatus.HELD,
+        ]
+        if status == ReservationStatus.COMMITTED:
+            # Its units may already have gone to someone else
+            conditions.append(col(StockReservation.expires_at) > now)
+        row = conn.execute(
+            update(StockReservation)
+            .where(*conditions)
+            .values(status=status, updated_at=now)
+            .returning(*_reservations.columns)
+        ).first()
+        if row is None:
+            current = _read_reservation(conn, reservation_id, now)
+            if current is None:
+                return None
+            raise ReservationNotHeld(current.status)
+
+        reservation = StockReservation(**row._mapping)
+        changes: dict[str, Any] = {
+            "reserved": col(StockLevel.reserved) - reservation.quantity,
+            "updated_at": now,
+        }
+        if status == ReservationStatus.COMMITTED:
+            changes["on_hand"] = col(StockLevel.on_hand) - reservation.quantity
+        conn.execute(
+            update(StockLevel)
+            .where(col(StockLevel.product_id) == reservation.product_id)
+            .values(**changes)
+        )
+        return reservation
+
+    return write_transaction(session, operation)
+
+
+def commit_reservation(
+    session: Session, reservation_id: str
+) -> Optional[StockReservation]:
+    """Take a held reservation's units out of stock; None if there's no
+    such reservation, ReservationNotHeld if it's expired or settled"""
+    return _settle(session, reservation_id, ReservationStatus.COMMITTED)
+
+
+def release_reservation(
+    session: Session, reservation_id: str
+) -> Optional[StockReservation]:
+    """Return a held reservation's units to stock; None if there's no such
+    reservation, ReservationNotHeld if it's already settled"""
+    return _settle(session, reservation_id, ReservationStatus.RELEASED)
@@ -1,17 +1,57 @@
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
+from starlette.datastructures import FormData
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import anyio.to_thread
 from sqlmodel import Session, select
 from sqlalchemy.orm import selectinload
-from typing import List, Optional, cast, Any
+from typing import (
+    AsyncGenerator,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    cast,
+    Any,
+)
 from sqlalchemy.sql.elements import ColumnElement
-import io
+import hmac
 import os
+import tempfile
+from pathlib import Path
 
 from .db import get_session, create_db_and_tables
 
+from .serializers import (
+    category_fields,
+    delivery_option_fields,
+    delivery_option_quote_fields,
+    listed_category_fields,
+    product_fields,
+    stock_fields,
+)
 from .schemas import (
+    CartQuote,
+    CartQuoteRequest,
+    OrderCreate,
+    OrderRead,
+    ReservationCreate,
+    ReservationRead,
+    StockRead,
+    StockUpdate,
+    ColumnarProductListing,
+    NormalizedProductListing,
+    NormalizedProductRead,
     ProductRead,
     ProductCreate,
     ProductUpdate,
@@ -21,9 +61,75 @@ from .schemas import (
     CategoryCreate,
     CategoryReadWithProducts,
     DeliveryOptionRead,
+    ImageJobRead,
+)
+from . import crud, inventory, orders
+from .inventory import InsufficientStock, ReservationNotHeld
+from .orders import DeliveryOptionUnavailable, IdempotencyKeyReused, ProductsNotFound
+from .images import (
+    ALLOWED_WIDTHS,
+    VARIANT_FORMATS,
+    ImageMeta,
+    RangeNotSatisfiable,
+    default_variant_format,
+    image_headers,
+    image_stats,
+    negotiate_format,
+    varies_on_accept,
+    parse_range_header,
+    variant_filename,
+    variant_key,
+)
+from .image_cache import variant_cache
+from .image_jobs import ImageJob, image_jobs
+from .image_pipeline import get_image_pipeline, shutdown_image_pipeline
+from .placeholders import PLACEHOLDER_SIZE, placeholder_cache
+from .metrics import (
+    METRICS_DIR,
+    METRICS_FLUSH_SECONDS,
+    MetricsMiddleware,
+    SnapshotWriter,
+    register_caches,
+    register_image_stats,
+    register_threadpool,
+    render_metrics,
+)
+from .profiling import (
+    ProfilingMiddleware,
+    check_token,
+    profile_store,
+    profiling_enabled,
+)
+from .query_stats import QueryCountMiddleware
+from .slow_queries import SLOW_QUERY_MS, slow_query_log
+from .request_timing import (
+    ServerTimingMiddleware,
+    TimedJSONResponse,
+    TimedMsgPackResponse,
+    TimedRoute,
+    phase,
+    timing_enabled,
+    timing_stats,
 )
-from . import crud
-from .models import Product, DeliveryOption, Category, ProductDeliveryLink
+from .responses import MSGPACK_MEDIA_TYPE, accepts_msgpack
+from .models import Product, DeliveryOption, Category
+
+# Guards the /admin/slow-queries endpoints; unset, they're disabled
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+# Allowance for a multipart body's boundaries and part headers
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# nested embeds each product's category; normalized sends side tables;
+# columnar is normalized with one array per product field
+ListingShape = Literal["nested", "normalized", "columnar"]
+ListingResponse = Union[
+    List[ProductRead], NormalizedProductListing, ColumnarProductListing
+]
+# Listings are also served as MessagePack, to clients that Accept it
+LISTING_RESPONSES: Dict[Union[int, str], Dict[str, Any]] = {
+    200: {"content": {MSGPACK_MEDIA_TYPE: {}}}
+}
 
 
 def calculate_delivery_summary(
@@ -51,12 +157,135 @@ def calculate_delivery_summary(
     )
 
 
+def _delivery_options_by_id(session: Session) -> Dict[int, DeliveryOption]:
+    return {
+        option.id: option
+        for option in session.exec(select(DeliveryOption)).all()
+        if option.id is not None
+    }
+
+
+def _listing(
+    rows: Sequence[Any],
+    delivery_options: Optional[Dict[int, DeliveryOption]],
+    shape: str = "nested",
+) -> Any:
+    """Response content for crud.list_products rows, with delivery summaries
+    when delivery_options is given (rows then carry delivery_option_ids).
+
+    The nested shape is a list of ProductRead dicts, each embedding its
+    category. The normalized shape is a NormalizedProductListing: products
+    refer to categories and delivery options by id, and each of those is
+    sent once, in a side table. The columnar shape is a
+    ColumnarProductListing.
+    """
+    normalized = shape != "nested"
+    # Rows repeat a few categories and option sets; build each once
+    categories: Dict[int, Dict[str, Any]] = {}
+    option_id_lists: Dict[str, List[int]] = {}
+    summaries: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    def summarize(
+        option_ids: str, options: Dict[int, DeliveryOption]
+    ) -> Optional[Dict[str, Any]]:
+        if option_ids not in summaries:
+            ids = [int(option_id) for option_id in option_ids.split(",")]
+            option_id_lists[option_ids] = ids
+            with phase("summary"):
+                summary = calculate_delivery_summary(
+                    [options[i] for i in ids if i in options]
+                )
+            summaries[option_ids] = summary.model_dump() if summary else None
+        return summaries[option_ids]
+
+    products = []
+    for row in rows:
+        product = product_fields(row)
+        category = categories.get(row.category_id)
+        if category is None:
+            category = categories[row.category_id] = listed_category_fields(row)
+        if not normalized:
+            product["category"] = category
+        product["delivery_summary"] = None
+        if delivery_options is not None:
+            option_ids = row.delivery_option_ids
+            if option_ids:
+                product["delivery_summary"] = summarize(option_ids, delivery_options)
+            if normalized:
+                product["delivery_option_ids"] = (
+                    option_id_lists[option_ids] if option_ids else []
+                )
+        elif normalized:
+            product["delivery_option_ids"] = None
+        products.append(product)
+
+    if not normalized:
+        return products
+    referenced = {i for ids in option_id_lists.values() for i in ids}
+    listing = {
+        "products": products,
+        "categories": [categories[i] for i in sorted(categories)],
+        "delivery_options": [
+            delivery_option_fields(delivery_options[i])
+            for i in sorted(referenced)
+            if delivery_options is not None and i in delivery_options
+        ],
+    }
+    return _columnar(listing) if shape == "columnar" else listing
+
+
+def _columnar(listing: Dict[str, Any]) -> Dict[str, Any]:
+    """A normalized listing's products as columns, the repeated delivery
+    summaries replaced by indexes into a table of distinct ones"""
+    products = listing["products"]
+    columns = {
+        name: [product[name] for product in products]
+        for name in NormalizedProductRead.model_fields
+    }
+    summaries: List[Dict[str, Any]] = []
+    summary_indexes: Dict[Tuple[Any, ...], int] = {}
+    indexes: List[Optional[int]] = []
+    for summary in columns["delivery_summary"]:
+        if summary is None:
+            indexes.append(None)
+            continue
+        key = tuple(summary.values())
+        if key not in summary_indexes:
+            summary_indexes[key] = len(summaries)
+            summaries.append(summary)
+        indexes.append(summary_indexes[key])
+    columns["delivery_summary"] = indexes
+    return {
+        "count": len(products),
+        "columns": columns,
+        "categories": listing["categories"],
+        "delivery_options": listing["delivery_options"],
+        "delivery_summaries": summaries,
+    }
+
+
+def _listing_response(content: Any, accept: Optional[str]) -> Response:
+    """Listing content, already in the response model's shape, encoded as
+    the client prefers; skips re-validating every product"""
+    if accepts_msgpack(accept):
+        return TimedMsgPackResponse(content, headers={"Vary": "Accept"})
+    return TimedJSONResponse(content, headers={"Vary": "Accept"})
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     create_db_and_tables()
+    register_threadpool(anyio.to_thread.current_default_thread_limiter())
+    metrics_writer = None
+    if METRICS_DIR:
+        metrics_writer = SnapshotWriter(Path(METRICS_DIR), METRICS_FLUSH_SECONDS)
+        metrics_writer.start()
     yield
-    # Shutdown (if needed)
+    # Shutdown
+    shutdown_image_pipeline()
+    if metrics_writer:
+        metrics_writer.stop()
 
 
 app = FastAPI(
@@ -64,7 +293,10 @@ app = FastAPI(
     description="A FastAPI backend for the e-commerce demo with BLOB image storage",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=TimedJSONResponse,
 )
+# Times endpoints for Server-Timing; must be set before routes are declared
+app.router.route_class = TimedRoute
 
 # CORS middleware for frontend integration
 origins = os.getenv(
@@ -79,6 +311,20 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Server-Timing phases when SERVER_TIMING=1; inside QueryCountMiddleware,
+# which supplies its db time
+app.add_middleware(ServerTimingMiddleware)
+# SQL statement count and time per request; X-Query-Count / X-Query-Time
+# headers when QUERY_HEADERS=1
+app.add_middleware(QueryCountMiddleware)
+# Prometheus request metrics; outermost, so it sees every request
+app.add_middleware(MetricsMiddleware)
+# Samples requests flagged with PROFILE_TOKEN; outermost, to cover the rest
+app.add_middleware(ProfilingMiddleware)
+
+register_caches({"variant": variant_cache, "placeholder": placeholder_cache})
+register_image_stats(image_stats)
+
 
 @app.get("/health")
 def health_check():
@@ -118,30 +364,10 @@ def get_category(category_id: int, session: Session = Depends(get_session)):
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
 
-    # Convert to response format with image URLs
-    products_with_images = []
-    for product in category.products:
-        product_dict = {
-            "id": product.id,
-            "title": product.title,
-            "description": product.description,
-            "price": product.price,
-            "category_id": product.category_id,
-            "is_saved": product.is_saved,
-            "created_at": product.created_at,
-            "updated_at": product.updated_at,
-            "image_url": f"/products/{product.id}/image"
-            if product.image_data
-            else None,
-        }
-        products_with_images.append(product_dict)
-
+    rows = crud.list_products(session, category_id=category_id)
     return {
-        "id": category.id,
-        "name": category.name,
-        "created_at": category.created_at,
-        "updated_at": category.updated_at,
-        "products": products_with_images,
+        **category_fields(category),
+        "products": [product_fields(row) for row in rows],
     }
 
 
@@ -160,6 +386,81 @@ def get_delivery_options_for_filter(session: Session = Depends(get_session)):
     return session.exec(stmt).all()
 
 
+@app.post("/api/cart/quote", response_model=CartQuote)
+def quote_cart(cart: CartQuoteRequest, session: Session = Depends(get_session)):
+    """Price a cart and list the delivery options every item can ship with,
+    each checked against its min_order_amount"""
+    product_ids = [item.product_id for item in cart.items]
+    try:
+        lines, subtotal = orders.price_lines(session, cart.items)
+    except ProductsNotFound as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    delivery_options = []
+    for option in crud.get_common_delivery_options(session, product_ids):
+        shortfall = max(0, orders.cents(option.min_order_amount or 0) - subtotal)
+        total = subtotal + orders.cents(option.price) if shortfall == 0 else None
+        delivery_options.append(delivery_option_quote_fields(option, shortfall, total))
+    delivery_options.sort(
+        key=lambda o: (
+            not o["eligible"],
+            o["price"],
+            o["estimated_days_min"],
+            o["id"],
+        )
+    )
+
+    # Already in CartQuote's shape; skips re-validating every line
+    return TimedJSONResponse(
+        {
+            "lines": lines,
+            "item_count": sum(item.quantity for item in cart.items),
+            "subtotal": subtotal / 100,
+            "delivery_options": delivery_options,
+        }
+    )
+
+
+@app.post("/api/orders", status_code=201, response_model=OrderRead)
+def place_order(
+    order: OrderCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    session: Session = Depends(get_session),
+):
+    """Place an order. Retries send the same Idempotency-Key and get the
+    order it placed back, marked Idempotent-Replayed, rather than another"""
+    if not idempotency_key:
+        raise HTTPException(
+            status_code=400, detail="Idempotency-Key header is required"
+        )
+    try:
+        placed, replayed = orders.place_order(session, idempotency_key, order)
+    except (ProductsNotFound, DeliveryOptionUnavailable) as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except IdempotencyKeyReused as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    except InsufficientStock as exc:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Insufficient stock for product {exc.product_id}: "
+            f"{exc.available} available",
+        )
+    # Already in OrderRead's shape; skips re-validating every line
+    return TimedJSONResponse(
+        placed,
+        status_code=201,
+        headers={"Idempotent-Replayed": "true"} if replayed else None,
+    )
+
+
+@app.get("/api/orders/{order_id}", response_model=OrderRead)
+def get_order(order_id: int, session: Session = Depends(get_session)):
+    order = orders.get_order(session, order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return TimedJSONResponse(order)
+
+
 # Product endpoints
 @app.post("/products", response_model=ProductRead)
 def create_product(product: ProductCreate, session: Session = Depends(get_session)):
@@ -169,186 +470,49 @@ def create_product(product: ProductCreate, session: Session = Depends(get_sessio
         raise HTTPException(status_code=400, detail="Category not found")
 
     created_product = crud.create_product(session, product)
-
-    # Convert to response format with image URL
-    product_dict = {
-        "id": created_product.id,
-        "title": created_product.title,
-        "description": created_product.description,
-        "price": created_product.price,
-        "category_id": created_product.category_id,
-        "is_saved": created_product.is_saved,
-        "created_at": created_product.created_at,
-        "updated_at": created_product.updated_at,
-        "image_url": f"/products/{created_product.id}/image"
-        if created_product.image_data
-        else None,
-    }
-
-    return product_dict
+    return product_fields(created_product)
 
 
 # Enhanced API endpoint for filtering and sorting
-@app.get("/api/products", response_model=List[ProductRead])
+@app.get("/api/products", response_model=ListingResponse, responses=LISTING_RESPONSES)
 def get_products_api(
     categoryId: Optional[int] = Query(None),
     deliveryOptionId: Optional[int] = Query(None),
     sort: str = Query("created_desc"),
     include_delivery_summary: bool = Query(True),
+    shape: ListingShape = Query("nested"),
+    accept: Optional[str] = Header(None),
     session: Session = Depends(get_session),
 ):
     """Get products with filtering and sorting for the frontend dropdown functionality"""
-    stmt = select(Product).join(Category)
-
-    # Apply category filter
-    if categoryId:
-        stmt = stmt.where(Product.category_id == categoryId)
-
-    # Apply delivery option filter
-    if deliveryOptionId:
-        stmt = stmt.join(ProductDeliveryLink).where(
-            ProductDeliveryLink.delivery_option_id == deliveryOptionId
+    with phase("orm"):
+        rows = crud.list_products(
+            session,
+            category_id=categoryId,
+            delivery_option_id=deliveryOptionId,
+            sort=sort,
+            with_delivery_option_ids=include_delivery_summary,
         )
-
-    # Always load delivery options for sorting and summary
-    stmt = stmt.options(selectinload(cast(Any, Product.delivery_options)))
-    stmt = stmt.options(selectinload(cast(Any, Product.category)))
-
-    if sort == "delivery_fastest":
-        if deliveryOptionId:
-            delivery_stmt = select(DeliveryOption).where(
-                DeliveryOption.id == deliveryOptionId
-            )
-            delivery_option = session.exec(delivery_stmt).first()
-            if delivery_option:
-                if delivery_option.speed.value == "express":
-                    stmt = (
-                        stmt.join(ProductDeliveryLink)
-                        .join(DeliveryOption)
-                        .order_by(
-                            cast(
-                                ColumnElement[int], DeliveryOption.estimated_days_min
-                            ).asc(),
-                            cast(ColumnElement[float], Product.price).asc(),
-                        )
-                    )
-                else:
-                    stmt = (
-                        stmt.join(ProductDeliveryLink)
-                        .join(DeliveryOption)
-                        .order_by(
-                            cast(
-                                ColumnElement[int], DeliveryOption.estimated_days_min
-                            ).asc(),
-                            cast(ColumnElement[float], Product.price).asc(),
-                        )
-                    )
-            else:
-                stmt = stmt.order_by(cast(ColumnElement, Product.created_at).desc())
-        else:
-            stmt = (
-                stmt.join(ProductDeliveryLink)
-                .join(DeliveryOption)
-                .order_by(
-                    cast(ColumnElement[int], DeliveryOption.estimated_days_min).asc(),
-                    cast(ColumnElement[float], Product.price).asc(),
-                )
-            )
-    elif sort == "price_asc":
-        stmt = stmt.order_by(cast(ColumnElement[float], Product.price).asc())
-    elif sort == "price_desc":
-        stmt = stmt.order_by(cast(ColumnElement[float], Product.price).desc())
-    else:  # created_desc (default)
-        stmt = stmt.order_by(cast(ColumnElement, Product.created_at).desc())
-
-    products = session.exec(stmt).all()
-
-    # Convert to response format
-    result = []
-    for product in products:
-        product_dict = {
-            "id": product.id,
-            "title": product.title,
-            "description": product.description,
-            "price": product.price,
-            "category_id": product.category_id,
-            "is_saved": product.is_saved,
-            "created_at": product.created_at,
-            "updated_at": product.updated_at,
-            "image_url": f"/products/{product.id}/image"
-            if product.image_data
-            else None,
-            "category": {
-                "id": product.category.id,
-                "name": product.category.name,
-                "created_at": product.category.created_at,
-                "updated_at": product.category.updated_at,
-            }
-            if product.category
-            else None,
-            "delivery_summary": None,
-        }
-
-        if include_delivery_summary and hasattr(product, "delivery_options"):
-            summary = calculate_delivery_summary(product.delivery_options)
-            if summary:
-                product_dict["delivery_summary"] = summary.model_dump()
-
-        result.append(product_dict)
-
-    return result
+        options = _delivery_options_by_id(session) if include_delivery_summary else None
+    return _listing_response(_listing(rows, options, shape), accept)
 
 
-@app.get("/products", response_model=List[ProductRead])
+@app.get("/products", response_model=ListingResponse, responses=LISTING_RESPONSES)
 def get_products(
     category_id: Optional[int] = None,
     include_delivery_summary: bool = Query(False),
+    shape: ListingShape = Query("nested"),
+    accept: Optional[str] = Header(None),
     session: Session = Depends(get_session),
 ):
-    stmt = select(Product).join(Category)
-    if category_id:
-        stmt = stmt.where(Product.category_id == category_id)
-
-    if include_delivery_summary:
-        stmt = stmt.options(selectinload(cast(Any, Product.delivery_options)))
-
-    stmt = stmt.options(selectinload(cast(Any, Product.category)))
-    products = session.exec(stmt).all()
-
-    # Convert to response format with image URLs
-    result = []
-    for product in products:
-        product_dict = {
-            "id": product.id,
-            "title": product.title,
-            "description": product.description,
-            "price": product.price,
-            "category_id": product.category_id,
-            "is_saved": product.is_saved,
-            "created_at": product.created_at,
-            "updated_at": product.updated_at,
-            "image_url": f"/products/{product.id}/image"
-            if product.image_data
-            else None,
-            "category": {
-                "id": product.category.id,
-                "name": product.category.name,
-                "created_at": product.category.created_at,
-                "updated_at": product.category.updated_at,
-            }
-            if product.category
-            else None,
-            "delivery_summary": None,
-        }
-
-        if include_delivery_summary and hasattr(product, "delivery_options"):
-            summary = calculate_delivery_summary(product.delivery_options)
-            if summary:
-                product_dict["delivery_summary"] = summary.model_dump()
-
-        result.append(product_dict)
-
-    return result
+    with phase("orm"):
+        rows = crud.list_products(
+            session,
+            category_id=category_id,
+            with_delivery_option_ids=include_delivery_summary,
+        )
+        options = _delivery_options_by_id(session) if include_delivery_summary else None
+    return _listing_response(_listing(rows, options, shape), accept)
 
 
 @app.get("/products/{product_id}", response_model=ProductReadWithDeliveryOptions)
@@ -370,45 +534,14 @@ def get_product(product_id: int, session: Session = Depends(get_session)):
         active_options, key=lambda o: (o.price, speed_order.get(o.speed.value, 999))
     )
 
-    # Convert to response format with image URL
-    product_dict = {
-        "id": product.id,
-        "title": product.title,
-        "description": product.description,
-        "price": product.price,
-        "category_id": product.category_id,
-        "is_saved": product.is_saved,
-        "created_at": product.created_at,
-        "updated_at": product.updated_at,
-        "image_url": f"/products/{product.id}/image" if product.image_data else None,
-        "category": {
-            "id": product.category.id,
-            "name": product.category.name,
-            "created_at": product.category.created_at,
-            "updated_at": product.category.updated_at,
-        }
-        if product.category
-        else None,
+    return {
+        **product_fields(product),
+        "category": category_fields(product.category) if product.category else None,
         "delivery_options": [
-            {
-                "id": opt.id,
-                "name": opt.name,
-                "description": opt.description,
-                "speed": opt.speed,
-                "price": opt.price,
-                "min_order_amount": opt.min_order_amount,
-                "estimated_days_min": opt.estimated_days_min,
-                "estimated_days_max": opt.estimated_days_max,
-                "is_active": opt.is_active,
-                "created_at": opt.created_at,
-                "updated_at": opt.updated_at,
-            }
-            for opt in active_options_sorted
+            delivery_option_fields(opt) for opt in active_options_sorted
         ],
     }
 
-    return product_dict
-
 
 @app.put("/products/{product_id}", response_model=ProductRead)
 def update_product(
@@ -426,22 +559,7 @@ def update_product(
     if not updated_product:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    # Convert to response format with image URL
-    product_dict = {
-        "id": updated_product.id,
-        "title": updated_product.title,
-        "description": updated_product.description,
-        "price": updated_product.price,
-        "category_id": updated_product.category_id,
-        "is_saved": updated_product.is_saved,
-        "created_at": updated_product.created_at,
-        "updated_at": updated_product.updated_at,
-        "image_url": f"/products/{product_id}/image"
-        if updated_product.image_data
-        else None,
-    }
-
-    return product_dict
+    return product_fields(updated_product)
 
 
 @app.delete("/products/{product_id}")
@@ -452,23 +570,462 @@ def delete_product(product_id: int, session: Session = Depends(get_session)):
     return {"message": "Product deleted successfully"}
 
 
+def _require_product(session: Session, product_id: int) -> None:
+    if not crud.get_product(session, product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+
+
+@app.get("/products/{product_id}/stock", response_model=StockRead)
+def get_product_stock(product_id: int, session: Session = Depends(get_session)):
+    level = inventory.get_stock(session, product_id)
+    if not level:
+        _require_product(session, product_id)
+        raise HTTPException(status_code=404, detail="Stock not tracked for product")
+    return stock_fields(level)
+
+
+@app.put("/products/{product_id}/stock", response_model=StockRead)
+def set_product_stock(
+    product_id: int, stock: StockUpdate, session: Session = Depends(get_session)
+):
+    """Set the units on hand, starting to track the product's stock"""
+    _require_product(session, product_id)
+    try:
+        level = inventory.set_stock(session, product_id, stock.on_hand)
+    except InsufficientStock:
+        raise HTTPException(status_code=409, detail="More units than that are reserved")
+    return stock_fields(level)
+
+
+@app.post(
+    "/products/{product_id}/reservations",
+    status_code=201,
+    response_model=ReservationRead,
+)
+def reserve_product_stock(
+    product_id: int,
+    reservation: ReservationCreate,
+    session: Session = Depends(get_session),
+):
+    """Hold units of the product until the reservation is committed,
+    released or expires"""
+    _require_product(session, product_id)
+    try:
+        return inventory.reserve(
+            session, product_id, reservation.quantity, reservation.ttl_seconds
+        )
+    except InsufficientStock as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+
+@app.get("/reservations/{reservation_id}", response_model=ReservationRead)
+def get_reservation(reservation_id: str, session: Session = Depends(get_session)):
+    reservation = inventory.get_reservation(session, reservation_id)
+    if not reservation:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return reservation
+
+
+@app.post("/reservations/{reservation_id}/commit", response_model=ReservationRead)
+def commit_reservation(reservation_id: str, session: Session = Depends(get_session)):
+    """Take the reserved units out of stock"""
+    try:
+        reservation = inventory.commit_reservation(session, reservation_id)
+    except ReservationNotHeld as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    if not reservation:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return reservation
+
+
+@app.post("/reservations/{reservation_id}/release", response_model=ReservationRead)
+def release_reservation(reservation_id: str, session: Session = Depends(get_session)):
+    """Return the reserved units to stock"""
+    try:
+        reservation = inventory.release_reservation(session, reservation_id)
+    except ReservationNotHeld as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    if not reservation:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    return reservation
+
+
+@app.get("/timings")
+def get_timings():
+    """Per-route phase timings since startup (collected when SERVER_TIMING=1)"""
+    return {"enabled": timing_enabled(), "routes": timing_stats.snapshot()}
+
+
+def require_profile_token(x_profile_token: Optional[str] = Header(None)):
+    if not profiling_enabled():
+        raise HTTPException(status_code=404, detail="Profiling is not enabled")
+    if not check_token(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are not enabled")
+    if not hmac.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.get("/admin/slow-queries", dependencies=[Depends(require_admin_token)])
+def get_slow_queries(
+    limit: int = Query(20, ge=1, le=500),
+    order_by: Literal["total", "max", "count"] = "total",
+):
+    """Statements slower than SLOW_QUERY_MS, grouped by fingerprint"""
+    return {
+        "threshold_ms": SLOW_QUERY_MS,
+        "queries": slow_query_log.top(limit, order_by),
+    }
+
+
+@app.delete("/admin/slow-queries", dependencies=[Depends(require_admin_token)])
+def reset_slow_queries():
+    slow_query_log.reset()
+    return {"message": "Slow-query log cleared"}
+
+
+@app.get("/admin/profiles", dependencies=[Depends(require_profile_token)])
+def list_profiles():
+    """Recent request profiles, newest first"""
+    return {"profiles": profile_store.list()}
+
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_profile_token)])
+def get_profile(profile_id: str):
+    """A request profile as collapsed stacks, for flamegraph.pl or speedscope"""
+    profile = profile_store.read(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(content=profile, media_type="text/plain")
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus metrics, merged across workers when METRICS_DIR is set"""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/images/stats")
+def get_image_stats():
+    """Bytes served per image format since startup"""
+    formats = image_stats.snapshot()
+    total_bytes = sum(stats["bytes"] for stats in formats.values())
+    source_bytes = sum(stats["source_bytes"] for stats in formats.values())
+    return {
+        "formats": formats,
+        "total_bytes": total_bytes,
+        "source_bytes": source_bytes,
+        "bytes_saved": source_bytes - total_bytes,
+    }
+
+
+@app.head("/products/{product_id}/image")
+def head_product_image(
+    product_id: int,
+    w: Optional[int] = Query(None),
+    fmt: Optional[str] = Query(None),
+    accept: Optional[str] = Header(None),
+    session: Session = Depends(get_session),
+):
+    """Answer HEAD from stored metadata without reading the image bytes"""
+    meta = _get_image_meta_or_404(session, product_id)
+    variant = _parse_variant_params(meta, w, fmt, accept)
+    headers = _vary_headers(meta, fmt)
+
+    if variant is None:
+        return Response(
+            media_type=meta.mime_type,
+            headers={
+                **headers,
+                **image_headers(meta),
+                "Content-Length": str(meta.size),
+            },
+        )
+
+    # Variants have no stored size; this is a cache hit after the first render
+    width, variant_fmt = variant
+    image_data = _get_variant_data(session, meta, width, variant_fmt)
+    return Response(
+        media_type=VARIANT_FORMATS[variant_fmt].mime_type,
+        headers={
+            **headers,
+            **image_headers(meta, variant_filename(meta, width, variant_fmt)),
+            "Content-Length": str(len(image_data)),
+        },
+    )
+
+
 @app.get("/products/{product_id}/image")
-def get_product_image(product_id: int, session: Session = Depends(get_session)):
-    product = crud.get_product(session, product_id)
-    if not product:
+def get_product_image(
+    product_id: int,
+    w: Optional[int] = Query(None),
+    fmt: Optional[str] = Query(None),
+    accept: Optional[str] = Header(None),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    session: Session = Depends(get_session),
+):
+    meta = _get_image_meta_or_404(session, product_id)
+    variant = _parse_variant_params(meta, w, fmt, accept)
+    headers = _vary_headers(meta, fmt)
+
+    if variant is None:
+        # Stream straight from the BLOB without loading it into memory
+        headers.update(image_headers(meta))
+        response = _image_response(
+            lambda start, length: crud.iter_product_image(
+                session, product_id, start, length
+            ),
+            meta.size,
+            meta.mime_type,
+            headers,
+            range_header,
+        )
+    else:
+        width, variant_fmt = variant
+        image_data = _get_variant_data(session, meta, width, variant_fmt)
+        headers.update(image_headers(meta, variant_filename(meta, width, variant_fmt)))
+        response = _image_response(
+            lambda start, length: iter([image_data[start : start + length]]),
+            len(image_data),
+            VARIANT_FORMATS[variant_fmt].mime_type,
+            headers,
+            range_header,
+        )
+
+    image_stats.record(
+        response.media_type or meta.mime_type,
+        bytes_served=int(response.headers["content-length"]),
+        # Placeholders have no stored source to compare against
+        source_bytes=meta.size or int(response.headers["content-length"]),
+    )
+    return response
+
+
+@app.put("/products/{product_id}/image", status_code=202, response_model=ImageJobRead)
+async def upload_product_image(
+    product_id: int,
+    request: Request,
+    response: Response,
+    session: Session = Depends(get_session),
+):
+    """Accept a multipart (field "file") or raw image/* upload.
+
+    The body is streamed to a temp file and processed in the background; poll
+    the returned status_url for the outcome.
+    """
+    meta = await run_in_threadpool(crud.get_product_image_meta, session, product_id)
+    if not meta:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    if not product.image_data:
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_IMAGE_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Image upload too large")
+
+    upload_path = await _spool_upload(request)
+    job = image_jobs.submit(session.get_bind().engine, product_id, upload_path)
+
+    status_url = f"/image-jobs/{job.id}"
+    response.headers["Location"] = status_url
+    return _image_job_response(job)
+
+
+@app.get("/image-jobs/{job_id}", response_model=ImageJobRead)
+def get_image_job(job_id: str):
+    job = image_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Image job not found")
+
+    return _image_job_response(job)
+
+
+def _image_job_response(job: ImageJob) -> dict:
+    return {
+        "id": job.id,
+        "product_id": job.product_id,
+        "status": job.status.value,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "status_url": f"/image-jobs/{job.id}",
+    }
+
+
+async def _capped_stream(request: Request, limit: int) -> AsyncGenerator[bytes, None]:
+    """The request body, failing with 413 once more than limit bytes arrive"""
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise HTTPException(status_code=413, detail="Image upload too large")
+        yield chunk
+
+
+async def _spool_upload(request: Request) -> Path:
+    """Stream a multipart or raw upload to a temp file without buffering it
+    in memory. Enforces MAX_IMAGE_UPLOAD_BYTES as bytes arrive."""
+    content_type = request.headers.get("content-type", "").lower()
+    form: Optional[FormData] = None
+    if content_type.startswith("multipart/form-data"):
+        # Starlette spools file parts to disk past 1MB, so the body is capped
+        # while it's parsed, not only once the file part is complete
+        parser = MultiPartParser(
+            request.headers,
+            _capped_stream(request, MAX_IMAGE_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES),
+            max_files=1,
+        )
+        try:
+            form = await parser.parse()
+        except MultiPartException as exc:
+            raise HTTPException(status_code=400, detail=exc.message)
+        upload = form.get("file")
+        if not isinstance(upload, StarletteUploadFile):
+            await form.close()
+            raise HTTPException(
+                status_code=400, detail="Multipart upload must include a 'file' part"
+            )
+        chunks: AsyncIterator[bytes] = _iter_upload_file(upload)
+    elif content_type.startswith("image/") or content_type.startswith(
+        "application/octet-stream"
+    ):
+        chunks = request.stream()
+    else:
+        raise HTTPException(
+            status_code=415,
+            detail="Upload must be multipart/form-data or an image/* body",
+        )
+
+    fd, name = tempfile.mkstemp(prefix="product-image-", suffix=".upload")
+    upload_path = Path(name)
+    try:
+        received = 0
+        with os.fdopen(fd, "wb") as upload_file:
+            async for chunk in chunks:
+                received += len(chunk)
+                if received > MAX_IMAGE_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413, detail="Image upload too large"
+                    )
+                await run_in_threadpool(upload_file.write, chunk)
+
+        if not received:
+            raise HTTPException(status_code=400, detail="Image upload is empty")
+    except BaseException:
+        upload_path.unlink(missing_ok=True)
+        raise
+    finally:
+        if form is not None:
+            await form.close()
+
+    return upload_path
+
+
+async def _iter_upload_file(upload: StarletteUploadFile) -> AsyncIterator[bytes]:
+    while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+        yield chunk
+
+
+def _get_image_meta_or_404(session: Session, product_id: int) -> ImageMeta:
+    meta = crud.get_product_image_meta(session, product_id)
+    if not meta:
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    if not meta.size and not meta.placeholder:
         raise HTTPException(status_code=404, detail="No image found for this product")
 
-    # Return image as streaming response
+    return meta
+
+
+def _parse_variant_params(
+    meta: ImageMeta, w: Optional[int], fmt: Optional[str], accept: Optional[str]
+) -> Optional[Tuple[Optional[int], str]]:
+    """Validate ?w= and ?fmt=, falling back to Accept negotiation for the
+    format. None means serve the stored image as-is; placeholders have no
+    stored image, so they always get a (width, format) to render."""
+    if w is not None and w not in ALLOWED_WIDTHS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Width must be one of {', '.join(map(str, ALLOWED_WIDTHS))}",
+        )
+
+    if fmt is not None and fmt not in VARIANT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Format must be one of {', '.join(VARIANT_FORMATS)}",
+        )
+
+    fmt = fmt or negotiate_format(accept, meta.mime_type)
+    if w is None and fmt is None and not meta.placeholder:
+        return None
+
+    return w, fmt or default_variant_format(meta.mime_type)
+
+
+def _vary_headers(meta: ImageMeta, fmt: Optional[str]) -> Dict[str, str]:
+    # Without an explicit ?fmt= the encoding depends on the Accept header, so
+    # shared caches must key on it too.
+    if fmt or not varies_on_accept(meta.mime_type):
+        return {}
+    return {"Vary": "Accept"}
+
+
+def _get_variant_data(
+    session: Session, meta: ImageMeta, width: Optional[int], fmt: str
+) -> bytes:
+    if meta.placeholder:
+        text = crud.get_product_placeholder_text(session, meta.product_id)
+        if not text:
+            raise HTTPException(status_code=404, detail="Product not found")
+        title, category_name = text
+        return placeholder_cache.get_or_render(
+            title, category_name, width or PLACEHOLDER_SIZE, fmt
+        )
+
+    def render() -> bytes:
+        image_data = crud.get_product_image_data(session, meta.product_id) or b""
+        return get_image_pipeline().render_variant(image_data, width, fmt).result()
+
+    try:
+        return variant_cache.get_or_create(variant_key(meta, width, fmt), render)
+    except OSError:
+        raise HTTPException(
+            status_code=500, detail="Stored image could not be processed"
+        )
+
+
+def _image_response(
+    read: Callable[[int, int], Iterator[bytes]],
+    size: int,
+    media_type: str,
+    headers: Dict[str, str],
+    range_header: Optional[str],
+) -> StreamingResponse:
+    """Build a full or partial image response; `read(start, length)` yields
+    the body."""
+    try:
+        byte_range = parse_range_header(range_header, size)
+    except RangeNotSatisfiable:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(read(0, size), media_type=media_type, headers=headers)
+
+    # Partial content for resumed downloads and CDN range fills
+    headers["Content-Range"] = f"bytes {byte_range.start}-{byte_range.end}/{size}"
+    headers["Content-Length"] = str(byte_range.length)
     return StreamingResponse(
-        io.BytesIO(product.image_data),
-        media_type=product.image_mime_type or "image/jpeg",
-        headers={
-            "Content-Disposition": f'inline; filename="{product.image_filename or f"product_{product_id}.jpg"}"',
-            "Cache-Control": "public, max-age=86400",
-        },
+        read(byte_range.start, byte_range.length),
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
     )
 
 
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Database maintenance commands.
+
+    python -m app.maintenance dedupe-images [--near-duplicates 4 [--merge]]
+
+dedupe-images repairs image reference counts, drops images no product uses,
+optionally finds (and merges) near-duplicate photos by perceptual hash, then
+vacuums so the space is returned to the filesystem. Exact duplicates are
+already shared at ingestion; databases from before image_blobs existed are
+deduplicated by `alembic upgrade head`.
+"""
+
+import argparse
+import os
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import Engine, func, text, update
+from sqlmodel import Session, col, select
+
+from .db import engine
+from .images import hamming_distance
+from .models import ImageBlob, Product
+
+
+@dataclass
+class DedupeReport:
+    blobs_before: int = 0
+    blobs_after: int = 0
+    ref_counts_fixed: int = 0
+    orphans_removed: int = 0
+    orphan_bytes: int = 0
+    near_duplicate_groups: List[List[int]] = field(default_factory=list)
+    merged_blobs: int = 0
+    merged_bytes: int = 0
+    shared_bytes: int = 0  # Bytes not stored thanks to shared images
+    file_bytes_before: int = 0
+    file_bytes_after: int = 0
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return self.file_bytes_before - self.file_bytes_after
+
+
+def find_near_duplicates(hashes: Dict[int, str], max_distance: int) -> List[List[int]]:
+    """Group ids whose 64-bit hashes differ in at most max_distance bits.
+
+    Splits each hash into max_distance + 1 bands: two hashes that close must
+    agree exactly on at least one band, so only ids sharing a band bucket are
+    compared, rather than every pair.
+    """
+    bands = max_distance + 1
+    bounds = [64 * i // bands for i in range(bands + 1)]
+    buckets: Dict[tuple, List[int]] = {}
+    for blob_id, phash in hashes.items():
+        bits = int(phash, 16)
+        for band in range(bands):
+            width = bounds[band + 1] - bounds[band]
+            value = (bits >> bounds[band]) & ((1 << width) - 1)
+            buckets.setdefault((band, value), []).append(blob_id)
+
+    parent = {blob_id: blob_id for blob_id in hashes}
+
+    def root(blob_id: int) -> int:
+        while parent[blob_id] != blob_id:
+            parent[blob_id] = parent[parent[blob_id]]
+            blob_id = parent[blob_id]
+        return blob_id
+
+    for members in buckets.values():
+        for i, first in enumerate(members):
+            for second in members[i + 1 :]:
+                if root(first) != root(second) and (
+                    hamming_distance(hashes[first], hashes[second]) <= max_distance
+                ):
+                    parent[root(second)] = root(first)
+
+    groups: Dict[int, List[int]] = {}
+    for blob_id in hashes:
+        groups.setdefault(root(blob_id), []).append(blob_id)
+    return sorted(sorted(g) for g in groups.values() if len(g) > 1)
+
+
+def dedupe_images(
+    db_engine: Engine,
+    max_distance: Optional[int] = None,
+    merge: bool = False,
+    vacuum: bool = True,
+) -> DedupeReport:
+    report = DedupeReport(file_bytes_before=_database_bytes(db_engine))
+
+    with Session(db_engine) as session:
+        report.blobs_before = session.exec(select(func.count(col(ImageBlob.id)))).one()
+
+        # Triggers keep these right; repair anything written around them
+        connection = session.connection()
+        report.ref_counts_fixed = connection.execute(
+            text(
+                "UPDATE image_blobs SET ref_count = (SELECT count(*) FROM products "
+                "WHERE image_blob_id = image_blobs.id) WHERE ref_count != "
+                "(SELECT count(*) FROM products WHERE image_blob_id = image_blobs.id)"
+            )
+        ).rowcount
+
+        report.orphans_removed, report.orphan_bytes = session.exec(
+            select(
+                func.count(col(ImageBlob.id)),
+                func.coalesce(func.sum(ImageBlob.size), 0),
+            ).where(ImageBlob.ref_count == 0)
+        ).one()
+        connection.execute(text("DELETE FROM image_blobs WHERE ref_count = 0"))
+
+        if max_distance is not None:
+            hashes = {
+                blob_id: phash
+                for blob_id, phash in session.exec(
+                    select(ImageBlob.id, ImageBlob.phash).where(
+                        col(ImageBlob.phash).is_not(None)
+                    )
+                )
+                if blob_id is not None and phash is not None
+            }
+            report.near_duplicate_groups = find_near_duplicates(hashes, max_distance)
+            if merge:
+                for group in report.near_duplicate_groups:
+                    _merge_blobs(session, group, report)
+
+        report.shared_bytes = session.exec(
+            select(
+                func.coalesce(func.sum((ImageBlob.ref_count - 1) * ImageBlob.size), 0)
+            )
+        ).one()
+        report.blobs_after = session.exec(select(func.count(col(ImageBlob.id)))).one()
+        session.commit()
+
+    if vacuum:
+        with db_engine.connect() as conn:
+            conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+            conn.execute(text("VACUUM"))
+            conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+
+    report.file_bytes_after = _database_bytes(db_engine)
+    return report
+
+
+def _merge_blobs(session: Session, group: List[int], report: DedupeReport) -> None:
+    """Point every product in the group at its largest image. The triggers
+    delete the others once nothing references them."""
+    sizes = dict(
+        session.exec(
+            select(ImageBlob.id, ImageBlob.size).where(col(ImageBlob.id).in_(group))
+        ).all()
+    )
+    keep = max(group, key=lambda blob_id: sizes[blob_id])
+    source = session.exec(
+        select(
+            Product.image_mime_type,
+            Product.image_width,
+            Product.image_height,
+            Product.image_preview,
+        ).where(Product.image_blob_id == keep)
+    ).first()
+    if source is None:
+        return
+
+    mime_type, width, height, preview = source
+    session.exec(
+        update(Product)
+        .where(col(Product.image_blob_id).in_([b for b in group if b != keep]))
+        .values(
+            image_blob_id=keep,
+            image_mime_type=mime_type,
+            image_width=width,
+            image_height=height,
+            image_preview=preview,
+            updated_at=datetime.now(UTC),  # Invalidates cached variants
+        )
+    )
+    report.merged_blobs += len(group) - 1
+    report.merged_bytes += sum(sizes[b] for b in group if b != keep)
+
+
+def _database_bytes(db_engine: Engine) -> int:
+    database = db_engine.url.database
+    if not database or database == ":memory:":
+        return 0
+    return sum(
+        os.path.getsize(path)
+        for path in (database, f"{database}-wal")
+        if Path(path).exists()
+    )
+
+
+def _format_bytes(size: int) -> str:
+    value = float(size)
+    for unit in ("B", "KiB", "MiB"):
+        if abs(value) < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GiB"
+
+
+def print_report(report: DedupeReport) -> None:
+    print(f"Images: {report.blobs_before} -> {report.blobs_after}")
+    if report.ref_counts_fixed:
+        print(f"Repaired reference counts on {report.ref_counts_fixed} images")
+    print(
+        f"Removed {report.orphans_removed} unused images "
+        f"({_format_bytes(report.orphan_bytes)})"
+    )
+    for group in report.near_duplicate_groups:
+        print(f"Near-duplicate images: {', '.join(map(str, group))}")
+    if report.merged_blobs:
+        print(
+            f"Merged {report.merged_blobs} near-duplicates "
+            f"({_format_bytes(report.merged_bytes)})"
+        )
+    print(f"Shared images avoid storing {_format_bytes(report.shared_bytes)}")
+    print(
+        f"Database: {_format_bytes(report.file_bytes_before)} -> "
+        f"{_format_bytes(report.file_bytes_after)} "
+        f"({_format_bytes(report.bytes_reclaimed)} reclaimed)"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Database maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    dedupe = commands.add_parser(
+        "dedupe-images", help="Drop unused and duplicate images, then vacuum"
+    )
+    dedupe.add_argument(
+        "--near-duplicates",
+        type=int,
+        metavar="BITS",
+        help="Also report images whose perceptual hashes differ by at most BITS",
+    )
+    dedupe.add_argument(
+        "--merge",
+        action="store_true",
+        help="Point products at the largest image of each near-duplicate group",
+    )
+    dedupe.add_argument("--no-vacuum", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.merge and args.near_duplicates is None:
+        parser.error("--merge requires --near-duplicates")
+
+    report = dedupe_images(
+        engine,
+        max_distance=args.near_duplicates,
+        merge=args.merge,
+        vacuum=not args.no_vacuum,
+    )
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,503 @@
+"""
+Prometheus metrics, served in the text exposition format at GET /metrics.
+
+Counters and histograms are sharded per thread: each thread only ever
+updates its own shard, so recording takes no lock, and a scrape sums the
+shards. Threads come and go (the worker threads idle out), so the shards
+of threads that have exited are folded into one for all of them. Gauges that describe current state (thread pool, DB pool, caches)
+are read by collector callbacks at scrape time instead of being updated
+on the hot path.
+
+With several uvicorn workers, set METRICS_DIR to a directory shared by the
+workers (and emptied before the server starts). Each worker then writes a
+snapshot there every METRICS_FLUSH_SECONDS, and whichever worker serves a
+scrape merges the others' latest snapshots with its own live values.
+Counters and histograms of workers that have exited are kept, so totals
+never go backwards; their gauges are dropped.
+"""
+
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.pool import QueuePool
+
+Labels = Tuple[str, ...]
+Sample = Tuple[Labels, float]
+
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)  # fmt: skip
+
+
+@dataclass
+class Snapshot:
+    """Metric values keyed by (name, label values)"""
+
+    counters: Dict[Tuple[str, Labels], float] = field(default_factory=dict)
+    gauges: Dict[Tuple[str, Labels], float] = field(default_factory=dict)
+    # Per-bucket (not cumulative) counts, then the sum of observations
+    histograms: Dict[Tuple[str, Labels], List[float]] = field(default_factory=dict)
+
+    def merge(self, other: "Snapshot", gauges: bool = True) -> None:
+        for key, value in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0.0) + value
+        if gauges:
+            for key, value in other.gauges.items():
+                self.gauges[key] = self.gauges.get(key, 0.0) + value
+        for key, values in other.histograms.items():
+            current = self.histograms.get(key)
+            if current is None:
+                self.histograms[key] = list(values)
+            else:
+                for i, value in enumerate(values):
+                    current[i] += value
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            kind: [[name, list(labels), value] for (name, labels), value in d.items()]
+            for kind, d in (
+                ("counters", self.counters),
+                ("gauges", self.gauges),
+                ("histograms", self.histograms),
+            )
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Snapshot":
+        snapshot = cls()
+        for kind in ("counters", "gauges", "histograms"):
+            target = getattr(snapshot, kind)
+            for name, labels, value in data.get(kind, []):
+                target[(name, tuple(labels))] = value
+        return snapshot
+
+
+class _Shard:
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self) -> None:
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], List[float]] = {}
+
+    def absorb(self, other: "_Shard") -> None:
+        for key, value in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0.0) + value
+        for key, values in other.histograms.items():
+            current = self.histograms.get(key)
+            if current is None:
+                self.histograms[key] = list(values)
+            else:
+                for i, value in enumerate(values):
+                    current[i] += value
+
+
+@dataclass
+class _Metric:
+    name: str
+    kind: str  # counter, gauge or histogram
+    help: str
+    labelnames: Labels
+    buckets: Tuple[float, ...] = ()
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._lock = threading.Lock()  # Only for registration
+        self._shards: List[Tuple[threading.Thread, _Shard]] = []
+        # Shards of threads that have exited, folded together
+        self._retired = _Shard()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], Iterable[Sample]]] = {}
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._retire_exited()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _retire_exited(self) -> None:
+        """Fold the shards of exited threads into _retired; with _lock held.
+        Nothing writes to them any more, so this loses no updates."""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._retired.absorb(shard)
+        self._shards = live
+
+    def _declare(self, metric: _Metric) -> None:
+        with self._lock:
+            self._metrics[metric.name] = metric
+
+    def counter(self, name: str, help: str, labelnames: Labels = ()) -> "Counter":
+        self._declare(_Metric(name, "counter", help, labelnames))
+        return Counter(self, name)
+
+    def gauge(self, name: str, help: str, labelnames: Labels = ()) -> "Counter":
+        """A gauge moved with inc(-1)/inc(1) from any thread"""
+        self._declare(_Metric(name, "gauge", help, labelnames))
+        return Counter(self, name)
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> "Histogram":
+        self._declare(_Metric(name, "histogram", help, labelnames, buckets))
+        return Histogram(self, name, buckets)
+
+    def callback(
+        self,
+        name: str,
+        help: str,
+        labelnames: Labels,
+        collect: Callable[[], Iterable[Sample]],
+        kind: str = "gauge",
+    ) -> None:
+        """A metric read from `collect` at scrape time, for values the app
+        already keeps; registering a name again replaces its callback"""
+        self._declare(_Metric(name, kind, help, labelnames))
+        with self._lock:
+            self._collectors[name] = collect
+
+    def collect(self) -> Snapshot:
+        """This process's current values"""
+        snapshot = Snapshot()
+        with self._lock:
+            self._retire_exited()
+            # Copied while held, since registering a thread can add to it
+            retired = _Shard()
+            retired.absorb(self._retired)
+            shards = [retired, *(shard for _, shard in self._shards)]
+            collectors = list(self._collectors.items())
+
+        for shard in shards:
+            # dict() copies atomically under the GIL, though the owning
+            # thread may be adding keys meanwhile
+            for key, value in dict(shard.counters).items():
+                metric = self._metrics[key[0]]
+                target = (
+                    snapshot.gauges if metric.kind == "gauge" else snapshot.counters
+                )
+                target[key] = target.get(key, 0.0) + value
+            snapshot.merge(
+                Snapshot(
+                    histograms={
+                        key: list(values)
+                        for key, values in dict(shard.histograms).items()
+                    }
+                )
+            )
+
+        for name, collect in collectors:
+            target = (
+                snapshot.counters
+                if self._metrics[name].kind == "counter"
+                else snapshot.gauges
+            )
+            for labels, value in collect():
+                target[(name, labels)] = value
+        return snapshot
+
+    def render(self, snapshot: Snapshot) -> str:
+        """Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if metric.kind == "histogram":
+                for (name, labels), values in sorted(snapshot.histograms.items()):
+                    if name == metric.name:
+                        lines.extend(_histogram_lines(metric, labels, values))
+                continue
+
+            values_by_key = (
+                snapshot.counters if metric.kind == "counter" else snapshot.gauges
+            )
+            for (name, labels), value in sorted(values_by_key.items()):
+                if name == metric.name:
+                    label_text = _format_labels(metric.labelnames, labels)
+                    lines.append(f"{name}{label_text} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class Counter:
+    __slots__ = ("_registry", "_name")
+
+    def __init__(self, registry: MetricsRegistry, name: str):
+        self._registry = registry
+        self._name = name
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        counters = self._registry._shard().counters
+        key = (self._name, labels)
+        counters[key] = counters.get(key, 0.0) + amount
+
+
+class Histogram:
+    __slots__ = ("_registry", "_name", "_buckets")
+
+    def __init__(
+        self, registry: MetricsRegistry, name: str, buckets: Tuple[float, ...]
+    ):
+        self._registry = registry
+        self._name = name
+        self._buckets = buckets
+
+    def observe(self, value: float, *labels: str) -> None:
+        histograms = self._registry._shard().histograms
+        key = (self._name, labels)
+        values = histograms.get(key)
+        if values is None:
+            # One slot per bucket, one for +Inf, then the sum
+            values = histograms[key] = [0.0] * (len(self._buckets) + 2)
+        values[bisect.bisect_left(self._buckets, value)] += 1
+        values[-1] += value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def _histogram_lines(metric: _Metric, labels: Labels, values: List[float]) -> List[str]:
+    lines = []
+    cumulative = 0.0
+    bounds = [*(repr(b) for b in metric.buckets), "+Inf"]
+    for bound, count in zip(bounds, values[:-1]):
+        cumulative += count
+        label_text = _format_labels(metric.labelnames, labels, f'le="{bound}"')
+        lines.append(f"{metric.name}_bucket{label_text} {_format_value(cumulative)}")
+    label_text = _format_labels(metric.labelnames, labels)
+    lines.append(f"{metric.name}_sum{label_text} {_format_value(values[-1])}")
+    lines.append(f"{metric.name}_count{label_text} {_format_value(cumulative)}")
+    return lines
+
+
+registry = MetricsRegistry()
+
+REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests handled", ("method", "route", "status")
+)
+REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds",
+    "Time to handle HTTP requests, including streaming the body",
+    ("method", "route"),
+)
+IN_PROGRESS = registry.gauge("http_requests_in_progress", "HTTP requests being handled")
+DB_POOL_CHECKOUTS = registry.counter(
+    "db_pool_checkouts_total", "Connections checked out of the DB pool"
+)
+DB_POOL_CHECKOUT_DURATION = registry.histogram(
+    "db_pool_checkout_seconds",
+    "Time to get a DB connection, including waiting for a free one",
+)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkouts and how long they took"""
+
+    def _do_get(self) -> Any:
+        start = time.perf_counter()
+        connection = super()._do_get()
+        DB_POOL_CHECKOUT_DURATION.observe(time.perf_counter() - start)
+        DB_POOL_CHECKOUTS.inc()
+        return connection
+
+
+def register_db_pool(pool: Any) -> None:
+    def collect() -> Iterable[Sample]:
+        yield ("size",), float(pool.size())
+        yield ("checked_out",), float(pool.checkedout())
+        yield ("overflow",), float(max(0, pool.overflow()))
+
+    registry.callback(
+        "db_pool_connections", "DB pool connections by state", ("state",), collect
+    )
+
+
+def register_threadpool(limiter: Any) -> None:
+    """Track the anyio limiter sync endpoints run under; capture it on the
+    event loop (at startup), it can be read from any thread afterwards"""
+
+    def collect() -> Iterable[Sample]:
+        yield ("capacity",), float(limiter.total_tokens)
+        yield ("busy",), float(limiter.borrowed_tokens)
+        yield ("waiting",), float(limiter.statistics().tasks_waiting)
+
+    registry.callback(
+        "threadpool_threads",
+        "Worker threads for sync endpoints; waiting is the queue depth",
+        ("state",),
+        collect,
+    )
+
+
+def register_caches(caches: Dict[str, Any]) -> None:
+    """Expose caches' hits and misses counters (read at scrape time)"""
+
+    def lookups() -> Iterable[Sample]:
+        for name, cache in caches.items():
+            yield (name, "hit"), float(cache.hits)
+            yield (name, "miss"), float(cache.misses)
+
+    def hit_ratio() -> Iterable[Sample]:
+        for name, cache in caches.items():
+            total = cache.hits + cache.misses
+            yield (name,), cache.hits / total if total else 0.0
+
+    registry.callback(
+        "cache_lookups_total",
+        "Cache lookups by result",
+        ("cache", "result"),
+        lookups,
+        kind="counter",
+    )
+    registry.callback(
+        "cache_hit_ratio", "Cache hits / lookups since startup", ("cache",), hit_ratio
+    )
+
+
+def register_image_stats(image_stats: Any) -> None:
+    def collect() -> Iterable[Sample]:
+        for fmt, stats in image_stats.snapshot().items():
+            yield (fmt, "served"), float(stats["bytes"])
+            yield (fmt, "source"), float(stats["source_bytes"])
+
+    registry.callback(
+        "image_bytes_total",
+        "Image bytes served per format, and what serving the stored "
+        "originals instead would have cost",
+        ("format", "kind"),
+        collect,
+        kind="counter",
+    )
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests, their latency and those in flight"""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_with_status(message: Any) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        IN_PROGRESS.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_PROGRESS.inc(amount=-1)
+            # The route template keeps label cardinality bounded
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_DURATION.observe(
+                time.perf_counter() - start, scope["method"], route
+            )
+            REQUESTS.inc(scope["method"], route, status)
+
+
+class SnapshotWriter:
+    """Writes this worker's metrics to METRICS_DIR periodically"""
+
+    def __init__(self, directory: Path, interval: float) -> None:
+        self.directory = directory
+        self.interval = interval
+        self.path = directory / f"worker-{os.getpid()}.json"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(
+            target=self._run, name="metrics-writer", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self) -> None:
+        data = {"pid": os.getpid(), **registry.collect().to_json()}
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(data))
+        os.replace(temporary, self.path)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.write()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect_all(directory: Optional[Path] = None) -> Snapshot:
+    """This process's live values, plus the other workers' snapshots"""
+    snapshot = registry.collect()
+    if directory is None or not directory.exists():
+        return snapshot
+
+    for path in directory.glob("worker-*.json"):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue  # Removed or being replaced; next scrape will see it
+        pid = data.get("pid")
+        if pid == os.getpid():
+            continue
+        snapshot.merge(Snapshot.from_json(data), gauges=_pid_alive(pid))
+    return snapshot
+
+
+def render_metrics() -> str:
+    directory = Path(METRICS_DIR) if METRICS_DIR else None
+    return registry.render(collect_all(directory))
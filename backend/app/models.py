@@ -1,5 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import LargeBinary, Column
+from sqlalchemy import DDL, CheckConstraint, Index, LargeBinary, Column, event
 from typing import Optional, List
 from datetime import datetime, UTC
 from enum import Enum
@@ -27,6 +27,21 @@ class Category(SQLModel, table=True):
     products: List["Product"] = Relationship(back_populates="category")
 
 
+class ImageBlob(SQLModel, table=True):
+    """A distinct stored image, shared by every product that shows it"""
+
+    __tablename__ = "image_blobs"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    sha256: str = Field(unique=True)  # Hex digest of data
+    phash: Optional[str] = Field(default=None, index=True)  # 64-bit dHash, hex
+    size: int
+    # Maintained by triggers on products (see IMAGE_BLOB_TRIGGERS)
+    ref_count: int = Field(default=0)
+    data: bytes = Field(sa_column=Column("data", LargeBinary, nullable=False))
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+
 class Product(SQLModel, table=True):
     __tablename__ = "products"
 
@@ -35,12 +50,18 @@ class Product(SQLModel, table=True):
     description: str
     price: float
 
-    # BLOB storage for images with explicit LargeBinary column
-    image_data: Optional[bytes] = Field(
-        default=None, sa_column=Column("image_data", LargeBinary)
+    # Image bytes live in image_blobs, deduplicated by content
+    image_blob_id: Optional[int] = Field(
+        default=None, foreign_key="image_blobs.id", index=True
     )
     image_mime_type: Optional[str] = Field(default=None)  # e.g., "image/jpeg"
     image_filename: Optional[str] = Field(default=None)  # Original filename
+    image_width: Optional[int] = Field(default=None)
+    image_height: Optional[int] = Field(default=None)
+    # data: URI of a tiny thumbnail, shown while the full image loads
+    image_preview: Optional[str] = Field(default=None)
+    # No stored image; a placeholder is rendered on request instead
+    image_is_placeholder: bool = Field(default=False)
     is_saved: bool = Field(default=False)
 
     created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
@@ -53,6 +74,44 @@ class Product(SQLModel, table=True):
     )
 
 
+# Keep image_blobs.ref_count in step with products however rows change, and
+# drop blobs nothing references any more.
+IMAGE_BLOB_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS image_blob_ref_insert
+    AFTER INSERT ON products WHEN NEW.image_blob_id IS NOT NULL
+    BEGIN
+        UPDATE image_blobs SET ref_count = ref_count + 1
+        WHERE id = NEW.image_blob_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS image_blob_ref_update
+    AFTER UPDATE OF image_blob_id ON products
+    WHEN OLD.image_blob_id IS NOT NEW.image_blob_id
+    BEGIN
+        UPDATE image_blobs SET ref_count = ref_count + 1
+        WHERE id = NEW.image_blob_id;
+        UPDATE image_blobs SET ref_count = ref_count - 1
+        WHERE id = OLD.image_blob_id;
+        DELETE FROM image_blobs WHERE id = OLD.image_blob_id AND ref_count <= 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS image_blob_ref_delete
+    AFTER DELETE ON products WHEN OLD.image_blob_id IS NOT NULL
+    BEGIN
+        UPDATE image_blobs SET ref_count = ref_count - 1
+        WHERE id = OLD.image_blob_id;
+        DELETE FROM image_blobs WHERE id = OLD.image_blob_id AND ref_count <= 0;
+    END
+    """,
+]
+
+for _trigger in IMAGE_BLOB_TRIGGERS:
+    event.listen(SQLModel.metadata.tables["products"], "after_create", DDL(_trigger))
+
+
 class DeliverySpeed(str, Enum):
     STANDARD = "standard"
     EXPRESS = "express"
@@ -80,3 +139,87 @@ class DeliveryOption(SQLModel, table=True):
     products: List["Product"] = Relationship(
         back_populates="delivery_options", link_model=ProductDeliveryLink
     )
+
+
+class StockLevel(SQLModel, table=True):
+    """A product's stock; units held by reservations count in reserved until
+    they're committed (and leave on_hand) or released"""
+
+    __tablename__ = "stock_levels"
+    __table_args__ = (
+        CheckConstraint("reserved >= 0 AND reserved <= on_hand", name="stock_held"),
+    )
+
+    product_id: int = Field(foreign_key="products.id", primary_key=True)
+    on_hand: int = Field(default=0, ge=0)
+    reserved: int = Field(default=0, ge=0)
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+    @property
+    def available(self) -> int:
+        return self.on_hand - self.reserved
+
+
+class ReservationStatus(str, Enum):
+    HELD = "held"
+    COMMITTED = "committed"
+    RELEASED = "released"
+    EXPIRED = "expired"
+
+
+class StockReservation(SQLModel, table=True):
+    __tablename__ = "stock_reservations"
+    # Finds a product's held reservations that have expired
+    __table_args__ = (
+        Index("ix_stock_reservations_held", "product_id", "status", "expires_at"),
+    )
+
+    id: str = Field(primary_key=True)  # Random hex, handed to the client
+    product_id: int = Field(foreign_key="products.id")
+    quantity: int = Field(gt=0)
+    status: ReservationStatus = Field(default=ReservationStatus.HELD)
+    expires_at: datetime
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+
+class Order(SQLModel, table=True):
+    """A placed order, priced when it was placed"""
+
+    __tablename__ = "orders"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    item_count: int
+    subtotal: float
+    delivery_option_id: Optional[int] = Field(
+        default=None, foreign_key="delivery_options.id"
+    )
+    delivery_price: float = 0
+    total: float
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
+
+
+class OrderLine(SQLModel, table=True):
+    __tablename__ = "order_lines"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    order_id: int = Field(foreign_key="orders.id", index=True)
+    product_id: int = Field(foreign_key="products.id")
+    # As the product was when ordered
+    title: str
+    unit_price: float
+    quantity: int = Field(gt=0)
+    line_total: float
+
+
+class IdempotencyKey(SQLModel, table=True):
+    """An Idempotency-Key an order was placed with; a retry sending it
+    again gets that order back rather than placing another"""
+
+    __tablename__ = "idempotency_keys"
+
+    key: str = Field(primary_key=True, max_length=255)
+    # sha256 of the request, so the key can't be reused for another order
+    request_hash: str
+    order_id: int = Field(foreign_key="orders.id")
+    created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
@@ -0,0 +1,223 @@
+"""
+Orders.
+
+Every order is placed with an Idempotency-Key, which is stored with it.
+A retry that sends the key again gets the order placed the first time
+back rather than placing another, and a key can't be reused for a
+different order.
+
+Placing an order is one short write transaction. The cart is priced and
+checked before it begins, so while it holds SQLite's single write lock it
+only inserts the order and its key, takes the units out of stock
+(inventory.take_stock) and inserts its lines. The key is inserted in the
+same transaction as the order, so of two requests racing with one key,
+only one places an order; the other waits for the lock, finds the key
+taken, rolls back and replays the order the first placed. An order for
+more units than are available rolls back with InsufficientStock.
+"""
+
+import hashlib
+from datetime import UTC, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple, cast
+
+from sqlalchemy import bindparam, insert
+from sqlalchemy import select as sa_select
+from sqlalchemy.engine import Connection
+from sqlmodel import Session, col
+
+from . import crud
+from .db import write_transaction
+from .inventory import take_stock
+from .models import IdempotencyKey, Order, OrderLine
+from .schemas import CartItem, OrderCreate
+from .serializers import order_fields, order_line_fields
+
+
+class ProductsNotFound(Exception):
+    """Raised when items name products that don't exist"""
+
+    def __init__(self, product_ids: List[int]):
+        super().__init__(f"Products not found: {', '.join(map(str, product_ids))}")
+        self.product_ids = product_ids
+
+
+class DeliveryOptionUnavailable(Exception):
+    """Raised when an order can't ship with the delivery option chosen"""
+
+
+class IdempotencyKeyReused(Exception):
+    """Raised when an Idempotency-Key is sent again with a different order"""
+
+    def __init__(self) -> None:
+        super().__init__("Idempotency-Key was already used for a different order")
+
+
+class _KeyTaken(Exception):
+    """The Idempotency-Key was stored by a request placing the same order"""
+
+
+# Built once; the write transaction only binds and runs them
+INSERT_ORDER = insert(Order).returning(col(Order.id))
+INSERT_ORDER_LINES = insert(OrderLine)
+# Not on_conflict_do_nothing(), which SQLAlchemy compiles on every run
+INSERT_IDEMPOTENCY_KEY = (
+    insert(IdempotencyKey).prefix_with("OR IGNORE").returning(col(IdempotencyKey.key))
+)
+IDEMPOTENCY_KEY = sa_select(
+    col(IdempotencyKey.request_hash), col(IdempotencyKey.order_id)
+).where(col(IdempotencyKey.key) == bindparam("key"))
+ORDER = sa_select(
+    col(Order.id),
+    col(Order.item_count),
+    col(Order.subtotal),
+    col(Order.delivery_option_id),
+    col(Order.delivery_price),
+    col(Order.total),
+    col(Order.created_at),
+).where(col(Order.id) == bindparam("order_id"))
+ORDER_LINES = (
+    sa_select(
+        col(OrderLine.product_id),
+        col(OrderLine.title),
+        col(OrderLine.unit_price),
+        col(OrderLine.quantity),
+        col(OrderLine.line_total),
+    )
+    .where(col(OrderLine.order_id) == bindparam("order_id"))
+    .order_by(col(OrderLine.id))
+)
+
+
+def cents(amount: float) -> int:
+    # Prices have at most 2 decimal places; sum them as integers
+    return round(amount * 100)
+
+
+def price_lines(
+    session: Session, items: Sequence[CartItem]
+) -> Tuple[List[Dict[str, Any]], int]:
+    """Each item's line, priced as its product is now, and the subtotal in
+    cents; ProductsNotFound if any of the products don't exist"""
+    product_ids = [item.product_id for item in items]
+    # Unpacked as tuples; Row attribute access is slow over a large cart
+    products = {
+        product_id: (title, price)
+        for product_id, title, price in crud.get_cart_products(session, product_ids)
+    }
+    missing = sorted(set(product_ids) - products.keys())
+    if missing:
+        raise ProductsNotFound(missing)
+
+    lines = []
+    subtotal = 0
+    for item in items:
+        title, price = products[item.product_id]
+        line_total = cents(price) * item.quantity
+        subtotal += line_total
+        lines.append(
+            {
+                "product_id": item.product_id,
+                "title": title.strip(),
+                "unit_price": price,
+                "quantity": item.quantity,
+                "line_total": line_total / 100,
+            }
+        )
+    return lines, subtotal
+
+
+def _delivery_price(session: Session, order: OrderCreate, subtotal: int) -> int:
+    """The chosen delivery option's price in cents, 0 if none was chosen"""
+    if order.delivery_option_id is None:
+        return 0
+    product_ids = [item.product_id for item in order.items]
+    for option in crud.get_common_delivery_options(session, product_ids):
+        if option.id == order.delivery_option_id:
+            if cents(option.min_order_amount or 0) > subtotal:
+                raise DeliveryOptionUnavailable(
+                    "Order is below the delivery option's minimum"
+                )
+            return cents(option.price)
+    raise DeliveryOptionUnavailable("Delivery option not available for this order")
+
+
+def _request_hash(order: OrderCreate) -> str:
+    return hashlib.sha256(order.model_dump_json().encode()).hexdigest()
+
+
+def _replay(session: Session, key: str, request_hash: str) -> Optional[Dict[str, Any]]:
+    """The order placed with the key, if one was"""
+    row = session.connection().execute(IDEMPOTENCY_KEY, {"key": key}).first()
+    if row is None:
+        return None
+    if row.request_hash != request_hash:
+        raise IdempotencyKeyReused()
+    return get_order(session, row.order_id)
+
+
+def get_order(session: Session, order_id: int) -> Optional[Dict[str, Any]]:
+    """OrderRead's fields, in two queries; None if there's no such order"""
+    conn = session.connection()
+    order = conn.execute(ORDER, {"order_id": order_id}).first()
+    if order is None:
+        return None
+    lines = conn.execute(ORDER_LINES, {"order_id": order_id}).all()
+    return order_fields(order, [order_line_fields(line) for line in lines])
+
+
+def place_order(
+    session: Session, key: str, order: OrderCreate
+) -> Tuple[Dict[str, Any], bool]:
+    """OrderRead's fields for the order placed with the Idempotency-Key,
+    and whether it had been placed already; ProductsNotFound,
+    DeliveryOptionUnavailable, IdempotencyKeyReused or
+    inventory.InsufficientStock if it can't be"""
+    request_hash = _request_hash(order)
+    placed = _replay(session, key, request_hash)
+    if placed is not None:
+        return placed, True
+
+    lines, subtotal = price_lines(session, order.items)
+    quantities: Dict[int, int] = {}
+    for item in order.items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    delivery_price = _delivery_price(session, order, subtotal)
+    # Naive UTC, as datetimes come back from SQLite, so replays match
+    now = datetime.now(UTC).replace(tzinfo=None)
+    values = {
+        "item_count": sum(item.quantity for item in order.items),
+        "subtotal": subtotal / 100,
+        "delivery_option_id": order.delivery_option_id,
+        "delivery_price": delivery_price / 100,
+        "total": (subtotal + delivery_price) / 100,
+        "created_at": now,
+    }
+
+    def operation(conn: Connection) -> int:
+        order_id = cast(int, conn.execute(INSERT_ORDER, values).scalar_one())
+        stored = conn.execute(
+            INSERT_IDEMPOTENCY_KEY,
+            {
+                "key": key,
+                "request_hash": request_hash,
+                "order_id": order_id,
+                "created_at": now,
+            },
+        ).first()
+        if stored is None:
+            raise _KeyTaken()
+        take_stock(conn, quantities, now)
+        conn.execute(
+            INSERT_ORDER_LINES, [{"order_id": order_id, **line} for line in lines]
+        )
+        return order_id
+
+    try:
+        order_id = write_transaction(session, operation)
+    except _KeyTaken:
+        # A request with the same key committed its order after the check
+        # above; this one's was rolled back
+        placed = _replay(session, key, request_hash)
+        assert placed is not None
+        return placed, True
+    return order_fields(Order(id=order_id, **values), lines), False
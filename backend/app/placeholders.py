@@ -0,0 +1,131 @@
+"""
+Placeholder images for products whose image couldn't be ingested.
+
+Nothing is stored for placeholders: they're drawn on request at the size and
+format asked for, and kept in a bounded in-memory LRU keyed by what's drawn
+on them. Loaded fonts are cached per size, so the font lookup (which usually
+fails over to Pillow's built-in font) happens once rather than per render.
+"""
+
+import io
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Optional, Tuple, Union
+
+from PIL import Image, ImageDraw, ImageFont
+
+from .images import VARIANT_FORMATS
+
+# Size of the "original" placeholder, matching the images it replaces
+PLACEHOLDER_SIZE = 300
+
+_PlaceholderKey = Tuple[str, Optional[str], int, str]
+
+
+class PlaceholderCache:
+    """Byte-bounded LRU of rendered placeholders"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[_PlaceholderKey, bytes]" = OrderedDict()
+        self._total_bytes = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_render(
+        self, title: str, category_name: Optional[str], size: int, fmt: str
+    ) -> bytes:
+        key = (title, category_name, size, fmt)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        # Render outside the lock; a concurrent miss just renders twice
+        data = render_placeholder_image(title, category_name, size, fmt)
+        with self._lock:
+            self._total_bytes -= len(self._entries.pop(key, b""))
+            self._entries[key] = data
+            self._total_bytes += len(data)
+            while self._total_bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+        return data
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+
+@lru_cache(maxsize=16)
+def _load_font(size: int) -> Union[ImageFont.FreeTypeFont, ImageFont.ImageFont]:
+    try:
+        return ImageFont.truetype("Arial", size)
+    except OSError:
+        return ImageFont.load_default(size)
+
+
+def render_placeholder_image(
+    title: str,
+    category_name: Optional[str],
+    size: int = PLACEHOLDER_SIZE,
+    fmt: str = "png",
+) -> bytes:
+    """Render a square placeholder showing the product title and category"""
+    # Everything is laid out for 300px and scaled
+    scale = size / PLACEHOLDER_SIZE
+
+    # Simple placeholder image with beige background (sand.100)
+    image = Image.new("RGB", (size, size), color=(245, 245, 244))
+    draw = ImageDraw.Draw(image)
+
+    # Draw a border
+    margin = round(10 * scale)
+    draw.rectangle(
+        [margin, margin, size - margin, size - margin],
+        outline=(200, 200, 200),
+        width=max(1, round(2 * scale)),
+    )
+
+    # Add text (product title truncated), centered
+    title = title[:30] + "..." if len(title) > 30 else title
+    font = _load_font(max(1, round(16 * scale)))
+
+    text_bbox = draw.textbbox((0, 0), title, font=font)
+    text_width = text_bbox[2] - text_bbox[0]
+    text_height = text_bbox[3] - text_bbox[1]
+    x = (size - text_width) // 2
+    y = (size - text_height) // 2
+    draw.text((x, y), title, fill=(100, 100, 100), font=font)
+
+    # Add category text below
+    category_text = f"Category: {category_name or 'Unknown'}"
+    cat_bbox = draw.textbbox((0, 0), category_text, font=font)
+    cat_x = (size - (cat_bbox[2] - cat_bbox[0])) // 2
+    draw.text(
+        (cat_x, y + round(30 * scale)), category_text, fill=(150, 150, 150), font=font
+    )
+
+    variant_format = VARIANT_FORMATS[fmt]
+    buffer = io.BytesIO()
+    image.save(buffer, format=variant_format.pil_format, **variant_format.save_options)
+    return buffer.getvalue()
+
+
+placeholder_cache = PlaceholderCache(
+    max_bytes=int(os.getenv("PLACEHOLDER_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+)
@@ -0,0 +1,274 @@
+"""
+On-demand profiling of single requests.
+
+Set PROFILE_TOKEN to enable it. A request carrying that token in an
+X-Profile-Token header then runs under a sampling profiler: a thread
+snapshots the stacks of the threads serving the request (the event loop,
+and the worker a sync endpoint runs in) every PROFILE_INTERVAL_MS. The
+samples are saved in the collapsed-stack format flamegraph.pl, inferno
+and speedscope read, and the response's X-Profile-Id header names the
+profile to fetch from /admin/profiles, with the same header (requests to
+/admin aren't profiled themselves).
+
+The token is only read from the header, never the URL, which access
+logs and proxies record; a `profile` query parameter is just an on/off
+flag, and a request flagged with it is refused without the header.
+Without PROFILE_TOKEN, or without either, requests pass straight
+through. Samples of the event loop thread can include other requests it
+interleaves with the profiled one.
+"""
+
+import hmac
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from types import FrameType
+from typing import Any, Deque, Dict, Iterator, List, Optional
+from urllib.parse import parse_qs, parse_qsl, urlencode
+
+from starlette.responses import JSONResponse
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_DIR = Path(
+    os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "store-profiles"))
+)
+# Profiles kept on disk; the oldest are deleted beyond this
+PROFILE_KEEP = 50
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar(
+    "request_profile", default=None
+)
+
+
+def profiling_enabled() -> bool:
+    return bool(PROFILE_TOKEN)
+
+
+def check_token(token: Optional[str]) -> bool:
+    return bool(PROFILE_TOKEN) and hmac.compare_digest(
+        (token or "").encode(), PROFILE_TOKEN.encode()
+    )
+
+
+_switch_lock = threading.Lock()
+_active_profiles = 0
+_default_switch_interval = sys.getswitchinterval()
+
+
+def _sampling_started(interval: float) -> None:
+    """The sampler only runs when it gets the GIL, which a busy thread
+    holds for the switch interval (5ms by default); shorten it while any
+    request is profiled"""
+    global _active_profiles, _default_switch_interval
+    with _switch_lock:
+        if _active_profiles == 0:
+            _default_switch_interval = sys.getswitchinterval()
+        _active_profiles += 1
+        sys.setswitchinterval(min(interval, _default_switch_interval))
+
+
+def _sampling_stopped() -> None:
+    global _active_profiles
+    with _switch_lock:
+        _active_profiles -= 1
+        if _active_profiles == 0:
+            sys.setswitchinterval(_default_switch_interval)
+
+
+def _frame_name(frame: FrameType) -> str:
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{frame.f_code.co_qualname}"
+
+
+class RequestProfile:
+    """Samples the stacks of the threads registered with it"""
+
+    def __init__(self, interval: float) -> None:
+        self.id = uuid.uuid4().hex[:16]
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._threads: Dict[int, str] = {}
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def add_thread(self, ident: int, label: str) -> None:
+        self._threads = {**self._threads, ident: label}
+
+    def remove_thread(self, ident: int) -> None:
+        self._threads = {k: v for k, v in self._threads.items() if k != ident}
+
+    def start(self) -> None:
+        _sampling_started(self.interval)
+        self._sampler = threading.Thread(
+            target=self._run, name=f"profiler-{self.id}", daemon=True
+        )
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+            _sampling_stopped()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, label in self._threads.items():
+                frame: Optional[FrameType] = frames.get(ident)
+                names = []
+                while frame is not None:
+                    names.append(_frame_name(frame))
+                    frame = frame.f_back
+                if names:
+                    names.append(label)
+                    self.stacks[";".join(reversed(names))] += 1
+                    self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(
+            f"{stack} {count}\n" for stack, count in sorted(self.stacks.items())
+        )
+
+
+@contextmanager
+def profiled_thread(label: str = "worker") -> Iterator[None]:
+    """Sample the calling thread while the current request is profiled"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    ident = threading.get_ident()
+    profile.add_thread(ident, label)
+    try:
+        yield
+    finally:
+        profile.remove_thread(ident)
+
+
+class ProfileStore:
+    """Profiles saved under PROFILE_DIR, newest last"""
+
+    def __init__(self, directory: Path, keep: int = PROFILE_KEEP) -> None:
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._index: Deque[Dict[str, Any]] = deque()
+        self._keep = keep
+
+    def path(self, profile_id: str) -> Path:
+        return self.directory / f"{profile_id}.collapsed"
+
+    def save(self, profile: RequestProfile, info: Dict[str, Any]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path(profile.id).write_text(profile.collapsed())
+        with self._lock:
+            self._index.append({"id": profile.id, **info})
+            while len(self._index) > self._keep:
+                evicted = self._index.popleft()
+                self.path(evicted["id"]).unlink(missing_ok=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(reversed(self._index))
+
+    def read(self, profile_id: str) -> Optional[str]:
+        # Ids are hex, so this can't escape the directory
+        if not profile_id.isalnum():
+            return None
+        try:
+            return self.path(profile_id).read_text()
+        except FileNotFoundError:
+            return None
+
+
+profile_store = ProfileStore(PROFILE_DIR)
+
+
+def _requested_token(scope: Any) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"x-profile-token":
+            return value.decode("latin-1")
+    return None
+
+
+def _profile_flag(scope: Any) -> bool:
+    """Whether `?profile` (or `?profile=1`) asks for a profile"""
+    if b"profile" not in scope["query_string"]:
+        return False
+    query = parse_qs(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+    values = query.get("profile", [])
+    return bool(values) and values[0].lower() not in ("0", "false", "no")
+
+
+def _query_without_flag(scope: Any) -> str:
+    pairs = parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+    return urlencode([(k, v) for k, v in pairs if k != "profile"])
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that ask for it with the token"""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        # /admin requests carry the token to read profiles, not to be profiled
+        if (
+            scope["type"] != "http"
+            or not PROFILE_TOKEN
+            or scope["path"].startswith("/admin/")
+        ):
+            await self.app(scope, receive, send)
+            return
+        token = _requested_token(scope)
+        if token is None and not _profile_flag(scope):
+            await self.app(scope, receive, send)
+            return
+        if not check_token(token):
+            detail = (
+                "Profiling needs the token in an X-Profile-Token header"
+                if token is None
+                else "Invalid profiling token"
+            )
+            response = JSONResponse({"detail": detail}, status_code=403)
+            await response(scope, receive, send)
+            return
+
+        profile = RequestProfile(PROFILE_INTERVAL_MS / 1000)
+        profile.add_thread(threading.get_ident(), "event-loop")
+        context_token = _current.set(profile)
+
+        async def send_with_id(message: Any) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-profile-id", profile.id.encode()),
+                ]
+            await send(message)
+
+        start = time.perf_counter()
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.stop()
+            _current.reset(context_token)
+            profile_store.save(
+                profile,
+                {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": _query_without_flag(scope),
+                    "created_at": time.time(),
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+                    "samples": profile.samples,
+                },
+            )
@@ -0,0 +1,107 @@
+"""
+Per-request SQL statement counting.
+
+Listeners on every Engine count the statements executed, and the time spent
+in them, while a QueryStats is active in the current context. The middleware
+opens one per request, logs requests that run suspiciously many, and with
+QUERY_HEADERS=1 reports it in the X-Query-Count and X-Query-Time response
+headers; tests turn that on and hold endpoints to a query budget with them,
+so an N+1 pattern (a query per row) fails instead of slowing down quietly.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator, List, Optional
+
+from sqlalchemy import Engine, event
+
+QUERY_HEADERS_ENABLED = os.getenv("QUERY_HEADERS", "").lower() in ("1", "true", "yes")
+# Requests issuing more statements than this are logged as likely N+1s
+QUERY_COUNT_WARNING = int(os.getenv("QUERY_COUNT_WARNING", "50"))
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    seconds: float = 0.0
+    statements: List[str] = field(default_factory=list)
+    record_statements: bool = False
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def count_queries(record_statements: bool = False) -> Iterator[QueryStats]:
+    """Count statements run in this context (and threads it hands work to)"""
+    stats = QueryStats(record_statements=record_statements)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        # Overwritten, not stacked, so a statement that raised leaves nothing
+        conn.info["query_start"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    start = conn.info.pop("query_start", None)
+    if stats is None or start is None:
+        return
+    stats.seconds += time.perf_counter() - start
+    stats.count += 1
+    if stats.record_statements:
+        stats.statements.append(statement)
+
+
+class QueryCountMiddleware:
+    """ASGI middleware counting each request's statements, and adding
+    X-Query-Count / X-Query-Time to its response when QUERY_HEADERS is set.
+
+    Headers go out with the response start, so statements a streaming body
+    runs afterwards are not included.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with count_queries() as stats:
+
+            async def send_with_stats(message: Any) -> None:
+                if message["type"] == "http.response.start":
+                    if QUERY_HEADERS_ENABLED:
+                        message["headers"] = [
+                            *message.get("headers", []),
+                            (b"x-query-count", str(stats.count).encode()),
+                            (
+                                b"x-query-time",
+                                f"{stats.seconds * 1000:.2f}ms".encode(),
+                            ),
+                        ]
+                    if stats.count > QUERY_COUNT_WARNING:
+                        print(
+                            f"{scope['method']} {scope['path']} ran "
+                            f"{stats.count} SQL statements; possible N+1 query"
+                        )
+                await send(message)
+
+            await self.app(scope, receive, send_with_stats)
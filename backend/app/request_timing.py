@@ -0,0 +1,221 @@
+"""
+Per-phase request timing, reported in a Server-Timing header.
+
+Enabled with SERVER_TIMING=1. While a request is timed, code wraps its
+phases in `phase(name)`; TimedRoute and TimedJSONResponse add the phases
+FastAPI itself runs:
+
+    db        time inside SQL statements (from query_stats)
+    orm       executing queries and building model objects, including db
+    summary   calculate_delivery_summary
+    handler   the endpoint function
+    validate  response validation and conversion to JSON-able data
+    render    encoding the JSON or MessagePack body
+    total     until the response starts
+
+Phases can nest, so they don't add up to total. Every timed request also
+feeds timing_stats, the in-memory aggregate served by GET /timings.
+"""
+
+import inspect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Deque, Dict, Iterator, Optional
+
+from fastapi.routing import APIRoute
+
+from .profiling import profiled_thread
+from .query_stats import current_query_stats
+from .responses import MsgPackResponse, ORJSONResponse
+
+TIMING_ENABLED = os.getenv("SERVER_TIMING", "").lower() in ("1", "true", "yes")
+# Recent samples kept per route and phase for percentiles
+TIMING_SAMPLES = 1000
+
+_current: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "request_timing", default=None
+)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Add the time spent in the block to the current request's `name`
+    phase; a no-op unless the request is being timed"""
+    phases = _current.get()
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + time.perf_counter() - start
+
+
+class TimingStats:
+    """Per-route phase timings since startup: counts, totals, maxima and
+    percentiles over the most recent samples"""
+
+    def __init__(self, samples: int = TIMING_SAMPLES) -> None:
+        self._lock = threading.Lock()
+        self._samples = samples
+        self._routes: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def record(self, route: str, phases: Dict[str, float]) -> None:
+        with self._lock:
+            route_stats = self._routes.setdefault(route, {})
+            for name, seconds in phases.items():
+                stats = route_stats.get(name)
+                if stats is None:
+                    stats = route_stats[name] = {
+                        "count": 0,
+                        "total": 0.0,
+                        "max": 0.0,
+                        "recent": deque(maxlen=self._samples),
+                    }
+                stats["count"] += 1
+                stats["total"] += seconds
+                stats["max"] = max(stats["max"], seconds)
+                stats["recent"].append(seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        with self._lock:
+            return {
+                route: {name: _summarize(stats) for name, stats in route_stats.items()}
+                for route, route_stats in self._routes.items()
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+def _summarize(stats: Dict[str, Any]) -> Dict[str, float]:
+    recent: Deque[float] = stats["recent"]
+    ordered = sorted(recent)
+    return {
+        "count": stats["count"],
+        "mean_ms": round(stats["total"] / stats["count"] * 1000, 3),
+        "p50_ms": round(ordered[(len(ordered) - 1) // 2] * 1000, 3),
+        "p95_ms": round(ordered[int((len(ordered) - 1) * 0.95)] * 1000, 3),
+        "max_ms": round(stats["max"] * 1000, 3),
+    }
+
+
+timing_stats = TimingStats()
+
+
+def timing_enabled() -> bool:
+    return TIMING_ENABLED
+
+
+def format_server_timing(phases: Dict[str, float]) -> str:
+    return ", ".join(
+        f"{name};dur={seconds * 1000:.2f}" for name, seconds in phases.items()
+    )
+
+
+class TimedRoute(APIRoute):
+    """Times the endpoint call, and whatever FastAPI does after it to turn
+    the result into a response, as the handler and validate phases"""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Any) -> Any:
+            phases = _current.get()
+            if phases is None:
+                return await handler(request)
+            start = time.perf_counter()
+            response = await handler(request)
+            # All of the route but the endpoint and JSON encoding. An endpoint
+            # returning a response renders it itself, inside handler, and
+            # FastAPI then has nothing left to validate.
+            phases["validate"] = max(
+                0.0,
+                time.perf_counter()
+                - start
+                - phases.get("handler", 0.0)
+                - phases.get("render", 0.0),
+            )
+            return response
+
+        return timed_handler
+
+
+def _timed_endpoint(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    # Keeps the signature FastAPI inspects, and sync endpoints sync
+    if inspect.iscoroutinefunction(endpoint):
+
+        @wraps(endpoint)
+        async def timed_async(*args: Any, **kwargs: Any) -> Any:
+            with phase("handler"):
+                return await endpoint(*args, **kwargs)
+
+        return timed_async
+
+    @wraps(endpoint)
+    def timed(*args: Any, **kwargs: Any) -> Any:
+        # Sync endpoints run in a worker thread the profiler must also sample
+        with phase("handler"), profiled_thread():
+            return endpoint(*args, **kwargs)
+
+    return timed
+
+
+class TimedJSONResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        with phase("render"):
+            return super().render(content)
+
+
+class TimedMsgPackResponse(MsgPackResponse):
+    def render(self, content: Any) -> bytes:
+        with phase("render"):
+            return super().render(content)
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware timing requests when TIMING_ENABLED. Must run inside
+    QueryCountMiddleware, which supplies the db phase."""
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not TIMING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        phases: Dict[str, float] = {}
+        token = _current.set(phases)
+        start = time.perf_counter()
+
+        async def send_with_timing(message: Any) -> None:
+            if message["type"] == "http.response.start":
+                stats = current_query_stats()
+                if stats is not None:
+                    phases["db"] = stats.seconds
+                phases["total"] = time.perf_counter() - start
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"server-timing", format_server_timing(phases).encode()),
+                ]
+                # The route template, so /products/1 and /products/2 share stats
+                route = scope.get("route")
+                path = getattr(route, "path", None) or "unmatched"
+                timing_stats.record(f"{scope['method']} {path}", phases)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
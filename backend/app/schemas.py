@@ -1,7 +1,7 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from datetime import datetime
-from app.models import DeliverySpeed
+from app.models import DeliverySpeed, ReservationStatus
 
 
 class CategoryBase(BaseModel):
@@ -58,12 +58,20 @@ class ProductUpdate(BaseModel):
     category_id: Optional[int] = None
 
 
-class ProductRead(ProductBase):
+class ProductReadBase(ProductBase):
     id: int
     category_id: int
     image_url: Optional[str] = None  # Generated URL for frontend
+    # Known once an image is stored, so grids can reserve space and paint
+    # the preview before the image itself arrives
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
+    image_preview: Optional[str] = None  # data: URI of a tiny thumbnail
     created_at: datetime
     updated_at: datetime
+
+
+class ProductRead(ProductReadBase):
     category: Optional[CategoryRead] = None
     delivery_summary: Optional["DeliverySummary"] = None
 
@@ -138,3 +146,138 @@ class DeliverySummary(BaseModel):
 
 class ProductReadWithDeliveryOptions(ProductRead):
     delivery_options: List[DeliveryOptionRead] = []
+
+
+class NormalizedProductRead(ProductReadBase):
+    """A listed product referring to its category and delivery options by
+    id, as NormalizedProductListing's side tables hold them"""
+
+    delivery_summary: Optional[DeliverySummary] = None
+    delivery_option_ids: Optional[List[int]] = None
+
+
+class NormalizedProductListing(BaseModel):
+    """A product listing with each category and delivery option sent once"""
+
+    products: List[NormalizedProductRead]
+    categories: List[CategoryRead]
+    delivery_options: List[DeliveryOptionRead] = []
+
+
+class ColumnarProductListing(BaseModel):
+    """A normalized listing with one array per NormalizedProductRead field,
+    item i of each belonging to product i. The delivery_summary column
+    holds indexes into delivery_summaries, which lists each distinct
+    summary once."""
+
+    count: int
+    columns: Dict[str, List[Any]]
+    categories: List[CategoryRead]
+    delivery_options: List[DeliveryOptionRead] = []
+    delivery_summaries: List[DeliverySummary] = []
+
+
+class ImageJobRead(BaseModel):
+    id: str
+    product_id: int
+    status: str
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    status_url: str
+
+
+class CartItem(BaseModel):
+    product_id: int
+    quantity: int = Field(..., ge=1, le=1000)
+
+
+class CartQuoteRequest(BaseModel):
+    items: List[CartItem] = Field(..., min_length=1, max_length=500)
+
+
+class CartLineQuote(BaseModel):
+    product_id: int
+    title: str
+    unit_price: float
+    quantity: int
+    line_total: float
+
+
+class CartDeliveryQuote(BaseModel):
+    """A delivery option every item in the cart can ship with. It's only
+    available once the subtotal reaches min_order_amount; until then
+    amount_to_qualify is what's missing and total is None."""
+
+    id: int
+    name: str
+    description: str
+    speed: DeliverySpeed
+    price: float
+    min_order_amount: Optional[float] = None
+    estimated_days_min: int
+    estimated_days_max: int
+    eligible: bool
+    amount_to_qualify: float
+    total: Optional[float] = None  # subtotal plus price, when eligible
+
+
+class CartQuote(BaseModel):
+    lines: List[CartLineQuote]
+    item_count: int
+    subtotal: float
+    # Eligible options first, cheapest then fastest
+    delivery_options: List[CartDeliveryQuote]
+
+
+class StockRead(BaseModel):
+    product_id: int
+    on_hand: int
+    reserved: int  # Held by reservations
+    available: int
+    updated_at: datetime
+
+
+class StockUpdate(BaseModel):
+    on_hand: int = Field(..., ge=0)
+
+
+class ReservationCreate(BaseModel):
+    quantity: int = Field(..., ge=1)
+    # Defaults to RESERVATION_TTL_SECONDS
+    ttl_seconds: Optional[int] = Field(default=None, ge=1, le=24 * 60 * 60)
+
+
+class ReservationRead(BaseModel):
+    id: str
+    product_id: int
+    quantity: int
+    status: ReservationStatus
+    expires_at: datetime
+    created_at: datetime
+    updated_at: datetime
+
+
+class OrderCreate(BaseModel):
+    items: List[CartItem] = Field(..., min_length=1, max_length=500)
+    # One of the cart quote's eligible delivery options
+    delivery_option_id: Optional[int] = None
+
+
+class OrderLineRead(BaseModel):
+    product_id: int
+    title: str
+    unit_price: float  # As the product was priced when ordered
+    quantity: int
+    line_total: float
+
+
+class OrderRead(BaseModel):
+    id: int
+    lines: List[OrderLineRead]
+    item_count: int
+    subtotal: float
+    delivery_option_id: Optional[int] = None
+    delivery_price: float
+    total: float
+    created_at: datetime
@@ -3,19 +3,23 @@
 Database seeding script to import products from the frontend's products.json file
 """
 
+import argparse
 import json
 import sys
 from pathlib import Path
-from sqlmodel import Session
+from typing import Optional
+from sqlalchemy import update
+from sqlmodel import Session, col, select
 
 from .db import engine, create_db_and_tables
 from .models import Product, DeliveryOption, DeliverySpeed
-from .crud import get_category_by_name, create_category, download_and_store_image
+from .crud import get_category_by_name, create_category, store_image_blob
+from .image_ingest import ImageFetcher
 from .schemas import CategoryCreate
 
 
-def load_products_json():
-    """Load products from the JSON file"""
+def find_products_json() -> Path:
+    """Locate the products.json file"""
     # Try multiple possible paths for the products.json file
     possible_paths = [
         Path(__file__).parent.parent / "products.json",  # Backend directory
@@ -27,9 +31,7 @@ def load_products_json():
 
     for products_path in possible_paths:
         if products_path.exists():
-            print(f"Loading products from: {products_path}")
-            with open(products_path, "r") as f:
-                return json.load(f)
+            return products_path
 
     print("Products file not found in any of these locations:")
     for path in possible_paths:
@@ -37,6 +39,14 @@ def load_products_json():
     sys.exit(1)
 
 
+def load_products_json():
+    """Load products from the JSON file"""
+    products_path = find_products_json()
+    print(f"Loading products from: {products_path}")
+    with open(products_path, "r") as f:
+        return json.load(f)
+
+
 def seed_categories(session: Session, products: list) -> dict:
     """Create categories from product data and return a mapping"""
     # Extract unique categories and sort for deterministic order
@@ -60,91 +70,160 @@ def seed_categories(session: Session, products: list) -> dict:
     return category_map
 
 
-def seed_products(session: Session, products: list, category_map: dict):
-    """Create products with image download and storage"""
+def seed_products(
+    session: Session,
+    products: list,
+    category_map: dict,
+    fetcher: Optional[ImageFetcher] = None,
+):
+    """Create products, then download and store their images concurrently"""
     print(f"\nSeeding {len(products)} products...")
 
+    # Check which products already exist in one query
+    product_ids = [product_data["id"] for product_data in products]
+    existing_ids = set(
+        session.exec(select(Product.id).where(col(Product.id).in_(product_ids))).all()
+    )
+
+    new_products = []
     for product_data in products:
-        # Check if product already exists
-        existing_product = session.get(Product, product_data["id"])
-        if existing_product:
+        if product_data["id"] in existing_ids:
             print(
                 f"Product '{product_data['title']}' already exists (ID: {product_data['id']})"
             )
             continue
 
         # Create new product
-        new_product = Product(
-            id=product_data["id"],
-            title=product_data["title"],
-            description=product_data["description"],
-            price=float(product_data["price"]),
-            category_id=category_map[product_data["category"]],
-            is_saved=False,
+        new_products.append(
+            Product(
+                id=product_data["id"],
+                title=product_data["title"],
+                description=product_data["description"],
+                price=float(product_data["price"]),
+                category_id=category_map[product_data["category"]],
+                is_saved=False,
+            )
         )
+        print(f"Created product '{product_data['title']}' (ID: {product_data['id']})")
 
-        session.add(new_product)
-        session.commit()
-        session.refresh(new_product)
+    session.add_all(new_products)
+    session.commit()
 
-        print(f"Created product '{product_data['title']}' (ID: {product_data['id']})")
+    new_product_data = [p for p in products if p["id"] not in existing_ids]
+    for product_data in new_product_data:
+        if not product_data.get("image"):
+            print(f"No image URL found for product {product_data['id']}")
 
-        # Download and store image
-        image_url = product_data.get("image")
-        if image_url:
-            print(f"Downloading image from: {image_url}")
-            if download_and_store_image(session, new_product, image_url):
-                print(f"Successfully stored image for product {product_data['id']}")
-            else:
-                print(
-                    f"Failed to download/store image for product {product_data['id']}"
-                )
+    seed_product_images(
+        session, [p for p in new_product_data if p.get("image")], fetcher
+    )
+
+
+def seed_product_images(
+    session: Session,
+    products: list,
+    fetcher: Optional[ImageFetcher] = None,
+    batch_size: int = 50,
+):
+    """Download images for the given product dicts and store them as BLOBs.
+
+    Writes are batched into one commit per `batch_size` images. Failed
+    downloads are marked to show a placeholder, rendered on request.
+    """
+    if not products:
+        return
+
+    fetcher = fetcher or ImageFetcher()
+    jobs = [(product_data["id"], product_data["image"]) for product_data in products]
+    print(f"\nDownloading {len(jobs)} images ({fetcher.max_workers} workers)...")
+
+    pending_writes = 0
+    for result in fetcher.fetch_all(jobs):
+        if result.image is not None:
+            values = {
+                "image_blob_id": store_image_blob(
+                    session, result.image.data, result.image.phash
+                ),
+                "image_width": result.image.width,
+                "image_height": result.image.height,
+                "image_preview": result.image.preview,
+                "image_mime_type": "image/png",
+                "image_filename": f"product_{result.product_id}.png",
+                "image_is_placeholder": False,
+            }
+            print(f"Successfully stored image for product {result.product_id}")
         else:
-            print(f"No image URL found for product {product_data['id']}")
+            print(
+                f"Error downloading image for product {result.product_id}: {result.error}"
+            )
+            print("Using placeholder image instead...")
+            values = {
+                "image_blob_id": None,
+                "image_width": None,
+                "image_height": None,
+                "image_preview": None,
+                "image_mime_type": None,
+                "image_filename": None,
+                "image_is_placeholder": True,
+            }
+
+        session.exec(
+            update(Product).where(col(Product.id) == result.product_id).values(**values)
+        )
+        pending_writes += 1
+        if pending_writes >= batch_size:
+            session.commit()
+            pending_writes = 0
+
+    session.commit()
+
+
+# Common delivery options, shared with the bulk loader
+DELIVERY_OPTION_SPECS: list[dict] = [
+    {
+        "name": "Standard Shipping",
+        "description": "3-5 business days",
+        "speed": DeliverySpeed.STANDARD,
+        "price": 0.0,  # Free shipping
+        "min_order_amount": 25.0,
+        "estimated_days_min": 3,
+        "estimated_days_max": 5,
+        "is_active": True,
+    },
+    {
+        "name": "Express Delivery",
+        "description": "1-2 business days",
+        "speed": DeliverySpeed.EXPRESS,
+        "price": 9.99,
+        "estimated_days_min": 1,
+        "estimated_days_max": 2,
+        "is_active": True,
+    },
+    {
+        "name": "Next Day Delivery",
+        "description": "Next business day",
+        "speed": DeliverySpeed.NEXT_DAY,
+        "price": 19.99,
+        "estimated_days_min": 1,
+        "estimated_days_max": 1,
+        "is_active": True,
+    },
+    {
+        "name": "Same Day Delivery",
+        "description": "Same day (order by 2pm)",
+        "speed": DeliverySpeed.SAME_DAY,
+        "price": 24.99,
+        "min_order_amount": None,
+        "estimated_days_min": 0,
+        "estimated_days_max": 0,
+        "is_active": True,
+    },
+]
 
 
 def seed_delivery_options(session: Session) -> list[DeliveryOption]:
     """Create common delivery options"""
-    delivery_options = [
-        DeliveryOption(
-            name="Standard Shipping",
-            description="3-5 business days",
-            speed=DeliverySpeed.STANDARD,
-            price=0.0,  # Free shipping
-            min_order_amount=25.0,
-            estimated_days_min=3,
-            estimated_days_max=5,
-            is_active=True,
-        ),
-        DeliveryOption(
-            name="Express Delivery",
-            description="1-2 business days",
-            speed=DeliverySpeed.EXPRESS,
-            price=9.99,
-            estimated_days_min=1,
-            estimated_days_max=2,
-            is_active=True,
-        ),
-        DeliveryOption(
-            name="Next Day Delivery",
-            description="Next business day",
-            speed=DeliverySpeed.NEXT_DAY,
-            price=19.99,
-            estimated_days_min=1,
-            estimated_days_max=1,
-            is_active=True,
-        ),
-        DeliveryOption(
-            name="Same Day Delivery",
-            description="Same day (order by 2pm)",
-            speed=DeliverySpeed.SAME_DAY,
-            price=24.99,
-            min_order_amount=None,
-            estimated_days_min=0,
-            estimated_days_max=0,
-            is_active=True,
-        ),
-    ]
+    delivery_options = [DeliveryOption(**spec) for spec in DELIVERY_OPTION_SPECS]
 
     created_options = []
     for option in delivery_options:
@@ -262,5 +341,37 @@ def seed_database(custom_engine=None):
     )
 
 
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Seed the product database")
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Load in one set-based transaction (for large catalogs)",
+    )
+    parser.add_argument(
+        "--file",
+        type=Path,
+        help="Products file for --bulk, a JSON array or JSON Lines "
+        "(default: products.json)",
+    )
+    parser.add_argument(
+        "--skip-images", action="store_true", help="Don't download images (--bulk)"
+    )
+    args = parser.parse_args(argv)
+
+    if not args.bulk:
+        if args.file or args.skip_images:
+            parser.error("--file and --skip-images require --bulk")
+        seed_database()
+        return
+
+    from .bulk_seed import bulk_seed_database
+
+    create_db_and_tables()
+    bulk_seed_database(
+        engine, args.file or find_products_json(), with_images=not args.skip_images
+    )
+
+
 if __name__ == "__main__":
-    seed_database()
+    main()
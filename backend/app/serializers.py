@@ -0,0 +1,120 @@
+"""
+Response dicts for the API's models.
+
+Each function reads attributes only, so it takes a model object or a row
+from a column-only select with the same column names, such as those
+crud.list_products returns.
+"""
+
+from typing import Any, Dict, List, Optional
+
+
+def product_fields(product: Any) -> Dict[str, Any]:
+    """ProductRead's own fields, with image_url plus the dimensions and
+    preview stored at ingestion"""
+    has_image = product.image_blob_id is not None or product.image_is_placeholder
+    return {
+        "id": product.id,
+        # ProductRead strips these; seeded rows can carry stray whitespace
+        "title": product.title.strip(),
+        "description": product.description.strip(),
+        "price": product.price,
+        "category_id": product.category_id,
+        "is_saved": product.is_saved,
+        "created_at": product.created_at,
+        "updated_at": product.updated_at,
+        "image_url": f"/products/{product.id}/image" if has_image else None,
+        "image_width": product.image_width,
+        "image_height": product.image_height,
+        "image_preview": product.image_preview,
+    }
+
+
+def category_fields(category: Any) -> Dict[str, Any]:
+    return {
+        "id": category.id,
+        "name": category.name,
+        "created_at": category.created_at,
+        "updated_at": category.updated_at,
+    }
+
+
+def listed_category_fields(row: Any) -> Dict[str, Any]:
+    """The category of a crud.list_products row, from its category_* columns"""
+    return {
+        "id": row.category_id,
+        "name": row.category_name,
+        "created_at": row.category_created_at,
+        "updated_at": row.category_updated_at,
+    }
+
+
+def delivery_option_fields(option: Any) -> Dict[str, Any]:
+    return {
+        "id": option.id,
+        "name": option.name,
+        "description": option.description,
+        "speed": option.speed,
+        "price": option.price,
+        "min_order_amount": option.min_order_amount,
+        "estimated_days_min": option.estimated_days_min,
+        "estimated_days_max": option.estimated_days_max,
+        "is_active": option.is_active,
+        "created_at": option.created_at,
+        "updated_at": option.updated_at,
+    }
+
+
+def delivery_option_quote_fields(
+    option: Any, shortfall: int, total: Optional[int]
+) -> Dict[str, Any]:
+    """CartDeliveryQuote's fields; shortfall (what the cart is below the
+    option's minimum) and the cart's total with it are in cents, the total
+    None unless the cart qualifies"""
+    return {
+        "id": option.id,
+        "name": option.name,
+        "description": option.description,
+        "speed": option.speed,
+        "price": option.price,
+        "min_order_amount": option.min_order_amount,
+        "estimated_days_min": option.estimated_days_min,
+        "estimated_days_max": option.estimated_days_max,
+        "eligible": shortfall == 0,
+        "amount_to_qualify": shortfall / 100,
+        "total": total / 100 if total is not None else None,
+    }
+
+
+def stock_fields(level: Any) -> Dict[str, Any]:
+    return {
+        "product_id": level.product_id,
+        "on_hand": level.on_hand,
+        "reserved": level.reserved,
+        "available": level.on_hand - level.reserved,
+        "updated_at": level.updated_at,
+    }
+
+
+def order_line_fields(line: Any) -> Dict[str, Any]:
+    return {
+        "product_id": line.product_id,
+        "title": line.title,
+        "unit_price": line.unit_price,
+        "quantity": line.quantity,
+        "line_total": line.line_total,
+    }
+
+
+def order_fields(order: Any, lines: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """OrderRead's fields, with its lines already as order_line_fields"""
+    return {
+        "id": order.id,
+        "lines": lines,
+        "item_count": order.item_count,
+        "subtotal": order.subtotal,
+        "delivery_option_id": order.delivery_option_id,
+        "delivery_price": order.delivery_price,
+        "total": order.total,
+        "created_at": order.created_at,
+    }
@@ -0,0 +1,170 @@
+"""
+Slow-query log.
+
+Every statement is timed by Engine listeners. One that takes longer than
+SLOW_QUERY_MS (default 100; 0 disables the log) is printed with SQLite's
+EXPLAIN QUERY PLAN, and aggregated under a fingerprint of its normalized
+text, so the many shapes the product listing's filters produce can be
+told apart. GET /admin/slow-queries lists the worst fingerprints to
+requests with ADMIN_TOKEN in an X-Admin-Token header; profiling needn't
+be enabled. Bound parameters aren't kept or printed, since they can
+carry customer data.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from sqlalchemy import Engine, event
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# Fingerprints kept; the one with the least total time makes room for a new one
+SLOW_QUERY_FINGERPRINTS = 500
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+# IN lists vary in length with their parameters
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """The statement with literals replaced by ? and whitespace collapsed"""
+    normalized = _STRING.sub("?", statement)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _WHITESPACE.sub(" ", normalized).strip()
+    return _PLACEHOLDER_LIST.sub("(?, ...)", normalized)
+
+
+def fingerprint(statement: str) -> str:
+    return hashlib.sha1(normalize_statement(statement).encode()).hexdigest()[:12]
+
+
+@dataclass
+class SlowQuery:
+    fingerprint: str
+    statement: str
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_seen: float = 0.0
+    last_statement: str = ""
+    plan: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "statement": self.statement,
+            "count": self.count,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "mean_ms": round(self.total_seconds / self.count * 1000, 3),
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "last_seen": self.last_seen,
+            "last_statement": self.last_statement,
+            "plan": self.plan,
+        }
+
+
+class SlowQueryLog:
+    def __init__(self, capacity: int = SLOW_QUERY_FINGERPRINTS) -> None:
+        self._lock = threading.Lock()
+        self._capacity = capacity
+        self._queries: Dict[str, SlowQuery] = {}
+
+    def record(self, statement: str, seconds: float, plan: List[str]) -> SlowQuery:
+        key = fingerprint(statement)
+        with self._lock:
+            query = self._queries.get(key)
+            if query is None:
+                if len(self._queries) >= self._capacity:
+                    least = min(self._queries.values(), key=lambda q: q.total_seconds)
+                    del self._queries[least.fingerprint]
+                query = self._queries[key] = SlowQuery(
+                    key, normalize_statement(statement)
+                )
+            query.count += 1
+            query.total_seconds += seconds
+            query.max_seconds = max(query.max_seconds, seconds)
+            query.last_seen = time.time()
+            query.last_statement = statement
+            if plan:
+                query.plan = plan
+            return query
+
+    def top(self, limit: int, order_by: str = "total") -> List[Dict[str, Any]]:
+        sort_key = {
+            "total": lambda q: q.total_seconds,
+            "max": lambda q: q.max_seconds,
+            "count": lambda q: q.count,
+        }[order_by]
+        with self._lock:
+            ordered = sorted(self._queries.values(), key=sort_key, reverse=True)
+            return [query.to_dict() for query in ordered[:limit]]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._queries.clear()
+
+
+slow_query_log = SlowQueryLog()
+
+
+def explain_query_plan(
+    dbapi_connection: Any, statement: str, parameters: Any
+) -> List[str]:
+    """SQLite's EXPLAIN QUERY PLAN as indented lines, like the sqlite3 shell
+    prints it; empty when the statement can't be explained"""
+    if (
+        not statement.lstrip()
+        .upper()
+        .startswith(("SELECT", "WITH", "UPDATE", "DELETE"))
+    ):
+        return []
+    cursor = dbapi_connection.cursor()
+    try:
+        rows = cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    except Exception as e:
+        return [f"(EXPLAIN failed: {e})"]
+    finally:
+        cursor.close()
+
+    depths = {0: -1}
+    lines = []
+    for node_id, parent_id, _, detail in rows:
+        depths[node_id] = depths.get(parent_id, -1) + 1
+        lines.append("  " * depths[node_id] + detail)
+    return lines
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if SLOW_QUERY_MS > 0:
+        # Overwritten, not stacked: a failed statement never reaches the
+        # after_cursor_execute listener to clear it
+        conn.info["slow_query_start"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop("slow_query_start", None)
+    if start is None:
+        return
+    seconds = time.perf_counter() - start
+    if SLOW_QUERY_MS <= 0 or seconds * 1000 < SLOW_QUERY_MS:
+        return
+
+    plan: List[str] = []
+    # Explained on the raw connection, so it isn't timed or counted itself
+    if conn.dialect.name == "sqlite" and not executemany:
+        plan = explain_query_plan(cursor.connection, statement, parameters)
+    query = slow_query_log.record(statement, seconds, plan)
+    print(
+        f"Slow query {query.fingerprint} took {seconds * 1000:.1f}ms: "
+        f"{_WHITESPACE.sub(' ', statement).strip()}"
+    )
+    for line in plan:
+        print(f"    {line}")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark bulk seeding of a synthetic catalog into a scratch database.
+
+    uv run python -m benchmarks.bulk_seed --products 200000 --min-rate 50000
+
+Writes a generated catalog (app.generate_catalog) to a temporary file, loads it with the bulk seeder
+(images skipped) and reports products/s, exiting non-zero below --min-rate.
+--compare-orm also times the regular ORM seeder on a slice of the catalog.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.bulk_seed import bulk_seed_database
+from app.generate_catalog import generate_products, write_catalog
+from app.seed import (
+    assign_delivery_options_to_products,
+    seed_categories,
+    seed_delivery_options,
+    seed_products,
+)
+
+
+def time_orm_seed(products: list, database: Path) -> float:
+    engine = create_engine(f"sqlite:///{database}")
+    SQLModel.metadata.create_all(engine)
+    start = time.perf_counter()
+    # The ORM seeder prints a line per product
+    with redirect_stdout(StringIO()), Session(engine) as session:
+        category_map = seed_categories(session, products)
+        seed_products(session, products, category_map)
+        assign_delivery_options_to_products(session, seed_delivery_options(session))
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--products", type=int, default=200_000)
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-rate", type=float, help="Fail below this products/s")
+    parser.add_argument(
+        "--compare-orm",
+        type=int,
+        metavar="N",
+        help="Also time the ORM seeder on the first N products",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog = Path(tmp) / "catalog.jsonl"
+        write_catalog(catalog, args.products, args.seed, args.categories)
+        print(
+            f"{args.products} products, {args.categories} categories "
+            f"({catalog.stat().st_size / 1024 / 1024:.1f} MiB of JSON)"
+        )
+
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bulk.db'}")
+        report = bulk_seed_database(engine, catalog, with_images=False)
+        engine.dispose()
+        print(
+            f"bulk:  {report.load_seconds:6.2f}s  "
+            f"{report.products_per_second:9,.0f} products/s  "
+            f"({report.links_inserted} delivery links)"
+        )
+
+        if args.compare_orm:
+            products = list(
+                generate_products(args.compare_orm, args.seed, args.categories)
+            )
+            elapsed = time_orm_seed(products, Path(tmp) / "orm.db")
+            print(
+                f"orm:   {elapsed:6.2f}s  {len(products) / elapsed:9,.0f} products/s"
+                f"  (first {len(products)} products)"
+            )
+
+    if args.min_rate and report.products_per_second < args.min_rate:
+        print(f"Below the minimum of {args.min_rate:,.0f} products/s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Checkout throughput: orders placed per second with concurrent clients.
+
+    uv run python -m benchmarks.checkout --products 10000 --workers 1,4,16
+
+Places orders with app.orders.place_order from a pool of threads, each
+order in its own session with its own Idempotency-Key, on a scratch copy
+of the standard synthetic catalog (benchmarks.datasets) in WAL mode with
+the app's busy timeout and pragmas. --retries resends that fraction of
+the orders with the same key soon after, as clients on flaky networks
+do; the run checks they were replayed and placed no second order.
+Reports checkouts per second and latency percentiles for each number of
+workers.
+"""
+
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from pathlib import Path
+from typing import List, Tuple
+
+from sqlalchemy import event
+from sqlmodel import Session, create_engine
+
+from app import orders, slow_queries
+from app.db import SQLITE_CONNECT_ARGS, set_sqlite_pragmas
+from app.generate_catalog import DEFAULT_SEED
+from app.schemas import CartItem, OrderCreate
+from benchmarks.datasets import catalog_database, working_copy
+from benchmarks.endpoints import percentile
+
+
+def _order_count(database: Path) -> int:
+    with closing(sqlite3.connect(database)) as conn:
+        return conn.execute("SELECT count(*) FROM orders").fetchone()[0]
+
+
+def _checkouts(
+    product_ids: List[int], count: int, lines: int, retries: float, run: str
+) -> List[Tuple[str, OrderCreate]]:
+    """count orders, plus a resend of about retries of them a few places on"""
+    rng = random.Random(f"{run}-{count}")
+    checkouts: List[Tuple[str, OrderCreate]] = []
+    resends: List[Tuple[int, Tuple[str, OrderCreate]]] = []
+    for i in range(count):
+        items = [
+            CartItem(product_id=product_id, quantity=rng.randint(1, 3))
+            for product_id in rng.sample(product_ids, lines)
+        ]
+        checkout = (f"{run}-{i}", OrderCreate(items=items))
+        checkouts.append(checkout)
+        if rng.random() < retries:
+            resends.append((len(checkouts) + rng.randint(0, 8), checkout))
+    for position, checkout in reversed(resends):
+        checkouts.insert(position, checkout)
+    return checkouts
+
+
+def run_checkouts(
+    engine, checkouts: List[Tuple[str, OrderCreate]], workers: int
+) -> Tuple[List[float], int, float]:
+    """Latencies, replays and wall time of placing the orders"""
+
+    def place(checkout: Tuple[str, OrderCreate]) -> Tuple[float, bool]:
+        key, order = checkout
+        start = time.perf_counter()
+        with Session(engine) as session:
+            _, replayed = orders.place_order(session, key, order)
+        return time.perf_counter() - start, replayed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(place, checkouts))
+    wall = time.perf_counter() - started
+    return [elapsed for elapsed, _ in results], sum(r for _, r in results), wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--workers", default="1,4,16", help="e.g. 1,4,16")
+    parser.add_argument("--orders", type=int, default=2000, help="Per run")
+    parser.add_argument("--lines", type=int, default=5, help="Per order")
+    parser.add_argument(
+        "--retries", type=float, default=0.1, help="Fraction of orders resent"
+    )
+    args = parser.parse_args()
+
+    slow_queries.SLOW_QUERY_MS = 0
+    source = catalog_database(args.products, args.seed)
+    with tempfile.TemporaryDirectory() as scratch:
+        database = working_copy(source, Path(scratch) / "checkout.db")
+        with closing(sqlite3.connect(database)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            product_ids = [row[0] for row in conn.execute("SELECT id FROM products")]
+
+        print(
+            f"{'workers':>7} {'orders':>7} {'replayed':>8} "
+            f"{'checkouts/s':>11} {'p50':>9} {'p99':>9}"
+        )
+        for workers in (int(w) for w in args.workers.split(",")):
+            engine = create_engine(
+                f"sqlite:///{database}",
+                connect_args=SQLITE_CONNECT_ARGS,
+                pool_size=workers,
+            )
+
+            event.listen(engine, "connect", set_sqlite_pragmas)
+
+            checkouts = _checkouts(
+                product_ids, args.orders, args.lines, args.retries, f"w{workers}"
+            )
+            before = _order_count(database)
+            latencies, replayed, wall = run_checkouts(engine, checkouts, workers)
+            engine.dispose()
+
+            placed = _order_count(database) - before
+            assert placed == args.orders, f"{placed} orders for {args.orders} keys"
+            assert replayed == len(checkouts) - args.orders
+            latencies.sort()
+            print(
+                f"{workers:7d} {placed:7,d} {replayed:8,d} "
+                f"{placed / wall:11,.0f} "
+                f"{percentile(latencies, 0.50) * 1000:7.2f}ms "
+                f"{percentile(latencies, 0.99) * 1000:7.2f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Standard benchmark datasets: synthetic catalogs from app.generate_catalog,
+built once per (size, seed, schema) and cached under benchmarks/.data (or
+$BENCHMARK_DATA_DIR).
+"""
+
+import hashlib
+import os
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from sqlalchemy.schema import CreateTable
+from sqlmodel import SQLModel, create_engine
+
+from app.generate_catalog import DEFAULT_SEED, generate_catalog_database
+
+DATA_DIR = Path(os.getenv("BENCHMARK_DATA_DIR", Path(__file__).parent / ".data"))
+IMAGE_SIZE = 300
+IMAGE_VARIETY = 50
+
+
+def size_label(count: int) -> str:
+    if count % 1_000_000 == 0:
+        return f"{count // 1_000_000}m"
+    if count % 1_000 == 0:
+        return f"{count // 1_000}k"
+    return str(count)
+
+
+def schema_version() -> str:
+    """Short hash of the models' tables, so a catalog generated before a
+    migration isn't reused"""
+    dialect = sqlite_dialect.dialect()
+    ddl = "\n".join(
+        str(CreateTable(table).compile(dialect=dialect))
+        for table in SQLModel.metadata.sorted_tables
+    )
+    return hashlib.sha256(ddl.encode()).hexdigest()[:8]
+
+
+def catalog_database(count: int, seed: int = DEFAULT_SEED) -> Path:
+    """Path to the cached catalog of `count` products, generating it first
+    if needed. Treat it as read-only; see working_copy."""
+    path = DATA_DIR / f"catalog-{size_label(count)}-seed{seed}-{schema_version()}.db"
+    if path.exists():
+        return path
+
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".partial")
+    partial.unlink(missing_ok=True)
+    print(f"Generating {size_label(count)} catalog into {path} ...")
+    engine = create_engine(f"sqlite:///{partial}")
+    try:
+        generate_catalog_database(
+            engine,
+            count,
+            seed=seed,
+            images=True,
+            image_size=IMAGE_SIZE,
+            image_variety=IMAGE_VARIETY,
+        )
+    finally:
+        engine.dispose()
+    partial.rename(path)
+    return path
+
+
+def working_copy(source: Path, destination: Path) -> Path:
+    """Copy a dataset for a run that writes to it"""
+    with closing(sqlite3.connect(source)) as src:
+        with closing(sqlite3.connect(destination)) as dst:
+            src.backup(dst)
+    return destination
@@ -0,0 +1,750 @@
+#!/usr/bin/env python3
+"""
+Benchmark every API route against synthetic catalogs of several sizes.
+
+    uv run python -m benchmarks.endpoints --sizes 1k,10k --save-baseline
+    uv run python -m benchmarks.endpoints --sizes 1k,10k --baseline
+
+Each route (and every filter/sort combination of /api/products) is driven
+in-process through ASGI and over a real uvicorn socket, against a scratch
+copy of the catalog from benchmarks.datasets. Records p50/p95/p99 latency,
+throughput and the server's peak RSS. --baseline compares against a saved
+run (by default baselines/endpoints.json, a 1k and 10k run of both modes)
+and exits non-zero when a metric is worse by more than --threshold.
+"""
+
+import argparse
+import io
+import itertools
+import json
+import math
+import os
+import platform
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from PIL import Image
+
+# Nothing from app (or benchmarks.datasets, which imports it) at module
+# level: app.db builds its engine from DATABASE_URL on first import, so
+# main() sets that first
+
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "endpoints.json"
+LATENCY_METRICS = ("p50_ms", "p95_ms", "p99_ms")
+SORTS = ("created_desc", "price_asc", "price_desc", "delivery_fastest")
+
+# Sent to the admin and profiling endpoints; see app_env
+ADMIN_TOKEN = "benchmark"
+
+# (method, url, httpx request kwargs)
+Request = Tuple[str, str, Dict[str, Any]]
+
+
+@dataclass
+class Scenario:
+    name: str
+    make_request: Callable[[int], Request]  # Called with the iteration number
+    writes: bool = False
+    background_jobs: bool = False  # Wait for queued image jobs afterwards
+    # Called with the client and the number of requests to come, before the
+    # scenario runs, to create what its requests need
+    prepare: Optional[Callable[[Any, int], None]] = None
+
+
+@dataclass
+class Dataset:
+    category_id: int
+    delivery_option_id: int  # A selective one (Next Day)
+    product_ids: List[int]
+    upload: bytes = field(repr=False, default=b"")
+
+
+def _get(url: str, **kwargs: Any) -> Callable[[int], Request]:
+    return lambda i: ("GET", url, kwargs)
+
+
+def _created(created: Dict[str, List[str]], kind: str, i: int) -> str:
+    """One of the ids prepare() made; warmup requests (i < 0) reuse them"""
+    ids = created[kind]
+    return ids[i % len(ids)]
+
+
+def load_dataset(path: Path) -> Dataset:
+    with closing(sqlite3.connect(path)) as conn:
+        (category_id,) = conn.execute(
+            "SELECT category_id FROM products GROUP BY category_id "
+            "ORDER BY count(*) DESC LIMIT 1"
+        ).fetchone()
+        (option_id,) = conn.execute(
+            "SELECT id FROM delivery_options WHERE name = 'Next Day Delivery'"
+        ).fetchone()
+        product_ids = [
+            row[0]
+            for row in conn.execute(
+                "SELECT id FROM products WHERE image_blob_id IS NOT NULL ORDER BY id"
+            )
+        ]
+
+    buffer = io.BytesIO()
+    Image.linear_gradient("L").convert("RGB").save(buffer, "JPEG", quality=85)
+    return Dataset(category_id, option_id, product_ids, buffer.getvalue())
+
+
+def build_scenarios(data: Dataset) -> List[Scenario]:
+    ids = data.product_ids
+    middle = ids[len(ids) // 2]
+    stocked = ids[0]
+    admin = {"X-Admin-Token": ADMIN_TOKEN}
+    profile_token = {"X-Profile-Token": ADMIN_TOKEN}
+    # Ids prepare() creates, for requests that need an existing one
+    created: Dict[str, List[str]] = {}
+
+    def pick(i: int) -> int:
+        """Spread reads over the catalog"""
+        return ids[(i * 7919) % len(ids)]
+
+    def tail(i: int) -> int:
+        """Writes that replace or delete take products from the end"""
+        return ids[-1 - (i % (len(ids) // 4))]
+
+    def place_order(client: Any, count: int) -> None:
+        response = client.post(
+            "/api/orders",
+            json={"items": [{"product_id": middle, "quantity": 1}]},
+            headers={"Idempotency-Key": f"bench-order-{time.time_ns()}"},
+        )
+        created["order"] = [str(response.json()["id"])]
+
+    def track_stock(client: Any, count: int) -> None:
+        client.put(f"/products/{stocked}/stock", json={"on_hand": 1_000_000})
+
+    def reserve(client: Any, count: int) -> None:
+        """A held reservation for each request, as each settles one"""
+        track_stock(client, count)
+        created["reservation"] = [
+            client.post(
+                f"/products/{stocked}/reservations", json={"quantity": 1}
+            ).json()["id"]
+            for _ in range(count)
+        ]
+
+    def queue_image_job(client: Any, count: int) -> None:
+        response = client.put(
+            f"/products/{ids[0]}/image",
+            content=data.upload,
+            headers={"Content-Type": "image/jpeg"},
+        )
+        created["job"] = [response.json()["id"]]
+
+    def profile_request(client: Any, count: int) -> None:
+        response = client.get("/health", headers=profile_token)
+        created["profile"] = [response.headers["X-Profile-Id"]]
+
+    scenarios = [
+        Scenario("GET /health", _get("/health")),
+        Scenario("GET /api/categories", _get("/api/categories")),
+        Scenario("GET /categories", _get("/categories")),
+        Scenario("GET /categories/{id}", _get(f"/categories/{data.category_id}")),
+        Scenario("GET /api/delivery-options", _get("/api/delivery-options")),
+    ]
+
+    for category, delivery, sort, summary in itertools.product(
+        (False, True), (False, True), SORTS, (True, False)
+    ):
+        params: Dict[str, Any] = {"sort": sort}
+        if category:
+            params["categoryId"] = data.category_id
+        if delivery:
+            params["deliveryOptionId"] = data.delivery_option_id
+        if not summary:
+            params["include_delivery_summary"] = "false"
+        name = "GET /api/products?" + "&".join(
+            f"{key}={{{key}}}" if key.endswith("Id") else f"{key}={value}"
+            for key, value in params.items()
+        )
+        scenarios.append(Scenario(name, _get("/api/products", params=params)))
+
+    for category, summary in itertools.product((False, True), (False, True)):
+        params = {}
+        if category:
+            params["category_id"] = data.category_id
+        if summary:
+            params["include_delivery_summary"] = "true"
+        name = "GET /products" + (
+            "?" + "&".join(f"{key}" for key in params) if params else ""
+        )
+        scenarios.append(Scenario(name, _get("/products", params=params)))
+
+    scenarios += [
+        Scenario("GET /products/{id}", lambda i: ("GET", f"/products/{pick(i)}", {})),
+        Scenario(
+            "GET /products/{id}/image",
+            lambda i: ("GET", f"/products/{pick(i)}/image", {}),
+        ),
+        Scenario(
+            "HEAD /products/{id}/image",
+            lambda i: ("HEAD", f"/products/{pick(i)}/image", {}),
+        ),
+        Scenario(
+            "GET /products/{id}/image?w=300&fmt=webp",
+            lambda i: (
+                "GET",
+                f"/products/{pick(i)}/image",
+                {"params": {"w": 300, "fmt": "webp"}},
+            ),
+        ),
+        Scenario(
+            "GET /products/{id}/image?w=150 (Accept: avif)",
+            lambda i: (
+                "GET",
+                f"/products/{pick(i)}/image",
+                {"params": {"w": 150}, "headers": {"Accept": "image/avif,*/*"}},
+            ),
+        ),
+        Scenario(
+            "GET /products/{id}/image (Range)",
+            _get(f"/products/{middle}/image", headers={"Range": "bytes=0-1023"}),
+        ),
+        Scenario("GET /images/stats", _get("/images/stats")),
+        Scenario(
+            "POST /api/cart/quote (200 lines)",
+            lambda i: (
+                "POST",
+                "/api/cart/quote",
+                {
+                    "json": {
+                        "items": [
+                            {"product_id": pick(i * 200 + line), "quantity": 2}
+                            for line in range(200)
+                        ]
+                    }
+                },
+            ),
+        ),
+        Scenario(
+            "POST /api/orders (5 lines)",
+            lambda i: (
+                "POST",
+                "/api/orders",
+                {
+                    "json": {
+                        "items": [
+                            {"product_id": pick(i * 5 + line), "quantity": 1}
+                            for line in range(5)
+                        ]
+                    },
+                    "headers": {"Idempotency-Key": f"bench-{time.time_ns()}-{i}"},
+                },
+            ),
+            writes=True,
+        ),
+        Scenario(
+            "POST /api/orders (replayed)",
+            lambda i: (
+                "POST",
+                "/api/orders",
+                {
+                    "json": {"items": [{"product_id": middle, "quantity": 1}]},
+                    "headers": {"Idempotency-Key": "bench-replayed"},
+                },
+            ),
+        ),
+        Scenario(
+            "GET /api/orders/{id}",
+            lambda i: ("GET", f"/api/orders/{_created(created, 'order', i)}", {}),
+            prepare=place_order,
+        ),
+        Scenario(
+            "PUT /products/{id}/stock",
+            lambda i: (
+                "PUT",
+                f"/products/{stocked}/stock",
+                {"json": {"on_hand": 1_000_000 + i}},
+            ),
+            writes=True,
+        ),
+        Scenario(
+            "GET /products/{id}/stock",
+            _get(f"/products/{stocked}/stock"),
+            prepare=track_stock,
+        ),
+        Scenario(
+            "POST /products/{id}/reservations",
+            lambda i: (
+                "POST",
+                f"/products/{stocked}/reservations",
+                {"json": {"quantity": 1}},
+            ),
+            writes=True,
+            prepare=track_stock,
+        ),
+        Scenario(
+            "GET /reservations/{id}",
+            lambda i: (
+                "GET",
+                f"/reservations/{_created(created, 'reservation', i)}",
+                {},
+            ),
+            prepare=lambda client, count: reserve(client, 1),
+        ),
+        Scenario(
+            "POST /reservations/{id}/commit",
+            lambda i: (
+                "POST",
+                f"/reservations/{_created(created, 'reservation', i)}/commit",
+                {},
+            ),
+            writes=True,
+            prepare=reserve,
+        ),
+        Scenario(
+            "POST /reservations/{id}/release",
+            lambda i: (
+                "POST",
+                f"/reservations/{_created(created, 'reservation', i)}/release",
+                {},
+            ),
+            writes=True,
+            prepare=reserve,
+        ),
+        Scenario(
+            "POST /categories",
+            lambda i: (
+                "POST",
+                "/categories",
+                {"json": {"name": f"bench category {time.time_ns()}-{i}"}},
+            ),
+            writes=True,
+        ),
+        Scenario(
+            "POST /products",
+            lambda i: (
+                "POST",
+                "/products",
+                {
+                    "json": {
+                        "title": f"Bench product {i}",
+                        "description": "Created by the endpoint benchmark",
+                        "price": 9.99,
+                        "category_id": data.category_id,
+                    }
+                },
+            ),
+            writes=True,
+        ),
+        Scenario(
+            "PUT /products/{id}",
+            lambda i: (
+                "PUT",
+                f"/products/{pick(i)}",
+                {"json": {"price": 10 + i % 90}},
+            ),
+            writes=True,
+        ),
+        Scenario(
+            "PUT /products/{id}/image",
+            lambda i: (
+                "PUT",
+                f"/products/{tail(i)}/image",
+                {"content": data.upload, "headers": {"Content-Type": "image/jpeg"}},
+            ),
+            writes=True,
+            background_jobs=True,
+        ),
+        Scenario(
+            "GET /image-jobs/{id}",
+            lambda i: ("GET", f"/image-jobs/{_created(created, 'job', i)}", {}),
+            prepare=queue_image_job,
+        ),
+        Scenario("GET /metrics", _get("/metrics")),
+        Scenario("GET /timings", _get("/timings")),
+        Scenario("GET /admin/slow-queries", _get("/admin/slow-queries", headers=admin)),
+        Scenario(
+            "DELETE /admin/slow-queries",
+            lambda i: ("DELETE", "/admin/slow-queries", {"headers": admin}),
+        ),
+        Scenario("GET /admin/profiles", _get("/admin/profiles", headers=profile_token)),
+        Scenario(
+            "GET /admin/profiles/{id}",
+            lambda i: (
+                "GET",
+                f"/admin/profiles/{_created(created, 'profile', i)}",
+                {"headers": profile_token},
+            ),
+            prepare=profile_request,
+        ),
+        # Last, since it removes products other scenarios could pick
+        Scenario(
+            "DELETE /products/{id}",
+            lambda i: ("DELETE", f"/products/{tail(i)}", {}),
+            writes=True,
+        ),
+    ]
+    return scenarios
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile"""
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_scenario(
+    client: Any,
+    scenario: Scenario,
+    requests: int,
+    warmup: int,
+    max_seconds: float,
+    concurrency: int,
+) -> Dict[str, Any]:
+    status_urls: List[str] = []
+
+    def send(i: int) -> Tuple[float, bool]:
+        method, url, kwargs = scenario.make_request(i)
+        start = time.perf_counter()
+        try:
+            response = client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            # e.g. the server dropping the connection after a 500
+            return time.perf_counter() - start, False
+        elapsed = time.perf_counter() - start
+        if scenario.background_jobs and response.status_code == 202:
+            status_urls.append(response.json()["status_url"])
+        return elapsed, response.status_code < 400
+
+    for i in range(warmup):
+        send(-1 - i)
+
+    latencies: List[float] = []
+    errors = 0
+    started = time.perf_counter()
+    deadline = started + max_seconds
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        i = 0
+        while i < requests and (i < concurrency or time.perf_counter() < deadline):
+            batch = range(i, min(requests, i + concurrency))
+            for elapsed, ok in pool.map(send, batch):
+                latencies.append(elapsed)
+                errors += not ok
+            i = batch.stop
+    wall = time.perf_counter() - started
+    # Don't let queued work slow down the next scenario
+    for url in status_urls:
+        while client.get(url).json()["status"] in ("queued", "processing"):
+            time.sleep(0.01)
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "throughput_rps": round(len(latencies) / wall, 2),
+    }
+
+
+def _peak_rss_mb(pid: int) -> Optional[float]:
+    """VmHWM from /proc; None where unavailable"""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return None
+    for line in status.splitlines():
+        if line.startswith("VmHWM:"):
+            return round(int(line.split()[1]) / 1024, 1)
+    return None
+
+
+def _reset_peak_rss(pid: int) -> None:
+    try:
+        Path(f"/proc/{pid}/clear_refs").write_text("5")
+    except OSError:
+        pass
+
+
+@contextmanager
+def asgi_client(database: Path) -> Iterator[Tuple[Any, int]]:
+    """In-process client; the app's sessions are pointed at `database`"""
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session, SQLModel, create_engine
+
+    from app.db import get_session
+    from app.main import app
+
+    engine = create_engine(
+        f"sqlite:///{database}", connect_args={"check_same_thread": False}
+    )
+    # As the app's startup does for its own database
+    SQLModel.metadata.create_all(engine)
+
+    def get_benchmark_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_benchmark_session
+    try:
+        # Count 500s as errors, as they would be over a socket
+        with TestClient(app, raise_server_exceptions=False) as client:
+            yield client, os.getpid()
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+
+def _free_port() -> int:
+    with closing(socket.socket()) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def uvicorn_client(database: Path, env: Dict[str, str]) -> Iterator[Tuple[Any, int]]:
+    """A real server process on a local socket"""
+    port = _free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env={**os.environ, **env, "DATABASE_URL": f"sqlite:///{database}"},
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    client.get("/health")
+                    break
+                except httpx.TransportError:
+                    if server.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError("uvicorn did not start")
+                    time.sleep(0.1)
+            yield client, server.pid
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def app_env(workdir: Path) -> Dict[str, str]:
+    """Settings the app reads once, on import"""
+    return {
+        "IMAGE_CACHE_DIR": str(workdir / "variants"),
+        # Opens the /admin endpoints to the scenarios
+        "ADMIN_TOKEN": ADMIN_TOKEN,
+        "PROFILE_TOKEN": ADMIN_TOKEN,
+        # The app's default engine is only used by the startup hook here
+        "DATABASE_URL": f"sqlite:///{workdir / 'unused.db'}",
+    }
+
+
+def run_suite(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    from benchmarks.datasets import catalog_database, size_label, working_copy
+
+    env = app_env(workdir)
+    runs: Dict[str, Any] = {}
+    for count in args.sizes:
+        dataset = catalog_database(count, args.seed)
+        data = load_dataset(dataset)
+        scenarios = [
+            s for s in build_scenarios(data) if not args.filter or args.filter in s.name
+        ]
+
+        for mode in args.modes:
+            copy = working_copy(dataset, workdir / f"{mode}-{size_label(count)}.db")
+            connect = (
+                asgi_client if mode == "asgi" else partial(uvicorn_client, env=env)
+            )
+            key = f"{mode}/{size_label(count)}"
+            print(f"\n{key} ({len(scenarios)} scenarios)")
+
+            results: Dict[str, Any] = {}
+            width = max(len(s.name) for s in scenarios)
+            with connect(copy) as (client, pid):
+                _reset_peak_rss(pid)
+                for scenario in scenarios:
+                    warmup = 0 if scenario.writes else args.warmup
+                    if scenario.prepare:
+                        scenario.prepare(client, args.requests + warmup)
+                    result = run_scenario(
+                        client,
+                        scenario,
+                        args.requests,
+                        warmup,
+                        args.max_seconds,
+                        args.concurrency,
+                    )
+                    results[scenario.name] = result
+                    print(
+                        f"  {scenario.name:<{width}} {result['p50_ms']:9.2f} "
+                        f"{result['p95_ms']:9.2f} {result['p99_ms']:9.2f} ms "
+                        f"{result['throughput_rps']:9.1f} req/s"
+                        + (f"  {result['errors']} errors" if result["errors"] else "")
+                    )
+                peak = _peak_rss_mb(pid)
+
+            runs[key] = {"peak_rss_mb": peak, "scenarios": results}
+            print(f"  peak RSS: {peak} MB")
+
+    return {
+        "created_at": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": args.seed,
+        "concurrency": args.concurrency,
+        "runs": runs,
+    }
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float,
+    min_delta_ms: float,
+) -> List[str]:
+    """Describe every metric that regressed by more than `threshold`"""
+    regressions = []
+    for key, run in current["runs"].items():
+        base_run = baseline.get("runs", {}).get(key)
+        if not base_run:
+            continue
+
+        base_rss, rss = base_run.get("peak_rss_mb"), run.get("peak_rss_mb")
+        if base_rss and rss and rss > base_rss * (1 + threshold):
+            regressions.append(f"{key} peak RSS: {base_rss} -> {rss} MB")
+
+        for name, result in run["scenarios"].items():
+            base = base_run["scenarios"].get(name)
+            if not base:
+                continue
+            for metric in LATENCY_METRICS:
+                before, after = base[metric], result[metric]
+                if after > before * (1 + threshold) and after - before > min_delta_ms:
+                    regressions.append(
+                        f"{key} {name} {metric}: {before:.2f} -> {after:.2f}"
+                    )
+            before, after = base["throughput_rps"], result["throughput_rps"]
+            if after < before * (1 - threshold):
+                regressions.append(
+                    f"{key} {name} throughput: {before:.1f} -> {after:.1f} req/s"
+                )
+            if result["errors"] > base["errors"]:
+                regressions.append(
+                    f"{key} {name} errors: {base['errors']} -> {result['errors']}"
+                )
+    return regressions
+
+
+def main():
+    with tempfile.TemporaryDirectory(prefix="bench-endpoints-") as workdir:
+        # Before anything imports app.db
+        os.environ.update(app_env(Path(workdir)))
+        args = parse_args()
+        results = run_suite(args, Path(workdir))
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(results, indent=2) + "\n")
+            print(f"\nWrote {path}")
+
+    if args.baseline:
+        regressions = compare(
+            json.loads(args.baseline.read_text()),
+            results,
+            args.threshold,
+            args.min_delta_ms,
+        )
+        if regressions:
+            print(f"\n{len(regressions)} regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+def parse_args() -> argparse.Namespace:
+    from app.generate_catalog import DEFAULT_SEED, parse_count
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [parse_count(v) for v in value.split(",")],
+        default=[1_000, 10_000],
+        help="Comma-separated catalog sizes (default 1k,10k)",
+    )
+    parser.add_argument(
+        "--modes",
+        type=lambda value: value.split(","),
+        default=["asgi", "uvicorn"],
+        help="asgi, uvicorn or both (default)",
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--requests", type=int, default=50, help="Per scenario")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=5.0,
+        help="Stop a scenario early after this long (default 5)",
+    )
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--filter", help="Only scenarios whose name contains this")
+    parser.add_argument("--output", type=Path, help="Write the results JSON here")
+    parser.add_argument(
+        "--save-baseline",
+        nargs="?",
+        const=DEFAULT_BASELINE,
+        type=Path,
+        metavar="PATH",
+        help=f"Save the results as the baseline (default {DEFAULT_BASELINE.name})",
+    )
+    parser.add_argument(
+        "--baseline",
+        nargs="?",
+        const=DEFAULT_BASELINE,
+        type=Path,
+        metavar="PATH",
+        help="Compare against a saved baseline and fail on regressions",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Allowed relative regression (default 0.25 = 25%%)",
+    )
+    parser.add_argument(
+        "--min-delta-ms",
+        type=float,
+        default=2.0,
+        help="Ignore latency changes smaller than this (default 2ms)",
+    )
+    args = parser.parse_args()
+    if unknown := set(args.modes) - {"asgi", "uvicorn"}:
+        parser.error(f"Unknown mode: {', '.join(sorted(unknown))}")
+    return args
+
+
+if __name__ == "__main__":
+    main()
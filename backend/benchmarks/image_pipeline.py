@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark image transcoding throughput across process-pool sizes.
+
+    uv run python -m benchmarks.image_pipeline --images 64 --image-size 1600
+
+Runs the same batch of encode + resize jobs inline and through ImagePipeline
+with 1..N worker processes, reporting throughput and scaling efficiency
+(speedup over one worker divided by the worker count).
+"""
+
+import argparse
+import io
+import os
+import time
+from typing import List
+
+from PIL import Image
+
+from app.image_pipeline import ImagePipeline
+
+
+def make_source(size: int) -> bytes:
+    # Gradient plus noise: decodes like a photo, not a flat test card
+    gradient = Image.linear_gradient("L").resize((size, size)).convert("RGB")
+    noise = Image.frombytes("RGB", (size, size), os.urandom(size * size * 3))
+    image = Image.blend(gradient, noise, 0.2)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def run(pipeline: ImagePipeline, sources: List[bytes], width: int) -> float:
+    start = time.perf_counter()
+    encoded = [pipeline.encode_png(data) for data in sources]
+    variants = [
+        pipeline.render_variant(future.result().data, width, "webp")
+        for future in encoded
+    ]
+    for future in variants:
+        future.result()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--image-size", type=int, default=1600)
+    parser.add_argument("--width", type=int, default=300)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    source = make_source(args.image_size)
+    sources = [source] * args.images
+    print(
+        f"{args.images} images of {len(source) / 1024:.0f} KiB "
+        f"({args.image_size}px), {os.cpu_count()} CPUs"
+    )
+
+    inline = run(ImagePipeline(max_workers=0), sources, args.width)
+    print(f"inline:      {inline:6.2f}s  {args.images / inline:7.1f} images/s")
+
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        pipeline = ImagePipeline(max_workers=workers)
+        try:
+            # Warm up so process start-up isn't counted
+            run(pipeline, sources[:workers], args.width)
+            elapsed = run(pipeline, sources, args.width)
+        finally:
+            pipeline.shutdown()
+
+        baseline = baseline or elapsed
+        efficiency = baseline / elapsed / workers
+        print(
+            f"{workers:2d} workers:  {elapsed:6.2f}s  "
+            f"{args.images / elapsed:7.1f} images/s  "
+            f"efficiency {efficiency:6.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark building the product listing, ORM hydration versus the
+column-only rows of crud.list_products.
+
+    uv run python -m benchmarks.listing --products 100000
+
+Runs both paths over the standard synthetic catalog (benchmarks.datasets)
+and reports time and memory per product for the query plus the
+response dicts; FastAPI's validation and JSON encoding are left out, as
+they are the same for both.
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple, cast
+
+from sqlalchemy.orm import selectinload
+from sqlalchemy.sql.elements import ColumnElement
+from sqlmodel import Session, create_engine, select
+
+from app import crud, slow_queries
+from app.main import _delivery_options_by_id, _listing, calculate_delivery_summary
+from app.models import Category, Product
+from app.serializers import product_fields
+from benchmarks.datasets import catalog_database
+
+
+def orm_listing(session: Session) -> List[Dict[str, Any]]:
+    """The listing as /api/products built it before list_products"""
+    stmt = (
+        select(Product)
+        .join(Category)
+        .options(selectinload(cast(Any, Product.delivery_options)))
+        .options(selectinload(cast(Any, Product.category)))
+        .order_by(cast(ColumnElement, Product.created_at).desc())
+    )
+    result = []
+    for product in session.exec(stmt).all():
+        item = product_fields(product)
+        category = product.category
+        assert category is not None  # Inner-joined above
+        item["category"] = {
+            "id": category.id,
+            "name": category.name,
+            "created_at": category.created_at,
+            "updated_at": category.updated_at,
+        }
+        summary = calculate_delivery_summary(product.delivery_options)
+        item["delivery_summary"] = summary.model_dump() if summary else None
+        result.append(item)
+    return result
+
+
+def core_listing(session: Session) -> List[Dict[str, Any]]:
+    rows = crud.list_products(
+        session, sort="created_desc", with_delivery_option_ids=True
+    )
+    return _listing(rows, _delivery_options_by_id(session))
+
+
+def measure(
+    engine: Any, build: Callable[[Session], List[Dict[str, Any]]]
+) -> Tuple[float, int, int]:
+    """Best-of-3 seconds, then for one run the bytes per product still held
+    with the listing built (the listing plus the session's objects) and the
+    peak bytes allocated"""
+    best = float("inf")
+    for _ in range(3):
+        gc.collect()
+        with Session(engine) as session:
+            start = time.perf_counter()
+            count = len(build(session))
+            best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    with Session(engine) as session:
+        tracemalloc.start()
+        listing = build(session)
+        held = sum(
+            stat.size for stat in tracemalloc.take_snapshot().statistics("filename")
+        )
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del listing
+    return best, held // count, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Every listing query here is "slow"; don't log and EXPLAIN them
+    slow_queries.SLOW_QUERY_MS = 0
+    engine = create_engine(f"sqlite:///{catalog_database(args.products, args.seed)}")
+    results = {}
+    for name, build in (("orm", orm_listing), ("core", core_listing)):
+        seconds, retained, peak = measure(engine, build)
+        results[name] = seconds
+        print(
+            f"{name:5} {seconds:6.2f}s  "
+            f"{seconds / args.products * 1e6:6.1f}us/product  "
+            f"{retained:5d} B/product held  "
+            f"peak {peak / 1024 / 1024:6.1f} MiB"
+        )
+    print(f"core is {results['orm'] / results['core']:.1f}x faster")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
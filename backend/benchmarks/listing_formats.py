@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Compare the encodings of the product listing: size, and the time a
+consumer spends decoding it.
+
+    uv run python -m benchmarks.listing_formats --products 10000
+
+Builds the /products?include_delivery_summary=true listing over the
+standard synthetic catalog (benchmarks.datasets) in each shape, encodes
+it as JSON and as MessagePack the way the endpoints do, and reports the
+body size raw and gzipped, the encode time, and the decode time with
+orjson, the stdlib json module and msgpack.
+"""
+
+import argparse
+import gzip
+import json
+import time
+from typing import Any, Callable, List, Tuple
+
+import msgpack  # type: ignore[import-untyped]
+import orjson
+from sqlmodel import Session, create_engine
+
+from app import crud, slow_queries
+from app.main import _delivery_options_by_id, _listing
+from app.responses import dumps, packb
+from benchmarks.datasets import catalog_database
+
+
+def best_of(runs: int, fn: Callable[[], Any]) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    slow_queries.SLOW_QUERY_MS = 0
+    engine = create_engine(f"sqlite:///{catalog_database(args.products, args.seed)}")
+    with Session(engine) as session:
+        rows = crud.list_products(session, with_delivery_option_ids=True)
+        options = _delivery_options_by_id(session)
+    engine.dispose()
+
+    decoders: List[Tuple[str, Callable[[bytes], Any]]] = [
+        ("orjson", orjson.loads),
+        ("json", json.loads),
+    ]
+    baseline = None
+    print(
+        f"{'shape':10} {'format':8} {'bytes':>11} {'gzip':>10} "
+        f"{'encode':>9} {'decoder':>8} {'decode':>9}"
+    )
+    for shape in ("nested", "normalized", "columnar"):
+        content = _listing(rows, options, shape)
+        for fmt, encode, format_decoders in (
+            ("json", dumps, decoders),
+            ("msgpack", packb, [("msgpack", msgpack.unpackb)]),
+        ):
+            body = encode(content)
+            encode_seconds = best_of(args.runs, lambda: encode(content))
+            gzipped = len(gzip.compress(body, 6))
+            baseline = baseline or len(body)
+            for name, decode in format_decoders:
+                decode_seconds = best_of(args.runs, lambda: decode(body))
+                print(
+                    f"{shape:10} {fmt:8} {len(body):11,d} {gzipped:10,d} "
+                    f"{encode_seconds * 1000:7.1f}ms {name:>8} "
+                    f"{decode_seconds * 1000:7.1f}ms"
+                    f"  ({len(body) / baseline:.0%} of nested JSON)"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent image ingestion against a local fake image server.
+
+    uv run python -m benchmarks.seed_images --images 200 --latency 0.05
+
+Compares one-at-a-time downloads (the old seeder's behaviour) with the pooled
+ImageFetcher at the given worker count.
+"""
+
+import argparse
+import time
+
+from app.image_ingest import ImageFetcher
+from tests.fake_image_server import FakeImageServer
+
+
+def run(fetcher: ImageFetcher, server: FakeImageServer, images: int) -> float:
+    jobs = [(i, server.url_for(i)) for i in range(images)]
+    start = time.perf_counter()
+    failures = sum(1 for result in fetcher.fetch_all(jobs) if result.error)
+    elapsed = time.perf_counter() - start
+    if failures:
+        print(f"  warning: {failures} failed downloads")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--image-size", type=int, default=800)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--per-host", type=int, default=16)
+    args = parser.parse_args()
+
+    with FakeImageServer(latency=args.latency, image_size=args.image_size) as server:
+        print(
+            f"{args.images} images of {len(server.image_bytes) / 1024:.0f} KiB, "
+            f"{args.latency * 1000:.0f} ms latency"
+        )
+
+        sequential = run(
+            ImageFetcher(max_workers=1, per_host_limit=1), server, args.images
+        )
+        print(
+            f"sequential:  {sequential:6.2f}s  {args.images / sequential:7.1f} images/s"
+        )
+
+        server.connections = 0
+        concurrent = run(
+            ImageFetcher(max_workers=args.workers, per_host_limit=args.per_host),
+            server,
+            args.images,
+        )
+        print(
+            f"concurrent:  {concurrent:6.2f}s  {args.images / concurrent:7.1f} images/s"
+            f"  ({server.connections} connections, "
+            f"peak {server.max_concurrent} in flight)"
+        )
+        print(f"speedup:     {sequential / concurrent:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
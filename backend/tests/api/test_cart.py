@@ -0,0 +1,148 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.models import Product
+from app.schemas import CartQuote
+from tests.factories import (
+    create_standard_delivery_options,
+    create_test_category,
+    create_test_delivery_option,
+    create_test_product,
+)
+
+
+@pytest.fixture
+def cart_products(session: Session) -> list[Product]:
+    """Two products sharing standard ($25 minimum), express, same day and an
+    inactive option; only the first also ships next day"""
+    standard, express, next_day, same_day = create_standard_delivery_options(session)
+    retired = create_test_delivery_option(session, is_active=False)
+    category = create_test_category(session)
+    first = create_test_product(session, category.id, price=10.05)
+    second = create_test_product(session, category.id, price=4.99)
+    first.delivery_options = [standard, express, next_day, same_day, retired]
+    second.delivery_options = [standard, express, same_day, retired]
+    session.add(first)
+    session.add(second)
+    session.commit()
+    return [first, second]
+
+
+def _quote(client: TestClient, *items: tuple[int | None, int]):
+    return client.post(
+        "/api/cart/quote",
+        json={"items": [{"product_id": p, "quantity": q} for p, q in items]},
+    )
+
+
+def _names(quote: dict) -> list[str]:
+    return [option["name"] for option in quote["delivery_options"]]
+
+
+def test_quote_prices_lines_and_subtotal(
+    client: TestClient, cart_products: list[Product]
+):
+    first, second = cart_products
+
+    response = _quote(client, (first.id, 3), (second.id, 1))
+
+    assert response.status_code == 200
+    quote = response.json()
+    assert [(line["product_id"], line["line_total"]) for line in quote["lines"]] == [
+        (first.id, 30.15),
+        (second.id, 4.99),
+    ]
+    assert quote["lines"][0]["unit_price"] == 10.05
+    assert quote["lines"][0]["title"] == first.title
+    assert quote["item_count"] == 4
+    assert quote["subtotal"] == 35.14
+    # Returned without FastAPI's validation, so check it matches the model
+    assert CartQuote.model_validate(quote).model_dump(mode="json") == quote
+
+
+def test_quote_lists_active_options_shared_by_every_item(
+    client: TestClient, cart_products: list[Product]
+):
+    first, second = cart_products
+
+    quote = _quote(client, (first.id, 3), (second.id, 1)).json()
+
+    assert _names(quote) == [
+        "Standard Shipping",
+        "Express Delivery",
+        "Same Day Delivery",
+    ]
+    standard, express, _ = quote["delivery_options"]
+    assert standard["eligible"] is True
+    assert standard["amount_to_qualify"] == 0
+    assert standard["total"] == 35.14
+    assert express["total"] == 45.13
+    assert "Next Day Delivery" in _names(_quote(client, (first.id, 1)).json())
+
+
+def test_quote_applies_min_order_amount(
+    client: TestClient, cart_products: list[Product]
+):
+    """Test that below its minimum an option is listed as ineligible, after
+    the eligible ones, with the amount still needed"""
+    first, second = cart_products
+
+    quote = _quote(client, (first.id, 1), (second.id, 2)).json()
+
+    assert quote["subtotal"] == 20.03
+    assert _names(quote) == [
+        "Express Delivery",
+        "Same Day Delivery",
+        "Standard Shipping",
+    ]
+    standard = quote["delivery_options"][-1]
+    assert standard["eligible"] is False
+    assert standard["amount_to_qualify"] == 4.97
+    assert standard["total"] is None
+
+
+def test_quote_merges_repeated_products(
+    client: TestClient, cart_products: list[Product]
+):
+    first, _ = cart_products
+
+    quote = _quote(client, (first.id, 1), (first.id, 2)).json()
+
+    assert quote["subtotal"] == 30.15
+    assert "Next Day Delivery" in _names(quote)
+
+
+def test_quote_rejects_unknown_products_and_bad_quantities(
+    client: TestClient, cart_products: list[Product]
+):
+    first, _ = cart_products
+
+    response = _quote(client, (first.id, 1), (999999, 1))
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Products not found: 999999"
+
+    assert _quote(client, (first.id, 0)).status_code == 422
+    assert _quote(client).status_code == 422
+    assert _quote(client, *[(first.id, 1)] * 501).status_code == 422
+
+
+def test_quote_runs_two_queries_for_a_large_cart(
+    client: TestClient, session: Session, query_budget
+):
+    category = create_test_category(session)
+    options = create_standard_delivery_options(session)
+    products = []
+    for _ in range(40):
+        product = create_test_product(session, category.id, price=1.25)
+        product.delivery_options = options
+        session.add(product)
+        products.append(product)
+    session.commit()
+
+    response = _quote(client, *[(product.id, 5) for product in products * 5])
+
+    assert response.status_code == 200
+    assert response.json()["subtotal"] == 1250.0
+    assert len(response.json()["delivery_options"]) == 4
+    query_budget(response, 2)
@@ -2,6 +2,7 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session
 from tests.factories import (
+    create_test_category,
     create_test_product,
     create_test_delivery_option,
     create_standard_delivery_options,
@@ -229,3 +230,44 @@ def test_product_with_minimum_order_amount_api_response(
     # Verify minimum order amounts are correctly returned
     assert standard["min_order_amount"] == 25.0
     assert premium["min_order_amount"] is None
+
+
+def test_delivery_fastest_sort_lists_each_product_once(
+    client: TestClient, session: Session
+):
+    """Test products are ordered by their fastest active option, then price"""
+    category = create_test_category(session)
+    standard = create_test_delivery_option(session, speed=DeliverySpeed.STANDARD)
+    same_day = create_test_delivery_option(session, speed=DeliverySpeed.SAME_DAY)
+    inactive = create_test_delivery_option(
+        session, speed=DeliverySpeed.SAME_DAY, is_active=False
+    )
+    slow = create_test_product(session, category_id=category.id, price=5.0)
+    fast = create_test_product(session, category_id=category.id, price=50.0)
+    fast_cheap = create_test_product(session, category_id=category.id, price=10.0)
+    unlisted = create_test_product(session, category_id=category.id, price=1.0)
+    slow.delivery_options = [standard, inactive]
+    fast.delivery_options = [standard, same_day]
+    fast_cheap.delivery_options = [same_day]
+    session.add_all([slow, fast, fast_cheap])
+    session.commit()
+
+    response = client.get(
+        f"/api/products?categoryId={category.id}&sort=delivery_fastest"
+    )
+
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == [
+        fast_cheap.id,
+        fast.id,
+        slow.id,
+        unlisted.id,  # No options sorts last
+    ]
+
+    response = client.get(
+        f"/api/products?categoryId={category.id}&deliveryOptionId={standard.id}"
+        "&sort=delivery_fastest"
+    )
+
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == [fast.id, slow.id]
@@ -0,0 +1,240 @@
+import asyncio
+import base64
+import io
+
+import pytest
+from PIL import Image
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+from starlette.requests import Request
+
+import app.main
+from app.image_cache import variant_cache
+from app.image_jobs import PREWARM_VARIANTS, image_jobs
+from app.images import variant_key
+from app import crud
+from tests.factories import create_test_product, generate_test_image
+
+
+def _wait_for_job(client: TestClient, response) -> dict:
+    assert response.status_code == 202
+    job = image_jobs.get(response.json()["id"])
+    assert job is not None
+    assert job.wait(timeout=10)
+
+    status = client.get(response.json()["status_url"])
+    assert status.status_code == 200
+    return status.json()
+
+
+def test_upload_raw_image_is_processed_in_background(
+    client: TestClient, session: Session
+):
+    """Test that a raw image/* body is accepted and stored as PNG"""
+    product = create_test_product(session)
+    image_data = generate_test_image(width=640, height=480)
+
+    response = client.put(
+        f"/products/{product.id}/image",
+        content=image_data,
+        headers={"Content-Type": "image/jpeg"},
+    )
+    assert response.status_code == 202
+    assert response.headers["location"] == response.json()["status_url"]
+    assert response.json()["product_id"] == product.id
+
+    job = _wait_for_job(client, response)
+    assert job["status"] == "done"
+    assert job["finished_at"] is not None
+
+    image_response = client.get(f"/products/{product.id}/image")
+    assert image_response.status_code == 200
+    assert image_response.headers["content-type"] == "image/png"
+    assert Image.open(io.BytesIO(image_response.content)).size == (640, 480)
+
+
+def test_upload_stores_dimensions_and_preview(client: TestClient, session: Session):
+    """Test that processing an upload records what listings show up front"""
+    product = create_test_product(session)
+
+    response = client.put(
+        f"/products/{product.id}/image",
+        content=generate_test_image(width=640, height=480),
+        headers={"Content-Type": "image/jpeg"},
+    )
+    assert _wait_for_job(client, response)["status"] == "done"
+
+    listed = next(p for p in client.get("/products").json() if p["id"] == product.id)
+    assert (listed["image_width"], listed["image_height"]) == (640, 480)
+
+    prefix = "data:image/webp;base64,"
+    assert listed["image_preview"].startswith(prefix)
+    preview = Image.open(
+        io.BytesIO(base64.b64decode(listed["image_preview"][len(prefix) :]))
+    )
+    assert preview.size == (16, 12)
+
+
+def test_upload_multipart_image(client: TestClient, session: Session):
+    """Test that a multipart upload with a 'file' part is accepted"""
+    product = create_test_product(session)
+
+    response = client.put(
+        f"/products/{product.id}/image",
+        files={"file": ("photo.jpg", generate_test_image(), "image/jpeg")},
+    )
+
+    job = _wait_for_job(client, response)
+    assert job["status"] == "done"
+    assert client.get(f"/products/{product.id}").json()["image_url"] == (
+        f"/products/{product.id}/image"
+    )
+
+
+def test_upload_replaces_image_and_prewarms_variants(
+    client: TestClient, session: Session
+):
+    """Test that a new upload invalidates old variants and renders new ones"""
+    product = create_test_product(session, with_image=True)
+    old_meta = crud.get_product_image_meta(session, product.id or 0)
+
+    response = client.put(
+        f"/products/{product.id}/image",
+        content=generate_test_image(width=500, height=500),
+        headers={"Content-Type": "image/jpeg"},
+    )
+    _wait_for_job(client, response)
+
+    session.expire_all()
+    new_meta = crud.get_product_image_meta(session, product.id or 0)
+    assert old_meta is not None and new_meta is not None
+    assert new_meta.version != old_meta.version
+    for width, fmt in PREWARM_VARIANTS:
+        assert variant_key(new_meta, width, fmt) in variant_cache
+
+
+def test_upload_invalid_image_fails_job_and_keeps_old_image(
+    client: TestClient, session: Session
+):
+    """Test that undecodable uploads fail in the background without damage"""
+    product = create_test_product(session, with_image=True)
+    original = client.get(f"/products/{product.id}/image").content
+
+    response = client.put(
+        f"/products/{product.id}/image",
+        content=b"definitely not an image",
+        headers={"Content-Type": "image/png"},
+    )
+
+    job = _wait_for_job(client, response)
+    assert job["status"] == "failed"
+    assert job["error"]
+    assert client.get(f"/products/{product.id}/image").content == original
+
+
+def test_upload_to_missing_product_returns_404(client: TestClient):
+    """Test that uploads for unknown products are rejected up front"""
+    response = client.put(
+        "/products/99999/image",
+        content=generate_test_image(),
+        headers={"Content-Type": "image/jpeg"},
+    )
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("content_type", ["text/plain", "application/json"])
+def test_upload_unsupported_content_type_returns_415(
+    client: TestClient, session: Session, content_type: str
+):
+    """Test that non-image bodies are rejected"""
+    product = create_test_product(session)
+
+    response = client.put(
+        f"/products/{product.id}/image",
+        content=b"hello",
+        headers={"Content-Type": content_type},
+    )
+    assert response.status_code == 415
+
+
+def test_upload_multipart_without_file_part_returns_400(
+    client: TestClient, session: Session
+):
+    """Test that multipart uploads must carry a file"""
+    product = create_test_product(session)
+
+    response = client.put(
+        f"/products/{product.id}/image", files={"name": (None, "not a file")}
+    )
+    assert response.status_code == 400
+
+
+def test_upload_over_size_limit_returns_413(
+    client: TestClient, session: Session, monkeypatch: pytest.MonkeyPatch
+):
+    """Test that uploads larger than the limit are rejected while streaming"""
+    product = create_test_product(session)
+    monkeypatch.setattr(app.main, "MAX_IMAGE_UPLOAD_BYTES", 1024)
+
+    # Declared length
+    response = client.put(
+        f"/products/{product.id}/image",
+        content=b"x" * 2048,
+        headers={"Content-Type": "image/jpeg"},
+    )
+    assert response.status_code == 413
+
+    # Chunked body with no Content-Length
+    response = client.put(
+        f"/products/{product.id}/image",
+        content=iter([b"x" * 512] * 4),
+        headers={"Content-Type": "image/jpeg"},
+    )
+    assert response.status_code == 413
+
+
+def test_chunked_multipart_upload_is_cut_off_at_size_limit(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    """Test that a multipart body with no Content-Length is refused once it
+    passes the limit, not spooled whole before the file part is checked"""
+    monkeypatch.setattr(app.main, "MAX_IMAGE_UPLOAD_BYTES", 1024)
+    monkeypatch.setattr(app.main, "MULTIPART_OVERHEAD_BYTES", 1024)
+    head = (
+        b"--b\r\n"
+        b'Content-Disposition: form-data; name="file"; filename="a.jpg"\r\n'
+        b"Content-Type: image/jpeg\r\n\r\n"
+    )
+    chunks = [head] + [b"x" * 1024] * 1000 + [b"\r\n--b--\r\n"]
+    sent = 0
+
+    async def receive():
+        nonlocal sent
+        sent += 1
+        return {
+            "type": "http.request",
+            "body": chunks[sent - 1],
+            "more_body": sent < len(chunks),
+        }
+
+    request = Request(
+        {
+            "type": "http",
+            "method": "PUT",
+            "path": "/",
+            "query_string": b"",
+            "headers": [(b"content-type", b"multipart/form-data; boundary=b")],
+        },
+        receive,
+    )
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(app.main._spool_upload(request))
+    assert raised.value.status_code == 413
+    assert sent < 10
+
+
+def test_get_unknown_image_job_returns_404(client: TestClient):
+    """Test that unknown job ids return 404"""
+    assert client.get("/image-jobs/does-not-exist").status_code == 404
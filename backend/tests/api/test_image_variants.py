@@ -0,0 +1,334 @@
+import io
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from PIL import Image
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.image_cache import VariantCache, variant_cache
+from app.images import VARIANT_FORMATS, image_stats
+from app.crud import store_image_blob
+from tests.factories import create_test_product, generate_test_image, get_stored_image
+
+
+def _create_product_with_image(session: Session, width: int = 800, height: int = 600):
+    product = create_test_product(session)
+    product.image_blob_id = store_image_blob(
+        session, generate_test_image(width=width, height=height)
+    )
+    product.image_mime_type = "image/jpeg"
+    session.add(product)
+    session.commit()
+    session.refresh(product)
+    return product
+
+
+def test_get_image_variant_resizes_and_converts(client: TestClient, session: Session):
+    """Test that ?w= and ?fmt= return a resized image in the requested format"""
+    product = _create_product_with_image(session)
+
+    response = client.get(f"/products/{product.id}/image?w=300&fmt=webp")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "_w300.webp" in response.headers["content-disposition"]
+
+    image = Image.open(io.BytesIO(response.content))
+    assert image.format == "WEBP"
+    assert image.size == (300, 225)  # Aspect ratio preserved
+
+
+def test_get_image_variant_width_only_keeps_stored_format(
+    client: TestClient, session: Session
+):
+    """Test that a width without a format keeps the stored image format"""
+    product = _create_product_with_image(session)
+
+    response = client.get(f"/products/{product.id}/image?w=150")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert Image.open(io.BytesIO(response.content)).size == (150, 112)
+
+
+def test_get_image_variant_never_upscales(client: TestClient, session: Session):
+    """Test that widths larger than the source keep the original dimensions"""
+    product = _create_product_with_image(session, width=200, height=100)
+
+    response = client.get(f"/products/{product.id}/image?w=1200&fmt=png")
+    assert response.status_code == 200
+    assert Image.open(io.BytesIO(response.content)).size == (200, 100)
+
+
+@pytest.mark.parametrize("query", ["w=301", "w=0", "fmt=bmp", "w=300&fmt=tiff"])
+def test_get_image_variant_rejects_unlisted_params(
+    client: TestClient, session: Session, query: str
+):
+    """Test that only the fixed widths and formats can be requested"""
+    product = _create_product_with_image(session)
+
+    response = client.get(f"/products/{product.id}/image?{query}")
+    assert response.status_code == 400
+
+
+def test_get_image_variant_is_rendered_once(client: TestClient, session: Session):
+    """Test that repeated variant requests are served from the cache"""
+    product = _create_product_with_image(session)
+    misses_before = variant_cache.misses
+
+    first = client.get(f"/products/{product.id}/image?w=600&fmt=jpeg")
+    second = client.get(f"/products/{product.id}/image?w=600&fmt=jpeg")
+
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content
+    assert variant_cache.misses == misses_before + 1
+
+
+def test_head_image_variant_matches_get(client: TestClient, session: Session):
+    """Test that HEAD reports the variant's type and length"""
+    product = _create_product_with_image(session)
+
+    head = client.head(f"/products/{product.id}/image?w=300&fmt=png")
+    get = client.get(f"/products/{product.id}/image?w=300&fmt=png")
+
+    assert head.status_code == 200
+    assert head.content == b""
+    assert head.headers["content-type"] == "image/png"
+    assert int(head.headers["content-length"]) == len(get.content)
+
+
+def test_get_image_variant_supports_ranges(client: TestClient, session: Session):
+    """Test that range requests apply to the rendered variant"""
+    product = _create_product_with_image(session)
+    full = client.get(f"/products/{product.id}/image?w=300&fmt=webp").content
+
+    response = client.get(
+        f"/products/{product.id}/image?w=300&fmt=webp", headers={"Range": "bytes=0-9"}
+    )
+    assert response.status_code == 206
+    assert response.content == full[:10]
+
+
+def test_get_image_variant_of_corrupt_image_returns_500(
+    client: TestClient, session: Session
+):
+    """Test that undecodable stored images fail cleanly for variants"""
+    product = create_test_product(session)
+    product.image_blob_id = store_image_blob(session, b"This is not valid image data")
+    product.image_mime_type = "image/jpeg"
+    session.add(product)
+    session.commit()
+
+    response = client.get(f"/products/{product.id}/image?w=300")
+    assert response.status_code == 500
+
+
+def test_variant_cache_evicts_least_recently_used(tmp_path: Path):
+    """Test that the cache stays under its byte budget by evicting LRU entries"""
+    cache = VariantCache(tmp_path, max_bytes=250)
+
+    cache.put("a", b"x" * 100)
+    cache.put("b", b"x" * 100)
+    assert cache.get("a") is not None  # Touch "a" so "b" becomes LRU
+    cache.put("c", b"x" * 100)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert cache.total_bytes == 200
+    assert not (tmp_path / "b").exists()
+
+
+def test_variant_cache_rebuilds_index_from_disk(tmp_path: Path):
+    """Test that cached variants survive a restart"""
+    VariantCache(tmp_path, max_bytes=1000).put("a", b"data")
+
+    cache = VariantCache(tmp_path, max_bytes=1000)
+    assert cache.get("a") == b"data"
+    assert cache.total_bytes == 4
+
+
+def test_variant_cache_renders_files_removed_from_disk(tmp_path: Path):
+    """Test that a variant deleted behind the cache's back, e.g. by another
+    process sharing the directory, is forgotten and rendered again"""
+    cache = VariantCache(tmp_path, max_bytes=1000)
+    cache.put("a", b"old")
+    (tmp_path / "a").unlink()
+
+    assert cache.get_or_create("a", lambda: b"rendered") == b"rendered"
+    assert cache.misses == 1
+    assert cache.total_bytes == len(b"rendered")
+    assert (tmp_path / "a").read_bytes() == b"rendered"
+
+
+def test_variant_cache_single_flights_concurrent_misses(tmp_path: Path):
+    """Test that concurrent misses for one key trigger a single render"""
+    cache = VariantCache(tmp_path, max_bytes=1000)
+    render_calls = 0
+    calls_lock = threading.Lock()
+
+    def render() -> bytes:
+        nonlocal render_calls
+        with calls_lock:
+            render_calls += 1
+        time.sleep(0.1)
+        return b"rendered"
+
+    results = []
+
+    def fetch():
+        results.append(cache.get_or_create("key", render))
+
+    threads = [threading.Thread(target=fetch) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert render_calls == 1
+    assert results == [b"rendered"] * 10
+
+
+def test_variant_cache_propagates_render_errors(tmp_path: Path):
+    """Test that a failed render is raised and not cached"""
+    cache = VariantCache(tmp_path, max_bytes=1000)
+
+    def render() -> bytes:
+        raise OSError("cannot identify image file")
+
+    with pytest.raises(OSError):
+        cache.get_or_create("key", render)
+    assert "key" not in cache
+
+
+def test_get_image_negotiates_webp_from_accept(client: TestClient, session: Session):
+    """Test that clients listing image/webp get a WebP encoding"""
+    product = _create_product_with_image(session)
+
+    response = client.get(
+        f"/products/{product.id}/image",
+        headers={"Accept": "image/webp,image/*,*/*;q=0.8"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["vary"] == "Accept"
+    image = Image.open(io.BytesIO(response.content))
+    assert image.format == "WEBP"
+    assert image.size == (800, 600)  # Original dimensions
+
+
+@pytest.mark.skipif("avif" not in VARIANT_FORMATS, reason="Pillow built without AVIF")
+def test_get_image_prefers_avif_over_webp(client: TestClient, session: Session):
+    """Test that AVIF wins when the client accepts both modern formats"""
+    product = _create_product_with_image(session)
+
+    response = client.get(
+        f"/products/{product.id}/image?w=300",
+        headers={"Accept": "image/avif,image/webp,*/*"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/avif"
+
+
+@pytest.mark.skipif("avif" not in VARIANT_FORMATS, reason="Pillow built without AVIF")
+def test_get_image_follows_the_clients_q_values(client: TestClient, session: Session):
+    """Test that a higher q for WebP beats AVIF, which only wins ties"""
+    product = _create_product_with_image(session)
+
+    response = client.get(
+        f"/products/{product.id}/image?w=300",
+        headers={"Accept": "image/avif;q=0.1, image/webp"},
+    )
+    assert response.headers["content-type"] == "image/webp"
+
+    response = client.get(
+        f"/products/{product.id}/image?w=300",
+        headers={"Accept": "image/avif;q=0.5, image/webp;q=0.5"},
+    )
+    assert response.headers["content-type"] == "image/avif"
+
+
+def test_get_image_wildcard_accept_serves_stored_format(
+    client: TestClient, session: Session
+):
+    """Test that wildcards alone don't trigger re-encoding"""
+    product = _create_product_with_image(session)
+
+    response = client.get(
+        f"/products/{product.id}/image", headers={"Accept": "image/*,*/*"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.content == get_stored_image(session, product)
+    assert response.headers["vary"] == "Accept"
+
+
+def test_get_image_rejected_format_is_not_negotiated(
+    client: TestClient, session: Session
+):
+    """Test that q=0 excludes a format"""
+    product = _create_product_with_image(session)
+
+    response = client.get(
+        f"/products/{product.id}/image",
+        headers={"Accept": "image/avif;q=0,image/webp;q=0,*/*"},
+    )
+    assert response.headers["content-type"] == "image/jpeg"
+
+
+def test_get_image_explicit_format_overrides_accept(
+    client: TestClient, session: Session
+):
+    """Test that ?fmt= wins over Accept and doesn't vary on it"""
+    product = _create_product_with_image(session)
+
+    response = client.get(
+        f"/products/{product.id}/image?fmt=png",
+        headers={"Accept": "image/avif,image/webp,*/*"},
+    )
+    assert response.headers["content-type"] == "image/png"
+    assert "vary" not in response.headers
+
+
+def test_get_gif_image_is_never_negotiated(client: TestClient, session: Session):
+    """Test that GIFs are served unchanged so animations survive"""
+    img_buffer = io.BytesIO()
+    Image.new("RGB", (50, 50), color=(255, 0, 0)).save(img_buffer, format="GIF")
+    product = create_test_product(session)
+    product.image_blob_id = store_image_blob(session, img_buffer.getvalue())
+    product.image_mime_type = "image/gif"
+    session.add(product)
+    session.commit()
+
+    response = client.get(
+        f"/products/{product.id}/image", headers={"Accept": "image/webp,*/*"}
+    )
+    assert response.headers["content-type"] == "image/gif"
+    assert "vary" not in response.headers
+
+
+def test_image_stats_report_bytes_per_format(client: TestClient, session: Session):
+    """Test that bytes served are reported per format with the saving"""
+    product = _create_product_with_image(session)
+    image_stats.reset()
+
+    client.get(f"/products/{product.id}/image")
+    webp = client.get(f"/products/{product.id}/image", headers={"Accept": "image/webp"})
+    client.head(f"/products/{product.id}/image")  # HEAD serves no bytes
+
+    response = client.get("/images/stats")
+    assert response.status_code == 200
+    stats = response.json()
+    original_size = len(get_stored_image(session, product))
+
+    assert stats["formats"]["jpeg"] == {
+        "responses": 1,
+        "bytes": original_size,
+        "source_bytes": original_size,
+    }
+    assert stats["formats"]["webp"]["responses"] == 1
+    assert stats["formats"]["webp"]["bytes"] == len(webp.content)
+    assert stats["total_bytes"] == original_size + len(webp.content)
+    assert stats["bytes_saved"] == original_size - len(webp.content)
@@ -1,11 +1,14 @@
+import pytest
 import io
 from PIL import Image
 from fastapi.testclient import TestClient
 from sqlmodel import Session
+from app.crud import store_image_blob
 from tests.factories import (
     create_test_category,
     create_test_product,
     generate_test_image,
+    get_stored_image,
 )
 
 
@@ -26,7 +29,7 @@ def test_get_product_image_data_integrity(client: TestClient, session: Session):
     original_image_data = generate_test_image()
 
     product = create_test_product(session)
-    product.image_data = original_image_data
+    product.image_blob_id = store_image_blob(session, original_image_data)
     product.image_mime_type = "image/jpeg"
     product.image_filename = "test_integrity.jpg"
     session.add(product)
@@ -79,7 +82,7 @@ def test_get_product_image_different_mime_types(client: TestClient, session: Ses
 
         # Create product with specific image type
         product = create_test_product(session)
-        product.image_data = image_data
+        product.image_blob_id = store_image_blob(session, image_data)
         product.image_mime_type = mime_type
         product.image_filename = f"test.{format_name.lower()}"
         session.add(product)
@@ -98,7 +101,7 @@ def test_image_response_performance(client: TestClient, session: Session):
     # Create product with larger image
     large_image_data = generate_test_image(width=800, height=600)
     product = create_test_product(session)
-    product.image_data = large_image_data
+    product.image_blob_id = store_image_blob(session, large_image_data)
     product.image_mime_type = "image/jpeg"
     session.add(product)
     session.commit()
@@ -192,7 +195,7 @@ def test_image_corruption_handling(client: TestClient, session: Session):
     product = create_test_product(session)
 
     # Set corrupted image data
-    product.image_data = b"This is not valid image data"
+    product.image_blob_id = store_image_blob(session, b"This is not valid image data")
     product.image_mime_type = "image/jpeg"
     product.image_filename = "corrupted.jpg"
     session.add(product)
@@ -230,3 +233,215 @@ def test_image_filename_sanitization(client: TestClient, session: Session):
             content_disp = response.headers["content-disposition"]
             # Should not break HTTP header parsing
             assert "filename" in content_disp
+
+
+def test_get_product_image_advertises_byte_ranges(client: TestClient, session: Session):
+    """Test that full image responses advertise range support and length"""
+    product = create_test_product(session, with_image=True)
+
+    response = client.get(f"/products/{product.id}/image")
+    assert response.status_code == 200
+    assert response.headers["accept-ranges"] == "bytes"
+    assert int(response.headers["content-length"]) == len(
+        get_stored_image(session, product)
+    )
+
+
+def test_get_product_image_range_returns_partial_content(
+    client: TestClient, session: Session
+):
+    """Test that a Range request returns 206 with the requested slice"""
+    product = create_test_product(session, with_image=True)
+    image_data = get_stored_image(session, product)
+    size = len(image_data)
+
+    response = client.get(
+        f"/products/{product.id}/image", headers={"Range": "bytes=10-99"}
+    )
+    assert response.status_code == 206
+    assert response.content == image_data[10:100]
+    assert response.headers["content-range"] == f"bytes 10-99/{size}"
+    assert response.headers["content-length"] == "90"
+
+    # Open-ended range (resumed download)
+    response = client.get(
+        f"/products/{product.id}/image", headers={"Range": "bytes=100-"}
+    )
+    assert response.status_code == 206
+    assert response.content == image_data[100:]
+
+    # Suffix range
+    response = client.get(
+        f"/products/{product.id}/image", headers={"Range": "bytes=-50"}
+    )
+    assert response.status_code == 206
+    assert response.content == image_data[-50:]
+    assert response.headers["content-range"] == f"bytes {size - 50}-{size - 1}/{size}"
+
+
+def test_get_product_image_range_end_clamped_to_size(
+    client: TestClient, session: Session
+):
+    """Test that a range ending past the image is clamped to the last byte"""
+    product = create_test_product(session, with_image=True)
+    size = len(get_stored_image(session, product))
+
+    response = client.get(
+        f"/products/{product.id}/image", headers={"Range": f"bytes=0-{size * 2}"}
+    )
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 0-{size - 1}/{size}"
+    assert response.content == get_stored_image(session, product)
+
+
+def test_get_product_image_unsatisfiable_range_returns_416(
+    client: TestClient, session: Session
+):
+    """Test that ranges starting past the end of the image return 416"""
+    product = create_test_product(session, with_image=True)
+    size = len(get_stored_image(session, product))
+
+    response = client.get(
+        f"/products/{product.id}/image", headers={"Range": f"bytes={size}-"}
+    )
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{size}"
+
+
+@pytest.mark.parametrize(
+    "range_header", ["items=0-10", "bytes=abc-def", "bytes=0-10,20-30", "bytes=10-5"]
+)
+def test_get_product_image_ignores_unsupported_ranges(
+    client: TestClient, session: Session, range_header: str
+):
+    """Test that malformed or multi-range headers fall back to the full image"""
+    product = create_test_product(session, with_image=True)
+
+    response = client.get(
+        f"/products/{product.id}/image", headers={"Range": range_header}
+    )
+    assert response.status_code == 200
+    assert response.content == get_stored_image(session, product)
+
+
+def test_head_product_image_returns_metadata_without_body(
+    client: TestClient, session: Session
+):
+    """Test that HEAD answers with size and mime type but no body"""
+    product = create_test_product(session, with_image=True)
+
+    response = client.head(f"/products/{product.id}/image")
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["content-type"] == "image/jpeg"
+    assert int(response.headers["content-length"]) == len(
+        get_stored_image(session, product)
+    )
+    assert response.headers["accept-ranges"] == "bytes"
+    assert "public" in response.headers["cache-control"]
+
+
+def test_head_product_image_missing_image_returns_404(
+    client: TestClient, session: Session
+):
+    """Test that HEAD mirrors GET's 404s"""
+    product = create_test_product(session, with_image=False)
+
+    assert client.head(f"/products/{product.id}/image").status_code == 404
+    assert client.head("/products/99999/image").status_code == 404
+
+
+def test_concurrent_large_image_streams_use_constant_memory(
+    client: TestClient, session: Session
+):
+    """Test that serving 100 large images in parallel keeps memory flat.
+
+    Drives the ASGI app directly so the client side discards body chunks
+    instead of buffering them like TestClient does.
+    """
+    import asyncio
+    import os
+    import threading
+    from app.main import app
+
+    image_size = 4 * 1024 * 1024
+    product_ids = []
+    for _ in range(10):
+        product = create_test_product(session)
+        product.image_blob_id = store_image_blob(session, os.urandom(image_size))
+        product.image_mime_type = "image/png"
+        session.add(product)
+        session.commit()
+        product_ids.append(product.id)
+        session.expunge(product)  # Don't keep the BLOBs alive in this session
+
+    if not os.path.exists("/proc/self/statm"):
+        pytest.skip("RSS sampling needs /proc")
+
+    def rss_bytes() -> int:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    async def fetch(product_id: int) -> int:
+        received = 0
+
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if requested:
+                # Client stays connected until the response completes
+                await asyncio.Event().wait()
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            nonlocal received
+            if message["type"] == "http.response.body":
+                received += len(message.get("body", b""))
+
+        path = f"/products/{product_id}/image"
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"host", b"testserver")],
+            "server": ("testserver", 80),
+            "client": ("testclient", 50000),
+        }
+        await app(scope, receive, send)
+        return received
+
+    async def fetch_all():
+        return await asyncio.gather(
+            *(fetch(product_ids[i % len(product_ids)]) for i in range(100))
+        )
+
+    peak_rss = baseline_rss = rss_bytes()
+    sampling = True
+
+    def sample_rss():
+        nonlocal peak_rss
+        while sampling:
+            peak_rss = max(peak_rss, rss_bytes())
+            threading.Event().wait(0.005)
+
+    sampler = threading.Thread(target=sample_rss)
+    sampler.start()
+    try:
+        sizes = asyncio.run(fetch_all())
+    finally:
+        sampling = False
+        sampler.join()
+
+    total_served = image_size * 100
+    assert sizes == [image_size] * 100
+    # Buffering would need ~400MB; streaming costs a fixed amount per open
+    # stream (thread + read-only connection), independent of image size.
+    assert peak_rss - baseline_rss < total_served / 4
@@ -0,0 +1,102 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from tests.factories import create_test_product
+
+
+@pytest.fixture
+def product_id(session: Session) -> int:
+    product_id = create_test_product(session).id
+    assert product_id is not None
+    return product_id
+
+
+def _stock(client: TestClient, product_id: int) -> dict:
+    response = client.get(f"/products/{product_id}/stock")
+    assert response.status_code == 200
+    return response.json()
+
+
+def _reserve(client: TestClient, product_id: int, quantity: int, **fields):
+    return client.post(
+        f"/products/{product_id}/reservations",
+        json={"quantity": quantity, **fields},
+    )
+
+
+def test_set_and_get_stock(client: TestClient, product_id: int):
+    assert client.get(f"/products/{product_id}/stock").status_code == 404
+
+    response = client.put(f"/products/{product_id}/stock", json={"on_hand": 12})
+
+    assert response.status_code == 200
+    assert response.json()["available"] == 12
+    stock = _stock(client, product_id)
+    assert (stock["on_hand"], stock["reserved"], stock["available"]) == (12, 0, 12)
+
+
+def test_reserve_holds_units(client: TestClient, product_id: int):
+    client.put(f"/products/{product_id}/stock", json={"on_hand": 5})
+
+    response = _reserve(client, product_id, 3, ttl_seconds=60)
+
+    assert response.status_code == 201
+    reservation = response.json()
+    assert reservation["status"] == "held"
+    assert reservation["quantity"] == 3
+    assert client.get(f"/reservations/{reservation['id']}").json() == reservation
+    assert _stock(client, product_id)["available"] == 2
+
+    response = _reserve(client, product_id, 3)
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Insufficient stock: 2 available"
+
+
+def test_commit_and_release(client: TestClient, product_id: int):
+    client.put(f"/products/{product_id}/stock", json={"on_hand": 10})
+    committed = _reserve(client, product_id, 4).json()
+    released = _reserve(client, product_id, 2).json()
+
+    response = client.post(f"/reservations/{committed['id']}/commit")
+    assert response.status_code == 200
+    assert response.json()["status"] == "committed"
+    response = client.post(f"/reservations/{released['id']}/release")
+    assert response.status_code == 200
+    assert response.json()["status"] == "released"
+
+    stock = _stock(client, product_id)
+    assert (stock["on_hand"], stock["reserved"]) == (6, 0)
+
+    response = client.post(f"/reservations/{committed['id']}/release")
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Reservation is committed"
+    assert _stock(client, product_id)["on_hand"] == 6
+
+
+def test_stock_cannot_drop_below_reserved(client: TestClient, product_id: int):
+    client.put(f"/products/{product_id}/stock", json={"on_hand": 10})
+    _reserve(client, product_id, 8)
+
+    response = client.put(f"/products/{product_id}/stock", json={"on_hand": 7})
+
+    assert response.status_code == 409
+    assert _stock(client, product_id)["on_hand"] == 10
+
+
+def test_inventory_not_found_and_validation(client: TestClient, product_id: int):
+    assert client.get("/products/999999/stock").json()["detail"] == (
+        "Product not found"
+    )
+    assert client.put("/products/999999/stock", json={"on_hand": 1}).status_code == 404
+    assert _reserve(client, 999999, 1).status_code == 404
+    # Untracked stock has no units to reserve
+    assert _reserve(client, product_id, 1).status_code == 409
+    assert client.get("/reservations/missing").status_code == 404
+    assert client.post("/reservations/missing/commit").status_code == 404
+    assert client.post("/reservations/missing/release").status_code == 404
+
+    assert _reserve(client, product_id, 0).status_code == 422
+    assert _reserve(client, product_id, 1, ttl_seconds=0).status_code == 422
+    response = client.put(f"/products/{product_id}/stock", json={"on_hand": -1})
+    assert response.status_code == 422
@@ -0,0 +1,73 @@
+from datetime import UTC, datetime
+from typing import Any, List
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+from sqlmodel import Session
+
+from app.models import DeliverySpeed
+from app.responses import ORJSONResponse
+from app.schemas import (
+    ColumnarProductListing,
+    NormalizedProductListing,
+    ProductRead,
+)
+from tests.factories import create_test_product
+
+
+@pytest.mark.parametrize(
+    "url,model",
+    [
+        ("/api/products", List[ProductRead]),
+        (
+            "/api/products?sort=price_asc&include_delivery_summary=false",
+            List[ProductRead],
+        ),
+        ("/products?include_delivery_summary=true", List[ProductRead]),
+        ("/api/products?shape=normalized", NormalizedProductListing),
+        ("/products?shape=normalized", NormalizedProductListing),
+        ("/api/products?shape=columnar", ColumnarProductListing),
+    ],
+)
+def test_listings_match_their_response_model(
+    client: TestClient, session: Session, url: str, model: Any
+):
+    """Test that listings, returned without FastAPI's validation, are what
+    validating them against their response model would have produced"""
+    create_test_product(session, title="  Padded title ", with_image=True)
+
+    response = client.get(url)
+
+    assert response.status_code == 200
+    listing = response.json()
+    adapter: TypeAdapter[Any] = TypeAdapter(model)
+    assert adapter.dump_python(adapter.validate_python(listing), mode="json") == listing
+    assert "  Padded title " not in response.text
+
+
+def test_orjson_response_encoding():
+    content = {
+        "aware": datetime(2026, 1, 2, 3, 4, 5, 600000, tzinfo=UTC),
+        "naive": datetime(2026, 1, 2, 3, 4, 5),
+        "speed": DeliverySpeed.NEXT_DAY,
+        "price": 19.99,
+        "model": ProductRead(
+            id=1,
+            title="Lamp",
+            description="A lamp",
+            price=5.0,
+            category_id=1,
+            created_at=datetime(2026, 1, 1),
+            updated_at=datetime(2026, 1, 1),
+        ),
+    }
+
+    body = orjson.loads(ORJSONResponse(content).body)
+
+    assert body["aware"] == "2026-01-02T03:04:05.600000Z"
+    assert body["naive"] == "2026-01-02T03:04:05"
+    assert body["speed"] == "next_day"
+    assert body["price"] == 19.99
+    assert body["model"]["created_at"] == "2026-01-01T00:00:00"
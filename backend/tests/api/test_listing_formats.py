@@ -0,0 +1,89 @@
+from datetime import UTC, datetime
+
+import msgpack  # type: ignore[import-untyped]
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.models import DeliverySpeed
+from app.responses import accepts_msgpack, dumps, packb
+from tests.factories import create_test_product
+
+MSGPACK = {"Accept": "application/msgpack"}
+
+
+@pytest.mark.parametrize(
+    "url",
+    ["/api/products", "/products?shape=normalized&include_delivery_summary=true"],
+)
+def test_msgpack_listing_matches_json(client: TestClient, session: Session, url: str):
+    """Test that a client accepting MessagePack gets the JSON listing's data"""
+    create_test_product(session, with_image=True)
+
+    response = client.get(url, headers=MSGPACK)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    assert response.headers["vary"] == "Accept"
+    assert msgpack.unpackb(response.content) == client.get(url).json()
+
+
+def test_msgpack_values_match_json():
+    """Test that datetimes, enums and numbers unpack to what orjson writes"""
+    content = {
+        "created_at": datetime(2024, 5, 1, 12, 30, 15, 250000),
+        "updated_at": datetime(2024, 5, 1, 12, 30, tzinfo=UTC),
+        "speed": DeliverySpeed.EXPRESS,
+        "price": 19.99,
+        "id": 7,
+    }
+
+    assert msgpack.unpackb(packb(content)) == orjson.loads(dumps(content))
+
+
+@pytest.mark.parametrize(
+    "accept,expected",
+    [
+        (None, False),
+        ("*/*", False),
+        ("application/json", False),
+        ("application/msgpack", True),
+        ("application/x-msgpack", True),
+        ("application/json;q=0.9, application/msgpack", True),
+        ("application/json, application/msgpack;q=0.5", False),
+        ("application/msgpack;q=0", False),
+    ],
+)
+def test_accepts_msgpack(accept, expected):
+    assert accepts_msgpack(accept) is expected
+
+
+def test_columnar_listing_matches_normalized(client: TestClient, session: Session):
+    """Test that shape=columnar holds the normalized listing, one array per
+    field, with each distinct delivery summary listed once"""
+    create_test_product(session, title="Extra product")
+    normalized = client.get("/api/products?shape=normalized").json()
+
+    response = client.get("/api/products?shape=columnar")
+
+    assert response.status_code == 200
+    listing = response.json()
+    columns = listing["columns"]
+    summaries = listing["delivery_summaries"]
+    assert listing["count"] == len(normalized["products"])
+    assert all(len(column) == listing["count"] for column in columns.values())
+    assert len({tuple(s.values()) for s in summaries}) == len(summaries)
+    products = [
+        {name: column[i] for name, column in columns.items()}
+        for i in range(listing["count"])
+    ]
+    for product in products:
+        index = product["delivery_summary"]
+        product["delivery_summary"] = None if index is None else summaries[index]
+    assert products == normalized["products"]
+    assert listing["categories"] == normalized["categories"]
+    assert listing["delivery_options"] == normalized["delivery_options"]
+
+    packed = client.get("/api/products?shape=columnar", headers=MSGPACK)
+    assert msgpack.unpackb(packed.content)["columns"]["id"] == columns["id"]
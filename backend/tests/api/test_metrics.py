@@ -0,0 +1,137 @@
+import os
+import threading
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app import metrics
+from app.metrics import MetricsRegistry, SnapshotWriter, collect_all
+from tests.factories import create_test_product
+
+
+def _samples(text: str) -> dict:
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_metrics_exposition(client: TestClient):
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    for name in (
+        "http_requests_total",
+        "http_request_duration_seconds",
+        "http_requests_in_progress",
+        "db_pool_connections",
+        "db_pool_checkout_seconds",
+        "threadpool_threads",
+        "cache_lookups_total",
+        "cache_hit_ratio",
+        "image_bytes_total",
+    ):
+        assert f"# TYPE {name} " in text
+    assert 'threadpool_threads{state="waiting"}' in text
+
+
+def test_requests_are_counted_by_route_template(client: TestClient, session: Session):
+    """Test that requests are labelled with their route, not their path"""
+    product = create_test_product(session, with_image=True)
+    before = _samples(client.get("/metrics").text)
+
+    client.get(f"/products/{product.id}")
+    client.get(f"/products/{product.id}/image")
+    client.get("/products/999999")
+
+    after = _samples(client.get("/metrics").text)
+    ok = 'http_requests_total{method="GET",route="/products/{product_id}",status="200"}'
+    missing = ok.replace('"200"', '"404"')
+    assert after[ok] - before.get(ok, 0) == 1
+    assert after[missing] - before.get(missing, 0) == 1
+    count = 'http_request_duration_seconds_count{method="GET",route="/products/{product_id}/image"}'
+    assert after[count] - before.get(count, 0) == 1
+    served = 'image_bytes_total{format="jpeg",kind="served"}'
+    assert after[served] > before.get(served, 0)
+
+
+def test_histogram_rendering():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", ("route",), (0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(seconds, "/x")
+
+    samples = _samples(registry.render(registry.collect()))
+
+    assert samples['latency_seconds_bucket{route="/x",le="0.1"}'] == 2
+    assert samples['latency_seconds_bucket{route="/x",le="1.0"}'] == 3
+    assert samples['latency_seconds_bucket{route="/x",le="+Inf"}'] == 4
+    assert samples['latency_seconds_count{route="/x"}'] == 4
+    assert samples['latency_seconds_sum{route="/x"}'] == 3.65
+
+
+def test_counters_sum_across_threads():
+    """Test that per-thread shards add up at scrape time"""
+    registry = MetricsRegistry()
+    hits = registry.counter("hits_total", "Hits", ("kind",))
+
+    def work():
+        for _ in range(1000):
+            hits.inc("a")
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    hits.inc("b", amount=2)
+
+    snapshot = registry.collect()
+    assert snapshot.counters[("hits_total", ("a",))] == 4000
+    assert snapshot.counters[("hits_total", ("b",))] == 2
+
+
+def test_shards_of_exited_threads_are_folded():
+    """Test that short-lived threads don't each leave a shard behind"""
+    registry = MetricsRegistry()
+    hits = registry.counter("hits_total", "Hits")
+    latency = registry.histogram("latency_seconds", "Latency", (), (1.0,))
+
+    def work():
+        hits.inc()
+        latency.observe(0.5)
+
+    for _ in range(200):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+
+    snapshot = registry.collect()
+    assert snapshot.counters[("hits_total", ())] == 200
+    assert snapshot.histograms[("latency_seconds", ())] == [200, 0, 100.0]
+    assert registry._shards == []
+    # Counted once, however often it's scraped
+    assert registry.collect().counters[("hits_total", ())] == 200
+
+
+def test_worker_snapshots_are_merged(tmp_path: Path, monkeypatch):
+    """Test that a scrape adds other workers' counters, but only live
+    workers' gauges"""
+    dead_pid = 2**22 + 1  # Above Linux's default pid_max
+    for pid in (os.getppid(), dead_pid):
+        monkeypatch.setattr(os, "getpid", lambda pid=pid: pid)
+        SnapshotWriter(tmp_path, interval=60).write()
+    monkeypatch.undo()
+
+    own = metrics.registry.collect()
+    merged = collect_all(tmp_path)
+
+    key = ("db_pool_checkouts_total", ())
+    assert merged.counters[key] == 3 * own.counters[key]
+    gauge = ("db_pool_connections", ("size",))
+    assert merged.gauges[gauge] == 2 * own.gauges[gauge]
@@ -0,0 +1,194 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, func, select
+
+from app.models import IdempotencyKey, Order, Product
+from app.schemas import OrderRead
+from tests.factories import (
+    create_standard_delivery_options,
+    create_test_category,
+    create_test_product,
+)
+
+
+@pytest.fixture
+def order_products(session: Session) -> list[Product]:
+    """Two products that both ship standard ($25 minimum) and express"""
+    standard, express, next_day, _ = create_standard_delivery_options(session)
+    category = create_test_category(session)
+    first = create_test_product(session, category.id, price=10.05)
+    second = create_test_product(session, category.id, price=4.99)
+    first.delivery_options = [standard, express, next_day]
+    second.delivery_options = [standard, express]
+    session.add(first)
+    session.add(second)
+    session.commit()
+    return [first, second]
+
+
+def _place(client: TestClient, body: dict, key: str | None = None):
+    headers = {"Idempotency-Key": key} if key else {}
+    return client.post("/api/orders", json=body, headers=headers)
+
+
+def _body(products: list[Product], *quantities: int, **fields) -> dict:
+    items = [
+        {"product_id": product.id, "quantity": quantity}
+        for product, quantity in zip(products, quantities)
+    ]
+    return {"items": items, **fields}
+
+
+def _orders_with_key(session: Session, key: str) -> int:
+    return session.exec(
+        select(func.count())
+        .select_from(IdempotencyKey)
+        .where(IdempotencyKey.key == key)
+    ).one()
+
+
+def test_place_order(client: TestClient, order_products: list[Product]):
+    key = str(uuid.uuid4())
+
+    response = _place(client, _body(order_products, 3, 1), key)
+
+    assert response.status_code == 201
+    assert "Idempotent-Replayed" not in response.headers
+    order = response.json()
+    assert [(line["product_id"], line["line_total"]) for line in order["lines"]] == [
+        (order_products[0].id, 30.15),
+        (order_products[1].id, 4.99),
+    ]
+    assert order["item_count"] == 4
+    assert (order["subtotal"], order["delivery_price"], order["total"]) == (
+        35.14,
+        0,
+        35.14,
+    )
+    # Returned without FastAPI's validation, so check it matches the model
+    assert OrderRead.model_validate(order).model_dump(mode="json") == order
+    assert client.get(f"/api/orders/{order['id']}").json() == order
+
+
+def test_retried_order_is_replayed(
+    client: TestClient, session: Session, order_products: list[Product]
+):
+    key = str(uuid.uuid4())
+    body = _body(order_products, 1, 2)
+    placed = _place(client, body, key)
+
+    retried = _place(client, body, key)
+
+    assert retried.status_code == 201
+    assert retried.headers["Idempotent-Replayed"] == "true"
+    assert retried.json() == placed.json()
+    assert _orders_with_key(session, key) == 1
+    assert session.get(Order, placed.json()["id"]) is not None
+
+
+def test_key_cannot_be_reused_for_another_order(
+    client: TestClient, order_products: list[Product]
+):
+    key = str(uuid.uuid4())
+    placed = _place(client, _body(order_products, 1, 2), key).json()
+
+    response = _place(client, _body(order_products, 1, 3), key)
+
+    assert response.status_code == 422
+    assert response.json()["detail"] == (
+        "Idempotency-Key was already used for a different order"
+    )
+    assert client.get(f"/api/orders/{placed['id']}").json()["item_count"] == 3
+
+
+def test_order_with_delivery_option(client: TestClient, order_products: list[Product]):
+    options = {option.name: option for option in order_products[0].delivery_options}
+    standard = options["Standard Shipping"]
+
+    order = _place(
+        client,
+        _body(order_products, 3, 1, delivery_option_id=standard.id),
+        str(uuid.uuid4()),
+    ).json()
+    assert order["delivery_option_id"] == standard.id
+    assert order["total"] == round(35.14 + standard.price, 2)
+
+    # Below standard's minimum
+    response = _place(
+        client,
+        _body(order_products, 1, 1, delivery_option_id=standard.id),
+        str(uuid.uuid4()),
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Order is below the delivery option's minimum"
+
+    # Next day only ships the first product
+    response = _place(
+        client,
+        _body(order_products, 3, 1, delivery_option_id=options["Next Day Delivery"].id),
+        str(uuid.uuid4()),
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Delivery option not available for this order"
+
+
+def test_order_errors(client: TestClient, order_products: list[Product]):
+    body = _body(order_products, 1, 1)
+
+    response = _place(client, body)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Idempotency-Key header is required"
+    assert _place(client, body, "k" * 256).status_code == 422
+
+    response = _place(
+        client,
+        {"items": [{"product_id": 999999, "quantity": 1}]},
+        str(uuid.uuid4()),
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Products not found: 999999"
+    assert _place(client, {"items": []}, str(uuid.uuid4())).status_code == 422
+    assert client.get("/api/orders/999999").status_code == 404
+
+
+def test_orders_take_tracked_stock(
+    client: TestClient, session: Session, order_products: list[Product]
+):
+    """Test that orders can't take more units than are available, counting
+    reserved ones, while untracked products aren't limited"""
+    first, second = order_products
+    client.put(f"/products/{first.id}/stock", json={"on_hand": 4})
+    client.post(f"/products/{first.id}/reservations", json={"quantity": 1})
+
+    placed = _place(client, _body(order_products, 2, 50), str(uuid.uuid4()))
+    assert placed.status_code == 201
+    assert client.get(f"/products/{first.id}/stock").json()["on_hand"] == 2
+
+    key = str(uuid.uuid4())
+    response = _place(client, _body(order_products, 2, 1), key)
+    assert response.status_code == 409
+    assert response.json()["detail"] == (
+        f"Insufficient stock for product {first.id}: 1 available"
+    )
+    assert _orders_with_key(session, key) == 0
+    stock = client.get(f"/products/{first.id}/stock").json()
+    assert (stock["on_hand"], stock["available"]) == (2, 1)
+
+
+def test_placing_a_large_order_runs_seven_queries(
+    client: TestClient, session: Session, query_budget
+):
+    category = create_test_category(session)
+    products = [
+        create_test_product(session, category.id, price=1.25) for _ in range(40)
+    ]
+
+    response = _place(client, _body(products * 5, *[2] * 200), str(uuid.uuid4()))
+
+    assert response.status_code == 201
+    assert response.json()["subtotal"] == 500.0
+    # Key lookup, products, then the order, its key, lapsed holds, stock
+    # levels (none tracked here) and its lines
+    query_budget(response, 7)
@@ -0,0 +1,143 @@
+import io
+
+import pytest
+from PIL import Image
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app import placeholders
+from app.placeholders import PlaceholderCache, placeholder_cache
+from tests.factories import create_test_category, create_test_product
+
+
+@pytest.fixture(autouse=True)
+def clear_placeholder_cache():
+    placeholder_cache.clear()
+    yield
+    placeholder_cache.clear()
+
+
+def test_placeholder_product_serves_rendered_image(
+    client: TestClient, session: Session
+):
+    """Test that a placeholder product gets an image rendered on request"""
+    product = create_test_product(session, placeholder=True)
+
+    response = client.get(f"/products/{product.id}/image")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    image = Image.open(io.BytesIO(response.content))
+    assert image.size == (placeholders.PLACEHOLDER_SIZE, placeholders.PLACEHOLDER_SIZE)
+    assert product.image_blob_id is None
+
+
+def test_placeholder_product_has_image_url(client: TestClient, session: Session):
+    """Test that listings link to the placeholder like any other image"""
+    product = create_test_product(session, placeholder=True)
+
+    response = client.get(f"/products/{product.id}")
+
+    assert response.json()["image_url"] == f"/products/{product.id}/image"
+
+
+def test_placeholder_renders_natively_at_requested_width(
+    client: TestClient, session: Session
+):
+    """Test that wide placeholders are drawn at size rather than upscaled"""
+    product = create_test_product(session, placeholder=True)
+
+    response = client.get(f"/products/{product.id}/image?w=1200&fmt=webp")
+
+    assert response.status_code == 200
+    image = Image.open(io.BytesIO(response.content))
+    assert (image.format, image.size) == ("WEBP", (1200, 1200))
+
+
+def test_placeholder_renders_are_cached(client: TestClient, session: Session):
+    """Test that repeat requests are served from the placeholder cache"""
+    product = create_test_product(session, placeholder=True)
+    misses, hits = placeholder_cache.misses, placeholder_cache.hits
+
+    first = client.get(f"/products/{product.id}/image?w=150")
+    second = client.get(f"/products/{product.id}/image?w=150")
+
+    assert first.content == second.content
+    assert placeholder_cache.misses - misses == 1
+    assert placeholder_cache.hits - hits == 1
+
+
+def test_placeholder_cache_shared_by_matching_products(
+    client: TestClient, session: Session
+):
+    """Test that products with the same title and category share a render"""
+    category = create_test_category(session)
+    first = create_test_product(
+        session, category_id=category.id, title="Same", placeholder=True
+    )
+    second = create_test_product(
+        session, category_id=category.id, title="Same", placeholder=True
+    )
+    misses = placeholder_cache.misses
+
+    client.get(f"/products/{first.id}/image")
+    client.get(f"/products/{second.id}/image")
+
+    assert placeholder_cache.misses - misses == 1
+    assert len(placeholder_cache) == 1
+
+
+def test_head_placeholder_image(client: TestClient, session: Session):
+    """Test that HEAD reports the rendered placeholder's length"""
+    product = create_test_product(session, placeholder=True)
+
+    head = client.head(f"/products/{product.id}/image")
+    get = client.get(f"/products/{product.id}/image")
+
+    assert head.status_code == 200
+    assert head.headers["content-length"] == str(len(get.content))
+
+
+def test_product_without_image_or_placeholder_returns_404(
+    client: TestClient, session: Session
+):
+    """Test that only flagged products get a placeholder"""
+    product = create_test_product(session)
+
+    response = client.get(f"/products/{product.id}/image")
+
+    assert response.status_code == 404
+
+
+def test_placeholder_cache_evicts_least_recently_used():
+    """Test that the cache stays within its byte budget"""
+    cache = PlaceholderCache(max_bytes=1)
+    cache.get_or_render("A", None, 150, "png")
+    cache.get_or_render("B", None, 150, "png")
+
+    # Each render alone exceeds the budget, so at most the newest could remain
+    assert len(cache) == 0
+    assert cache.total_bytes == 0
+
+    cache = PlaceholderCache(max_bytes=10 * 1024 * 1024)
+    cache.get_or_render("A", None, 150, "png")
+    cache.get_or_render("B", None, 150, "png")
+    cache.get_or_render("A", None, 150, "png")
+    assert (cache.misses, cache.hits, len(cache)) == (2, 1, 2)
+
+
+def test_fonts_are_loaded_once_per_size(monkeypatch):
+    """Test that the font lookup isn't repeated for every render"""
+    placeholders._load_font.cache_clear()
+    calls = []
+    real_truetype = placeholders.ImageFont.truetype
+
+    def counting_truetype(*args, **kwargs):
+        calls.append(args)
+        return real_truetype(*args, **kwargs)
+
+    monkeypatch.setattr(placeholders.ImageFont, "truetype", counting_truetype)
+    for title in ("One", "Two", "Three"):
+        placeholders.render_placeholder_image(title, "Cat", 300, "png")
+
+    assert calls.count(("Arial", 16)) == 1
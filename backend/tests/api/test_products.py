@@ -351,3 +351,38 @@ def test_product_search_functionality(client: TestClient, session: Session):
     else:
         # Search not implemented, skip this test
         pytest.skip("Search functionality not implemented")
+
+
+def test_normalized_listing_matches_nested(client: TestClient, session: Session):
+    """Test that shape=normalized carries the same data with categories and
+    delivery options sent once"""
+    nested = client.get("/api/products").json()
+
+    response = client.get("/api/products?shape=normalized")
+
+    assert response.status_code == 200
+    listing = response.json()
+    categories = {c["id"]: c for c in listing["categories"]}
+    options = {o["id"]: o for o in listing["delivery_options"]}
+    assert len(categories) == len(listing["categories"])
+    assert set(categories) == {p["category"]["id"] for p in nested}
+    assert len(listing["products"]) == len(nested)
+    for product, expected in zip(listing["products"], nested):
+        assert "category" not in product
+        assert categories[product["category_id"]] == expected["category"]
+        assert set(product["delivery_option_ids"]) <= set(options)
+        assert product["delivery_summary"] == expected["delivery_summary"]
+        assert product == {
+            **{k: v for k, v in expected.items() if k != "category"},
+            "delivery_option_ids": product["delivery_option_ids"],
+        }
+
+
+def test_normalized_listing_without_delivery_summary(client: TestClient):
+    listing = client.get(
+        "/products?shape=normalized&include_delivery_summary=false"
+    ).json()
+
+    assert listing["delivery_options"] == []
+    assert all(p["delivery_option_ids"] is None for p in listing["products"])
+    assert client.get("/products?shape=flat").status_code == 422
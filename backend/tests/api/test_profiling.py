@@ -0,0 +1,122 @@
+import contextvars
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import profiling
+from app.profiling import RequestProfile, profile_store, profiled_thread
+
+TOKEN = "test-profile-token"
+
+
+@pytest.fixture
+def profiling_on(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", TOKEN)
+    monkeypatch.setattr(profiling, "PROFILE_INTERVAL_MS", 0.2)
+    monkeypatch.setattr(profile_store, "directory", tmp_path)
+
+
+def test_profiling_is_off_without_a_token(client: TestClient):
+    response = client.get("/api/products", headers={"X-Profile-Token": "anything"})
+
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert client.get("/admin/profiles").status_code == 404
+
+
+def test_flagged_request_is_profiled(client: TestClient, profiling_on):
+    """Test that a request with the token stores a collapsed-stack profile"""
+    response = client.get(
+        "/api/products?sort=delivery_fastest", headers={"X-Profile-Token": TOKEN}
+    )
+
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-Id"]
+
+    profile = client.get(
+        f"/admin/profiles/{profile_id}", headers={"X-Profile-Token": TOKEN}
+    )
+    assert profile.status_code == 200
+    for line in profile.text.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack.split(";")[0] in ("event-loop", "worker")
+        assert int(count) > 0
+
+    [listed] = [
+        p
+        for p in client.get(
+            "/admin/profiles", headers={"X-Profile-Token": TOKEN}
+        ).json()["profiles"]
+        if p["id"] == profile_id
+    ]
+    assert listed["path"] == "/api/products"
+    assert listed["query"] == "sort=delivery_fastest"
+    # Reading profiles doesn't add any
+    assert "X-Profile-Id" not in profile.headers
+
+
+def test_query_flag_needs_the_header_token(client: TestClient, profiling_on):
+    """Test that ?profile only flags the request; the token isn't read from it"""
+    response = client.get(f"/api/products?profile={TOKEN}")
+    assert response.status_code == 403
+    assert response.json()["detail"] == (
+        "Profiling needs the token in an X-Profile-Token header"
+    )
+
+    response = client.get(
+        "/api/products?profile&sort=price_asc", headers={"X-Profile-Token": TOKEN}
+    )
+    [listed] = [
+        p for p in profile_store.list() if p["id"] == response.headers["X-Profile-Id"]
+    ]
+    assert listed["query"] == "sort=price_asc"
+
+    response = client.get("/api/products?profile=0")
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+
+
+def test_invalid_tokens_are_rejected(client: TestClient, profiling_on):
+    assert (
+        client.get("/api/products", headers={"X-Profile-Token": "wrong"}).status_code
+        == 403
+    )
+    assert client.get("/admin/profiles").status_code == 403
+    assert (
+        client.get(
+            "/admin/profiles/missing", headers={"X-Profile-Token": TOKEN}
+        ).status_code
+        == 404
+    )
+
+
+def test_request_profile_samples_registered_threads():
+    profile = RequestProfile(interval=0.0005)
+    token = profiling._current.set(profile)
+
+    def busy_work():
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+
+    def worker():
+        with profiled_thread():
+            busy_work()
+
+    # Like run_in_threadpool, the worker sees the request's context
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(worker,))
+    profile.start()
+    try:
+        thread.start()
+        thread.join()
+    finally:
+        profile.stop()
+        profiling._current.reset(token)
+
+    assert profile.samples > 0
+    assert any(
+        stack.startswith("worker;") and stack.endswith("busy_work")
+        for stack in profile.stacks
+    )
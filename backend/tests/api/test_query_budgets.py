@@ -0,0 +1,134 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+
+from app import query_stats
+from app.models import Category, Product
+from app.query_stats import count_queries
+from tests.factories import create_test_category, create_test_product
+
+# Statements each read endpoint may run, however many rows it returns
+READ_BUDGETS = [
+    ("/categories", 1),
+    ("/api/categories", 1),
+    ("/categories/{category_id}", 2),
+    ("/api/delivery-options", 1),
+    ("/api/products", 2),
+    ("/api/products?sort=price_asc&include_delivery_summary=false", 1),
+    ("/api/products?sort=delivery_fastest", 2),
+    ("/api/products?categoryId={category_id}&deliveryOptionId=1", 2),
+    ("/api/products?deliveryOptionId=1&sort=delivery_fastest", 2),
+    ("/products", 1),
+    ("/products?category_id={category_id}&include_delivery_summary=true", 2),
+    ("/products/{product_id}", 3),
+    ("/products/{product_id}/image", 3),
+]
+
+
+@pytest.fixture
+def populated_category(session: Session) -> Category:
+    category = create_test_category(session)
+    for _ in range(3):
+        create_test_product(session, category_id=category.id, with_image=True)
+    return category
+
+
+def _url(template: str, category: Category) -> str:
+    return template.format(category_id=category.id, product_id=category.products[0].id)
+
+
+@pytest.mark.parametrize("template,budget", READ_BUDGETS)
+def test_read_endpoints_stay_within_query_budget(
+    client: TestClient,
+    query_budget,
+    populated_category: Category,
+    template: str,
+    budget: int,
+):
+    """Test each endpoint's statement count against its budget"""
+    response = client.get(_url(template, populated_category))
+
+    assert response.status_code == 200
+    query_budget(response, budget)
+
+
+@pytest.mark.parametrize("template,budget", READ_BUDGETS)
+def test_query_count_does_not_grow_with_rows(
+    client: TestClient,
+    session: Session,
+    populated_category: Category,
+    template: str,
+    budget: int,
+):
+    """Test that adding products doesn't add queries (no N+1)"""
+    url = _url(template, populated_category)
+    before = int(client.get(url).headers["X-Query-Count"])
+
+    for _ in range(5):
+        create_test_product(session, category_id=populated_category.id, with_image=True)
+
+    assert int(client.get(url).headers["X-Query-Count"]) == before
+
+
+def test_write_endpoints_stay_within_query_budget(
+    client: TestClient, query_budget, populated_category: Category
+):
+    created = query_budget(
+        client.post(
+            "/products",
+            json={
+                "title": "Budgeted",
+                "description": "Counts its queries",
+                "price": 5.0,
+                "category_id": populated_category.id,
+            },
+        ),
+        3,
+    ).json()
+    query_budget(client.put(f"/products/{created['id']}", json={"price": 6.0}), 3)
+    query_budget(client.delete(f"/products/{created['id']}"), 3)
+
+
+def test_query_time_header_is_reported(client: TestClient):
+    response = client.get("/categories")
+
+    assert int(response.headers["X-Query-Count"]) == 1
+    assert response.headers["X-Query-Time"].endswith("ms")
+    assert client.get("/health").headers["X-Query-Count"] == "0"
+
+
+def test_query_headers_are_off_by_default(client: TestClient, monkeypatch):
+    monkeypatch.setattr(query_stats, "QUERY_HEADERS_ENABLED", False)
+
+    response = client.get("/categories")
+
+    assert response.status_code == 200
+    assert "X-Query-Count" not in response.headers
+    assert "X-Query-Time" not in response.headers
+
+
+def test_count_queries_records_statements(session: Session):
+    """Test the counter outside a request, with statement capture"""
+    with count_queries(record_statements=True) as stats:
+        session.exec(select(Product).limit(1)).all()
+        session.exec(select(Category).limit(1)).all()
+
+    assert stats.count == 2
+    assert stats.seconds > 0
+    assert "FROM products" in stats.statements[0]
+
+    session.exec(select(Product).limit(1)).all()
+    assert stats.count == 2  # Not counted once the context exits
+
+
+def test_failed_statement_leaves_no_start_time(session: Session):
+    with count_queries() as stats:
+        with pytest.raises(OperationalError):
+            session.connection().execute(text("SELECT * FROM no_such_table"))
+        session.rollback()
+        session.exec(select(Product).limit(1)).all()
+
+        assert stats.count == 1
+        assert "query_start" not in session.connection().info
@@ -0,0 +1,91 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app import request_timing
+from app.request_timing import TimingStats, timing_stats
+from tests.factories import create_test_product
+
+
+def _server_timing(header: str) -> dict:
+    phases = {}
+    for entry in header.split(", "):
+        name, duration = entry.split(";dur=")
+        phases[name] = float(duration)
+    return phases
+
+
+@pytest.fixture
+def timing(monkeypatch):
+    monkeypatch.setattr(request_timing, "TIMING_ENABLED", True)
+    timing_stats.reset()
+    yield
+    timing_stats.reset()
+
+
+def test_server_timing_is_off_by_default(client: TestClient):
+    response = client.get("/api/products")
+
+    assert "Server-Timing" not in response.headers
+    assert client.get("/timings").json() == {"enabled": False, "routes": {}}
+
+
+def test_server_timing_reports_phases(client: TestClient, timing):
+    """Test that a listing reports each phase of the request"""
+    response = client.get("/api/products")
+
+    assert response.status_code == 200
+    phases = _server_timing(response.headers["Server-Timing"])
+    assert set(phases) == {
+        "db",
+        "orm",
+        "summary",
+        "handler",
+        "validate",
+        "render",
+        "total",
+    }
+    assert phases["db"] <= phases["orm"] <= phases["handler"] <= phases["total"]
+    assert phases["handler"] + phases["validate"] + phases["render"] <= (
+        phases["total"] + 0.01
+    )
+
+
+def test_streamed_responses_are_timed_without_render(
+    client: TestClient, session: Session, timing
+):
+    product = create_test_product(session, with_image=True)
+
+    response = client.get(f"/products/{product.id}/image")
+
+    phases = _server_timing(response.headers["Server-Timing"])
+    assert {"handler", "total"} <= set(phases)
+    assert "render" not in phases
+
+
+def test_timings_are_aggregated_per_route(client: TestClient, timing):
+    """Test that /timings summarises requests by route template"""
+    for product_id in (1, 2, 3):
+        client.get(f"/products/{product_id}")
+    client.get("/api/products?include_delivery_summary=false")
+
+    routes = client.get("/timings").json()["routes"]
+
+    detail = routes["GET /products/{product_id}"]
+    assert detail["total"]["count"] == 3
+    assert detail["db"]["count"] == 3
+    assert detail["total"]["p50_ms"] <= detail["total"]["max_ms"]
+    assert "summary" not in routes["GET /api/products"]
+
+
+def test_timing_stats_summary():
+    stats = TimingStats(samples=3)
+    for seconds in (0.001, 0.002, 0.010, 0.003):
+        stats.record("GET /x", {"total": seconds})
+
+    [summary] = stats.snapshot()["GET /x"].values()
+
+    assert summary["count"] == 4
+    assert summary["mean_ms"] == 4.0
+    assert summary["max_ms"] == 10.0
+    assert summary["p50_ms"] == 3.0  # Of the 3 most recent samples
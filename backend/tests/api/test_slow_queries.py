@@ -0,0 +1,134 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main
+from app import profiling, slow_queries
+from app.slow_queries import (
+    SlowQueryLog,
+    fingerprint,
+    normalize_statement,
+    slow_query_log,
+)
+
+
+TOKEN = "slow-query-test-token"
+ADMIN = {"X-Admin-Token": TOKEN}
+
+
+@pytest.fixture(autouse=True)
+def admin_token(monkeypatch):
+    monkeypatch.setattr(app.main, "ADMIN_TOKEN", TOKEN)
+
+
+@pytest.fixture
+def log_every_query(monkeypatch):
+    monkeypatch.setattr(slow_queries, "SLOW_QUERY_MS", 0.000001)
+    slow_query_log.reset()
+    yield
+    slow_query_log.reset()
+
+
+def test_slow_queries_are_logged_with_plans(client: TestClient, log_every_query):
+    """Test that a listing's statements are aggregated with their plans"""
+    for _ in range(2):
+        client.get("/api/products?sort=price_asc&deliveryOptionId=1")
+
+    response = client.get("/admin/slow-queries?order_by=count", headers=ADMIN)
+
+    assert response.status_code == 200
+    queries = response.json()["queries"]
+    listing = next(q for q in queries if "ORDER BY products.price" in q["statement"])
+    assert listing["count"] == 2
+    assert listing["max_ms"] <= listing["total_ms"]
+    # Bound values can be customer data
+    assert "last_parameters" not in listing
+    assert any("SCAN" in line or "SEARCH" in line for line in listing["plan"])
+
+
+def test_explain_is_not_counted_as_a_request_query(client: TestClient, log_every_query):
+    before = client.get("/categories").headers["X-Query-Count"]
+
+    slow_query_log.reset()
+    response = client.get("/categories")
+
+    assert response.headers["X-Query-Count"] == before == "1"
+    assert slow_query_log.top(10)[0]["plan"]
+
+
+def test_fast_queries_are_not_logged(client: TestClient, monkeypatch):
+    monkeypatch.setattr(slow_queries, "SLOW_QUERY_MS", 60_000)
+    slow_query_log.reset()
+
+    client.get("/api/products")
+
+    assert client.get("/admin/slow-queries", headers=ADMIN).json()["queries"] == []
+
+
+def test_reset(client: TestClient, log_every_query):
+    client.get("/categories")
+
+    assert client.delete("/admin/slow-queries", headers=ADMIN).status_code == 200
+    assert slow_query_log.top(10) == []
+
+
+def test_slow_query_endpoints_need_the_token(
+    client: TestClient, log_every_query, monkeypatch
+):
+    client.get("/categories")
+
+    for method in ("GET", "DELETE"):
+        response = client.request(method, "/admin/slow-queries")
+        assert response.status_code == 403
+        response = client.request(
+            method, "/admin/slow-queries", headers={"X-Admin-Token": "wrong"}
+        )
+        assert response.status_code == 403
+    assert slow_query_log.top(10)
+
+    monkeypatch.setattr(app.main, "ADMIN_TOKEN", "")
+    assert client.get("/admin/slow-queries", headers=ADMIN).status_code == 404
+
+
+def test_slow_query_log_does_not_need_profiling(
+    client: TestClient, log_every_query, monkeypatch
+):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "")
+    client.get("/categories")
+
+    response = client.get("/admin/slow-queries", headers=ADMIN)
+
+    assert response.status_code == 200
+    assert response.json()["queries"]
+    # The profiling token doesn't open the admin endpoints
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", TOKEN)
+    assert (
+        client.get(
+            "/admin/slow-queries", headers={"X-Profile-Token": TOKEN}
+        ).status_code
+        == 403
+    )
+
+
+def test_fingerprints_ignore_literals_and_in_list_length():
+    assert (
+        normalize_statement(
+            "SELECT *  FROM t\n WHERE a = 'x''y' AND b > 3.5 AND c IN (?, ?, ?)"
+        )
+        == "SELECT * FROM t WHERE a = ? AND b > ? AND c IN (?, ...)"
+    )
+    assert fingerprint("SELECT * FROM t WHERE id IN (?, ?)") == fingerprint(
+        "SELECT * FROM t WHERE id IN (?,?,?,?)"
+    )
+    assert fingerprint("SELECT anon_1 FROM t") != fingerprint("SELECT anon_2 FROM t")
+
+
+def test_log_keeps_the_costliest_fingerprints():
+    log = SlowQueryLog(capacity=2)
+    log.record("SELECT a FROM t", 0.5, [])
+    log.record("SELECT b FROM t", 0.1, [])
+    log.record("SELECT c FROM t", 0.3, [])
+
+    assert [q["statement"] for q in log.top(10)] == [
+        "SELECT a FROM t",
+        "SELECT c FROM t",
+    ]
@@ -2,7 +2,10 @@ import pytest
 import tempfile
 import os
 import sys
+import threading
 from pathlib import Path
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
 from sqlmodel import Session, create_engine
 from fastapi.testclient import TestClient
 
@@ -10,10 +13,18 @@ from fastapi.testclient import TestClient
 backend_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(backend_dir))
 
+# Keep rendered image variants out of the shared temp cache
+os.environ.setdefault("IMAGE_CACHE_DIR", tempfile.mkdtemp(prefix="image-variants-"))
+# Run image work inline; tests/test_image_pipeline.py covers the process pool
+os.environ.setdefault("IMAGE_PROCESS_WORKERS", "0")
+# Report X-Query-Count / X-Query-Time, which query budgets are checked with
+os.environ.setdefault("QUERY_HEADERS", "1")
+
 from app.main import app  # noqa: E402
-from app.db import get_session  # noqa: E402
+from app.db import SQLITE_CONNECT_ARGS, get_session  # noqa: E402
 from app.models import SQLModel  # noqa: E402
 from app.seed import seed_database  # noqa: E402
+from tests.fake_image_server import FakeImageServer  # noqa: E402
 
 
 @pytest.fixture(scope="session")
@@ -55,3 +66,72 @@ def client(test_db):
         yield client
 
     app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def query_budget():
+    """Check a response against a budget of SQL statements (X-Query-Count),
+    so handlers that start querying per row fail here"""
+
+    def check(response, max_queries: int):
+        count = int(response.headers["X-Query-Count"])
+        request = response.request
+        assert count <= max_queries, (
+            f"{request.method} {request.url.path} ran {count} SQL statements, "
+            f"budget is {max_queries}"
+        )
+        return response
+
+    return check
+
+
+@pytest.fixture
+def fake_image_server():
+    """Local image host so ingestion tests don't touch the network"""
+    with FakeImageServer() as server:
+        yield server
+
+
+@pytest.fixture
+def wal_engine(tmp_path):
+    """A file database in WAL mode with a connection per session, as under
+    concurrent requests"""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'concurrent.db'}",
+        connect_args=SQLITE_CONNECT_ARGS,
+        poolclass=NullPool,
+    )
+
+    @event.listens_for(engine, "connect")
+    def wal(dbapi_connection, _):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def run_concurrently():
+    """Start that many threads at once, each running work(i), and wait for
+    them all; fails with the errors any raised"""
+
+    def run(workers: int, work):
+        start = threading.Barrier(workers)
+        errors = []
+
+        def run_one(i: int) -> None:
+            start.wait()
+            try:
+                work(i)
+            except BaseException as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=run_one, args=(i,)) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors, errors[:3]
+
+    return run
@@ -4,6 +4,7 @@ from PIL import Image
 from sqlmodel import Session
 from app.models import Category, Product, DeliveryOption, DeliverySpeed
 from app.schemas import CategoryCreate
+from app.crud import get_product_image_data, store_image_blob
 
 
 def create_test_category(session: Session, name: Optional[str] = None) -> Category:
@@ -29,6 +30,7 @@ def create_test_product(
     title: Optional[str] = None,
     price: Optional[float] = None,
     with_image: bool = False,
+    placeholder: bool = False,
 ) -> Product:
     """Create a test product with configurable options"""
     if category_id is None:
@@ -55,9 +57,10 @@ def create_test_product(
     )
 
     if with_image:
-        product.image_data = generate_test_image()
+        product.image_blob_id = store_image_blob(session, generate_test_image())
         product.image_mime_type = "image/jpeg"
         product.image_filename = f"test_{title.replace(' ', '_').lower()}.jpg"
+    product.image_is_placeholder = placeholder
 
     session.add(product)
     session.commit()
@@ -65,6 +68,11 @@ def create_test_product(
     return product
 
 
+def get_stored_image(session: Session, product: Product) -> bytes:
+    """The image bytes stored for a product (b"" if it has none)"""
+    return get_product_image_data(session, product.id or 0) or b""
+
+
 def generate_test_image(width: int = 300, height: int = 300) -> bytes:
     """Generate a small test image as bytes"""
     img = Image.new("RGB", (width, height), color=(128, 128, 128))
@@ -0,0 +1,136 @@
+"""
+Local HTTP server that serves generated product images, so image ingestion
+can be tested and benchmarked without network access.
+
+    with FakeImageServer(latency=0.05) as server:
+        url = server.url_for(1)           # 200 with a PNG
+        missing = server.url_for(2, status=404)
+"""
+
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image
+
+
+class _ImageRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can reuse connections
+    protocol_version = "HTTP/1.1"
+    server: "_ImageHTTPServer"
+
+    def do_GET(self):
+        fake = self.server.fake
+        fake._request_started()
+        try:
+            if fake.latency:
+                time.sleep(fake.latency)
+
+            query = parse_qs(urlsplit(self.path).query)
+            status = int(query.get("status", ["200"])[0])
+            if status != 200:
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            body = fake.image_bytes
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            fake._request_finished()
+
+    def log_message(self, format, *args):
+        pass  # Keep test output quiet
+
+
+class _ImageHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    fake: "FakeImageServer"
+
+    def get_request(self):
+        request = super().get_request()
+        self.fake._connection_opened()
+        return request
+
+
+class FakeImageServer:
+    """Serves the same generated JPEG at every path, with optional latency.
+
+    Tracks request and connection counts plus peak concurrency so tests can
+    check keep-alive reuse and per-host limits.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        image_size: int = 300,
+        image_bytes: Optional[bytes] = None,
+    ):
+        self.latency = latency
+        self.image_bytes = image_bytes or _generate_jpeg(image_size)
+        self.requests = 0
+        self.connections = 0
+        self.max_concurrent = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._server: Optional[_ImageHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        assert self._server is not None, "server not started"
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def url_for(self, image_id: int, status: int = 200) -> str:
+        url = f"{self.base_url}/img/{image_id}.jpg"
+        return url if status == 200 else f"{url}?status={status}"
+
+    def start(self) -> "FakeImageServer":
+        self._server = _ImageHTTPServer(("127.0.0.1", 0), _ImageRequestHandler)
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeImageServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _connection_opened(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def _request_started(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self._in_flight += 1
+            self.max_concurrent = max(self.max_concurrent, self._in_flight)
+
+    def _request_finished(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+
+def _generate_jpeg(size: int) -> bytes:
+    # A gradient compresses like a photo rather than a flat colour
+    image = Image.linear_gradient("L").resize((size, size)).convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
@@ -0,0 +1,152 @@
+import io
+import json
+from pathlib import Path
+
+import pytest
+from sqlalchemy import Engine
+from sqlmodel import Session, SQLModel, col, create_engine, func, select
+
+from app.bulk_seed import bulk_seed_database, iter_json_array, iter_products_file
+from app.image_ingest import ImageFetcher
+from app.models import Category, DeliveryOption, Product, ProductDeliveryLink
+from app.seed import (
+    assign_delivery_options_to_products,
+    seed_categories,
+    seed_delivery_options,
+    seed_products,
+)
+from tests.fake_image_server import FakeImageServer
+
+
+def _catalog(count: int, image: str = "") -> list[dict]:
+    return [
+        {
+            "id": i,
+            "title": f"Bulk Product {i}",
+            "description": "Loaded in bulk, with a ] and a { in the text",
+            "price": 10 + i / 100,
+            "category": f"category {i % 3}",
+            "image": image,
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def _links(session: Session) -> set[tuple[int, str]]:
+    links = set()
+    for product_id, name in session.exec(
+        select(ProductDeliveryLink.product_id, DeliveryOption.name).join(DeliveryOption)
+    ):
+        assert product_id is not None
+        links.add((product_id, name))
+    return links
+
+
+@pytest.fixture
+def db_engine(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'store.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_iter_json_array_streams_across_chunks():
+    """Test that items split over read boundaries are parsed intact"""
+    products = _catalog(50)
+
+    parsed = list(iter_json_array(io.StringIO(json.dumps(products, indent=2)), 7))
+
+    assert parsed == products
+
+
+def test_iter_json_array_rejects_truncated_input():
+    """Test that a cut-off file fails loudly instead of loading half a catalog"""
+    text = json.dumps(_catalog(3))[:-20]
+
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), 16))
+
+
+def test_iter_products_file_reads_json_lines(tmp_path: Path):
+    """Test that JSON Lines files are accepted as well as arrays"""
+    path = tmp_path / "catalog.jsonl"
+    path.write_text("\n".join(json.dumps(p) for p in _catalog(5)) + "\n\n")
+
+    assert [p["id"] for p in iter_products_file(path)] == [1, 2, 3, 4, 5]
+
+
+def test_bulk_seed_matches_orm_seeder(db_engine: Engine, tmp_path: Path):
+    """Test that the bulk load writes what the regular seeder would"""
+    products = _catalog(30)
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps(products))
+
+    report = bulk_seed_database(db_engine, path, with_images=False, batch_size=7)
+
+    assert (report.products_read, report.products_inserted) == (30, 30)
+    assert report.categories_created == 3
+
+    orm_engine = create_engine(f"sqlite:///{tmp_path / 'orm.db'}")
+    SQLModel.metadata.create_all(orm_engine)
+    with Session(orm_engine) as session:
+        category_map = seed_categories(session, products)
+        seed_products(session, products, category_map)
+        assign_delivery_options_to_products(session, seed_delivery_options(session))
+        expected_links = _links(session)
+    orm_engine.dispose()
+
+    with Session(db_engine) as session:
+        assert _links(session) == expected_links
+        assert report.links_inserted == len(expected_links)
+        product = session.get(Product, 12)
+        assert product is not None
+        assert (product.title, product.price) == ("Bulk Product 12", 10.12)
+        assert product.category is not None
+        assert product.category.name == "category 0"
+        assert product.created_at is not None
+        option = session.exec(
+            select(DeliveryOption).where(DeliveryOption.name == "Standard Shipping")
+        ).one()
+        assert (option.min_order_amount, option.is_active) == (25.0, True)
+
+
+def test_bulk_seed_rerun_is_idempotent(db_engine: Engine, tmp_path: Path):
+    """Test that loading the same file twice adds nothing the second time"""
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps(_catalog(10)))
+
+    bulk_seed_database(db_engine, path, with_images=False)
+    report = bulk_seed_database(db_engine, path, with_images=False)
+
+    assert (report.products_inserted, report.categories_created) == (0, 0)
+    with Session(db_engine) as session:
+        assert session.exec(select(func.count()).select_from(Product)).one() == 10
+        assert session.exec(select(func.count()).select_from(Category)).one() == 3
+        assert session.exec(select(func.count()).select_from(DeliveryOption)).one() == 4
+        assert len(_links(session)) == report.links_inserted
+
+
+def test_bulk_seed_fetches_only_missing_images(
+    db_engine: Engine, tmp_path: Path, fake_image_server: FakeImageServer
+):
+    """Test that images are downloaded once, and failed ones are retried"""
+    products = _catalog(4, image=fake_image_server.url_for(1))
+    products[3]["image"] = fake_image_server.url_for(2, status=500)
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps(products))
+    fetcher = ImageFetcher(max_workers=2)
+
+    first = bulk_seed_database(db_engine, path, fetcher=fetcher)
+    second = bulk_seed_database(db_engine, path, fetcher=fetcher)
+
+    assert (first.images_requested, second.images_requested) == (4, 1)
+    assert fake_image_server.requests == 5
+    with Session(db_engine) as session:
+        stored = session.exec(select(Product).order_by(col(Product.id))).all()
+        assert [p.image_blob_id is not None for p in stored] == [
+            True,
+            True,
+            True,
+            False,
+        ]
+        assert stored[3].image_is_placeholder
@@ -0,0 +1,84 @@
+import argparse
+from collections import Counter
+from pathlib import Path
+
+import pytest
+from sqlmodel import Session, col, create_engine, func, select
+
+from app.generate_catalog import (
+    CATEGORY_NAMES,
+    generate_catalog_database,
+    generate_products,
+    parse_count,
+)
+from app.models import DeliveryOption, ImageBlob, Product, ProductDeliveryLink
+
+
+def test_generation_is_deterministic_per_seed():
+    """Test that a seed always yields the same catalog, and seeds differ"""
+    first = list(generate_products(200, seed=7))
+
+    assert first == list(generate_products(200, seed=7))
+    assert first != list(generate_products(200, seed=8))
+    assert [p["id"] for p in first] == list(range(1, 201))
+
+
+def test_generated_distributions_look_like_a_store():
+    """Test the category skew and the delivery option mix"""
+    products = list(generate_products(5000))
+    categories = Counter(p["category"] for p in products)
+    options = Counter(name for p in products for name in p["delivery_options"])
+
+    assert categories.most_common(1)[0][0] == CATEGORY_NAMES[0]
+    assert categories[CATEGORY_NAMES[0]] > 3 * categories[CATEGORY_NAMES[10]]
+    assert 0.95 < options["Standard Shipping"] / 5000 < 0.99
+    assert 0.25 < options["Next Day Delivery"] / 5000 < 0.35
+    assert all(p["delivery_options"] for p in products)
+    assert all(
+        "Next Day Delivery" in p["delivery_options"]
+        for p in products
+        if "Same Day Delivery" in p["delivery_options"]
+    )
+    assert all(p["price"] >= 0.99 for p in products)
+
+
+def test_parse_count_accepts_standard_sizes():
+    assert [parse_count(v) for v in ("10k", "100K", "1m", "2500")] == [
+        10_000,
+        100_000,
+        1_000_000,
+        2500,
+    ]
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_count("lots")
+
+
+def test_generate_catalog_database_with_images(tmp_path: Path):
+    """Test that the catalog, its delivery links and shared images are stored"""
+    db_engine = create_engine(f"sqlite:///{tmp_path / 'catalog.db'}")
+    products = list(generate_products(30, seed=3))
+
+    report = generate_catalog_database(
+        db_engine, 30, seed=3, images=True, image_size=64, image_variety=4
+    )
+
+    assert report.products_inserted == 30
+    assert report.links_inserted == sum(len(p["delivery_options"]) for p in products)
+    with Session(db_engine) as session:
+        links = session.exec(
+            select(ProductDeliveryLink.product_id, DeliveryOption.name).join(
+                DeliveryOption
+            )
+        ).all()
+        assert sorted(links) == sorted(
+            (p["id"], name) for p in products for name in p["delivery_options"]
+        )
+        # Slot = id % 4 over ids 1..30
+        assert session.exec(select(ImageBlob.ref_count)).all() == [7, 8, 8, 7]
+        assert (
+            session.exec(
+                select(func.count()).where(col(Product.image_width) == 64)
+            ).one()
+            == 30
+        )
+    db_engine.dispose()
@@ -0,0 +1,130 @@
+import io
+from pathlib import Path
+
+import pytest
+from PIL import Image, ImageFilter
+from sqlalchemy import Engine
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app import crud
+from app.crud import store_image_blob
+from app.images import hamming_distance, perceptual_hash
+from app.maintenance import dedupe_images, find_near_duplicates
+from app.models import ImageBlob, Product
+from tests.factories import create_test_product, generate_test_image
+
+
+def _photo(blur: float = 0) -> bytes:
+    image = Image.radial_gradient("L").resize((200, 200)).convert("RGB")
+    if blur:
+        image = image.filter(ImageFilter.GaussianBlur(blur))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _blob(session: Session, blob_id: int) -> ImageBlob:
+    session.expire_all()
+    blob = session.get(ImageBlob, blob_id)
+    assert blob is not None
+    return blob
+
+
+@pytest.fixture
+def db_engine(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'store.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_identical_images_are_stored_once(session: Session):
+    """Test that products with the same photo share one reference-counted blob"""
+    data = generate_test_image(width=123, height=45)
+    first = create_test_product(session)
+    second = create_test_product(session)
+
+    for product in (first, second):
+        product.image_blob_id = store_image_blob(session, data)
+        session.add(product)
+    session.commit()
+
+    assert first.image_blob_id == second.image_blob_id
+    assert _blob(session, first.image_blob_id or 0).ref_count == 2
+    assert crud.get_product_image_data(session, second.id or 0) == data
+
+
+def test_unreferenced_blobs_are_dropped(session: Session):
+    """Test that replacing or deleting the last user of an image removes it"""
+    data = generate_test_image(width=77, height=77)
+    first = create_test_product(session)
+    second = create_test_product(session)
+    blob_id = store_image_blob(session, data)
+    for product in (first, second):
+        product.image_blob_id = blob_id
+        session.add(product)
+    session.commit()
+
+    crud.delete_product(session, first.id or 0)
+    assert _blob(session, blob_id).ref_count == 1
+
+    second.image_blob_id = store_image_blob(session, generate_test_image(80, 80))
+    session.add(second)
+    session.commit()
+    session.expire_all()
+    assert session.get(ImageBlob, blob_id) is None
+
+
+def test_perceptual_hash_matches_near_duplicates():
+    """Test that a blurred copy hashes close to the original, unlike others"""
+    original = perceptual_hash(Image.open(io.BytesIO(_photo())))
+    blurred = perceptual_hash(Image.open(io.BytesIO(_photo(blur=2))))
+    different = perceptual_hash(Image.linear_gradient("L"))
+
+    assert hamming_distance(original, blurred) <= 4
+    assert hamming_distance(original, different) > 16
+
+
+def test_find_near_duplicates_groups_within_distance():
+    """Test that grouping is transitive and respects the distance"""
+    hashes = {
+        1: "ffffffffffffffff",
+        2: "fffffffffffffffe",  # 1 bit from 1
+        3: "fffffffffffffffc",  # 1 bit from 2
+        4: "0000000000000000",
+    }
+
+    assert find_near_duplicates(hashes, max_distance=1) == [[1, 2, 3]]
+    assert find_near_duplicates(hashes, max_distance=0) == []
+
+
+def test_dedupe_images_removes_orphans_and_merges(db_engine: Engine):
+    """Test the maintenance pass on a database with waste in it"""
+    with Session(db_engine) as session:
+        original, blurred = _photo(), _photo(blur=2)
+        keep_id = store_image_blob(
+            session, original, perceptual_hash(Image.open(io.BytesIO(original)))
+        )
+        near_id = store_image_blob(
+            session, blurred, perceptual_hash(Image.open(io.BytesIO(blurred)))
+        )
+        store_image_blob(session, b"orphan" * 1000)  # Never attached
+        for blob_id in (keep_id, near_id):
+            product = create_test_product(session)
+            product.image_blob_id = blob_id
+            session.add(product)
+        session.commit()
+
+    report = dedupe_images(db_engine, max_distance=4, merge=True)
+
+    assert report.orphans_removed == 1
+    assert report.orphan_bytes == 6000
+    assert report.near_duplicate_groups == [[keep_id, near_id]]
+    assert report.merged_blobs == 1
+    assert (report.blobs_before, report.blobs_after) == (3, 1)
+    assert report.shared_bytes == len(max(original, blurred, key=len))
+
+    with Session(db_engine) as session:
+        blob_ids = set(session.exec(select(Product.image_blob_id)).all())
+        assert len(blob_ids) == 1
+        assert session.exec(select(ImageBlob.ref_count)).one() == 2
@@ -0,0 +1,87 @@
+import io
+import os
+import time
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from app import image_pipeline
+from app.image_pipeline import SHARED_MEMORY_THRESHOLD, ImagePipeline
+
+
+def _jpeg(size: int) -> bytes:
+    # Noise doesn't compress, so the encoded size tracks the pixel count
+    image = Image.frombytes("RGB", (size, size), os.urandom(size * size * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope="module")
+def pipeline():
+    pipeline = ImagePipeline(max_workers=2)
+    yield pipeline
+    pipeline.shutdown()
+
+
+def test_pipeline_encodes_small_input_in_worker(pipeline: ImagePipeline):
+    """Test that small inputs are pickled to a worker and come back as PNG"""
+    data = _jpeg(64)
+    assert len(data) < SHARED_MEMORY_THRESHOLD
+
+    image = pipeline.encode_png(data).result(timeout=30)
+
+    assert Image.open(io.BytesIO(image.data)).format == "PNG"
+    assert (image.width, image.height) == (64, 64)
+
+
+def test_pipeline_passes_large_input_through_shared_memory(
+    pipeline: ImagePipeline, monkeypatch
+):
+    """Test that large inputs go through a shared segment that is cleaned up"""
+    created = []
+    real_shared_memory = image_pipeline.SharedMemory
+
+    def recording_shared_memory(*args, **kwargs):
+        segment = real_shared_memory(*args, **kwargs)
+        created.append(segment.name)
+        return segment
+
+    monkeypatch.setattr(image_pipeline, "SharedMemory", recording_shared_memory)
+    data = _jpeg(600)
+    assert len(data) >= SHARED_MEMORY_THRESHOLD
+
+    variant = pipeline.render_variant(data, 150, "webp").result(timeout=30)
+
+    image = Image.open(io.BytesIO(variant))
+    assert (image.format, image.width) == ("WEBP", 150)
+    assert len(created) == 1
+
+    # The segment is unlinked by a done-callback, which can trail result()
+    segment_path = Path("/dev/shm") / created[0].lstrip("/")
+    deadline = time.monotonic() + 5
+    while segment_path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not segment_path.exists()
+
+
+def test_pipeline_propagates_worker_errors(pipeline: ImagePipeline):
+    """Test that undecodable input fails the future rather than the pool"""
+    with pytest.raises(OSError):
+        pipeline.encode_png(b"not an image").result(timeout=30)
+
+    # The pool is still usable afterwards
+    assert pipeline.encode_png(_jpeg(32)).result(timeout=30)
+
+
+def test_inline_pipeline_runs_without_workers():
+    """Test that max_workers=0 runs operations in-process with the same API"""
+    inline = ImagePipeline(max_workers=0)
+
+    future = inline.render_variant(_jpeg(400), 300, "png")
+
+    assert future.done()
+    assert Image.open(io.BytesIO(future.result())).width == 300
+    with pytest.raises(OSError):
+        inline.encode_png(b"garbage").result()
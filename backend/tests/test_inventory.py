@@ -0,0 +1,174 @@
+import random
+import sqlite3
+from datetime import timedelta
+from typing import List
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+
+from app import inventory
+from app.inventory import InsufficientStock, ReservationNotHeld
+from app.models import ReservationStatus, StockReservation
+from tests.factories import create_test_product
+
+STOCK = 100
+
+
+@pytest.fixture
+def product_id(wal_engine) -> int:
+    with Session(wal_engine) as session:
+        product_id = create_test_product(session).id
+        assert product_id is not None
+        inventory.set_stock(session, product_id, STOCK)
+    return product_id
+
+
+def _stock(engine, product_id: int):
+    with Session(engine) as session:
+        level = inventory.get_stock(session, product_id)
+        assert level is not None
+        return level
+
+
+def test_concurrent_reservations_never_oversell(
+    wal_engine, product_id: int, run_concurrently
+):
+    """Test that 500 reservers racing for 100 units, wanting 1-3 each, get
+    exactly the units there are and never more"""
+    granted: List[StockReservation] = []
+    refused: List[int] = []
+
+    def reserve(i: int) -> None:
+        quantity = i % 3 + 1
+        with Session(wal_engine) as session:
+            try:
+                granted.append(inventory.reserve(session, product_id, quantity))
+            except InsufficientStock:
+                refused.append(quantity)
+
+    run_concurrently(500, reserve)
+
+    level = _stock(wal_engine, product_id)
+    held = sum(reservation.quantity for reservation in granted)
+    assert len(granted) + len(refused) == 500
+    assert level.on_hand == STOCK
+    assert level.reserved == held <= STOCK
+    # Stock only fell, so the last refusal left fewer units than it wanted
+    assert refused and level.available < max(refused)
+
+
+def test_concurrent_commits_releases_and_reservations(
+    wal_engine, product_id: int, run_concurrently
+):
+    """Test that stock stays consistent while reservations are committed,
+    released and taken at once, and each is settled only once"""
+    with Session(wal_engine) as session:
+        initial = [inventory.reserve(session, product_id, 1) for _ in range(60)]
+    settled: List[ReservationStatus] = []
+    granted: List[StockReservation] = []
+
+    def work(i: int) -> None:
+        with Session(wal_engine) as session:
+            if i < 120:
+                # Two workers race to settle each initial reservation
+                reservation = initial[i % 60]
+                settle = (
+                    inventory.commit_reservation
+                    if i % 2
+                    else inventory.release_reservation
+                )
+                try:
+                    result = settle(session, reservation.id)
+                    assert result is not None
+                    settled.append(result.status)
+                except ReservationNotHeld:
+                    pass
+            else:
+                try:
+                    granted.append(inventory.reserve(session, product_id, 2))
+                except InsufficientStock:
+                    pass
+
+    run_concurrently(300, work)
+
+    level = _stock(wal_engine, product_id)
+    committed = settled.count(ReservationStatus.COMMITTED)
+    assert len(settled) == 60
+    assert level.on_hand == STOCK - committed
+    assert level.reserved == 2 * len(granted)
+    assert 0 <= level.available < 2
+
+
+def test_expired_reservations_return_to_stock(wal_engine, product_id: int, monkeypatch):
+    with Session(wal_engine) as session:
+        lapsing = inventory.reserve(session, product_id, 40, ttl_seconds=60)
+        inventory.reserve(session, product_id, 50)
+        with pytest.raises(InsufficientStock):
+            inventory.reserve(session, product_id, 20)
+
+        later = inventory._now() + timedelta(seconds=61)
+        monkeypatch.setattr(inventory, "_now", lambda: later)
+
+        level = inventory.get_stock(session, product_id)
+        assert level is not None and level.available == 50
+        current = inventory.get_reservation(session, lapsing.id)
+        assert current is not None and current.status == ReservationStatus.EXPIRED
+        with pytest.raises(ReservationNotHeld):
+            inventory.commit_reservation(session, lapsing.id)
+
+        inventory.reserve(session, product_id, 20)
+        level = inventory.get_stock(session, product_id)
+        assert level is not None
+        assert (level.on_hand, level.reserved) == (STOCK, 70)
+
+
+def test_zero_ttl_is_not_the_default(wal_engine, product_id: int):
+    with Session(wal_engine) as session:
+        reservation = inventory.reserve(session, product_id, 10, ttl_seconds=0)
+        assert reservation.expires_at == reservation.created_at
+
+        current = inventory.get_reservation(session, reservation.id)
+        assert current is not None and current.status == ReservationStatus.EXPIRED
+        assert _stock(wal_engine, product_id).available == STOCK
+
+
+def test_stock_cannot_be_set_below_reserved_units(wal_engine, product_id: int):
+    with Session(wal_engine) as session:
+        inventory.reserve(session, product_id, 30)
+
+        with pytest.raises(InsufficientStock):
+            inventory.set_stock(session, product_id, 29)
+        assert inventory.set_stock(session, product_id, 30).available == 0
+
+
+def test_locked_writes_are_retried(wal_engine, product_id: int, monkeypatch):
+    monkeypatch.setattr(random, "uniform", lambda a, b: 0)
+    attempts = []
+    real_return_lapsed = inventory._return_lapsed
+
+    def locked_twice(conn, *args):
+        attempts.append(1)
+        if len(attempts) <= 2:
+            raise OperationalError(
+                "UPDATE", {}, sqlite3.OperationalError("database is locked")
+            )
+        return real_return_lapsed(conn, *args)
+
+    monkeypatch.setattr(inventory, "_return_lapsed", locked_twice)
+    with Session(wal_engine) as session:
+        reservation = inventory.reserve(session, product_id, 5)
+
+    assert len(attempts) == 3
+    assert reservation.status == ReservationStatus.HELD
+    assert _stock(wal_engine, product_id).reserved == 5
+
+
+def test_untracked_products_cannot_be_reserved(wal_engine):
+    with Session(wal_engine) as session:
+        product_id = create_test_product(session).id
+        assert product_id is not None
+
+        assert inventory.get_stock(session, product_id) is None
+        with pytest.raises(InsufficientStock):
+            inventory.reserve(session, product_id, 3)
@@ -0,0 +1,82 @@
+from typing import Dict, List
+
+import pytest
+from sqlmodel import Session, func, select
+
+from app import inventory, orders
+from app.inventory import InsufficientStock
+from app.models import Order, OrderLine
+from app.schemas import CartItem, OrderCreate
+from tests.factories import create_test_product
+
+
+@pytest.fixture
+def order(wal_engine) -> OrderCreate:
+    items = []
+    with Session(wal_engine) as session:
+        for _ in range(3):
+            product = create_test_product(session, price=2.5)
+            assert product.id is not None
+            items.append(CartItem(product_id=product.id, quantity=2))
+    return OrderCreate(items=items)
+
+
+def _count(engine, model) -> int:
+    with Session(engine) as session:
+        return session.exec(select(func.count()).select_from(model)).one()
+
+
+def test_racing_retries_place_one_order(wal_engine, order, run_concurrently):
+    """Test that 50 requests sent at once with one Idempotency-Key place a
+    single order, and all get it back"""
+    placed: List[Dict] = []
+    replayed: List[bool] = []
+
+    def place(i: int) -> None:
+        with Session(wal_engine) as session:
+            result, was_replayed = orders.place_order(session, "retried", order)
+            placed.append(result)
+            replayed.append(was_replayed)
+
+    run_concurrently(50, place)
+
+    assert replayed.count(False) == 1
+    assert all(result == placed[0] for result in placed)
+    assert _count(wal_engine, Order) == 1
+    assert _count(wal_engine, OrderLine) == 3
+
+
+def test_concurrent_orders_are_all_placed(wal_engine, order, run_concurrently):
+    def place(i: int) -> None:
+        with Session(wal_engine) as session:
+            result, replayed = orders.place_order(session, f"order-{i}", order)
+            assert not replayed and result["total"] == 15.0
+
+    run_concurrently(100, place)
+
+    assert _count(wal_engine, Order) == 100
+    assert _count(wal_engine, OrderLine) == 300
+
+
+def test_concurrent_orders_never_oversell(wal_engine, order, run_concurrently):
+    """Test that 100 orders racing for 60 units of a product, 2 each, place
+    exactly 30 orders"""
+    product_id = order.items[0].product_id
+    with Session(wal_engine) as session:
+        inventory.set_stock(session, product_id, 60)
+    refused: List[int] = []
+
+    def place(i: int) -> None:
+        with Session(wal_engine) as session:
+            try:
+                orders.place_order(session, f"stocked-{i}", order)
+            except InsufficientStock as exc:
+                refused.append(exc.available)
+
+    run_concurrently(100, place)
+
+    assert _count(wal_engine, Order) == 30
+    assert len(refused) == 70 and set(refused) == {0}
+    with Session(wal_engine) as session:
+        level = inventory.get_stock(session, product_id)
+        assert level is not None and level.on_hand == 0
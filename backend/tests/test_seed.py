@@ -0,0 +1,132 @@
+import io
+import time
+
+from PIL import Image
+from sqlmodel import Session, col, select
+
+from app.image_ingest import ImageFetcher
+from app.models import Product
+from app.seed import seed_products
+from tests.factories import create_test_category
+from tests.fake_image_server import FakeImageServer
+
+
+def _product_data(product_id: int, category: str, image: str) -> dict:
+    return {
+        "id": product_id,
+        "title": f"Seeded Product {product_id}",
+        "description": "Seeded from the fake image server",
+        "price": 19.99,
+        "category": category,
+        "image": image,
+    }
+
+
+def test_fetcher_downloads_concurrently(fake_image_server: FakeImageServer):
+    """Test that image downloads overlap instead of running one at a time"""
+    fake_image_server.latency = 0.1
+    fetcher = ImageFetcher(max_workers=10, per_host_limit=10)
+    jobs = [(i, fake_image_server.url_for(i)) for i in range(20)]
+
+    start = time.perf_counter()
+    results = list(fetcher.fetch_all(jobs))
+    elapsed = time.perf_counter() - start
+
+    assert sorted(r.product_id for r in results) == list(range(20))
+    assert all(r.error is None for r in results)
+    assert elapsed < 20 * 0.1 / 2  # Well under the sequential time
+    assert fake_image_server.max_concurrent > 1
+
+
+def test_fetcher_reencodes_images_as_png(fake_image_server: FakeImageServer):
+    """Test that fetched images come back validated and re-encoded as PNG"""
+    fetcher = ImageFetcher(max_workers=2)
+
+    [result] = list(fetcher.fetch_all([(1, fake_image_server.url_for(1))]))
+
+    assert result.image is not None
+    assert Image.open(io.BytesIO(result.image.data)).format == "PNG"
+    assert (result.image.width, result.image.height) == (300, 300)
+    assert result.image.preview.startswith("data:image/webp;base64,")
+
+
+def test_fetcher_respects_per_host_limit(fake_image_server: FakeImageServer):
+    """Test that no more than per_host_limit requests hit one host at once"""
+    fake_image_server.latency = 0.05
+    fetcher = ImageFetcher(max_workers=10, per_host_limit=3)
+
+    list(fetcher.fetch_all([(i, fake_image_server.url_for(i)) for i in range(15)]))
+
+    assert fake_image_server.max_concurrent <= 3
+
+
+def test_fetcher_reuses_connections(fake_image_server: FakeImageServer):
+    """Test that downloads share keep-alive connections"""
+    fetcher = ImageFetcher(max_workers=4, per_host_limit=4)
+
+    list(fetcher.fetch_all([(i, fake_image_server.url_for(i)) for i in range(40)]))
+
+    assert fake_image_server.requests == 40
+    assert fake_image_server.connections <= 4
+
+
+def test_fetcher_reports_failures(fake_image_server: FakeImageServer):
+    """Test that HTTP errors and undecodable bodies are reported, not raised"""
+    fetcher = ImageFetcher(max_workers=2)
+    jobs = [
+        (1, fake_image_server.url_for(1, status=404)),
+        (2, fake_image_server.url_for(2)),
+    ]
+
+    results = {r.product_id: r for r in fetcher.fetch_all(jobs)}
+
+    assert results[1].image is None
+    assert results[1].error is not None and "404" in results[1].error
+    assert results[2].image is not None
+
+    fake_image_server.image_bytes = b"not an image"
+    [corrupt] = list(fetcher.fetch_all([(3, fake_image_server.url_for(3))]))
+    assert corrupt.image is None
+    assert corrupt.error is not None
+
+
+def test_seed_products_stores_images_and_placeholders(
+    session: Session, fake_image_server: FakeImageServer
+):
+    """Test that seeding stores downloaded PNGs and flags failures as placeholders"""
+    category = create_test_category(session)
+    category_map = {category.name: category.id}
+    products = [
+        _product_data(9001, category.name, fake_image_server.url_for(1)),
+        _product_data(9002, category.name, fake_image_server.url_for(2, status=500)),
+    ]
+
+    seed_products(session, products, category_map, ImageFetcher(max_workers=2))
+    session.expire_all()
+
+    stored = {
+        p.id: p
+        for p in session.exec(
+            select(Product).where(col(Product.id).in_([9001, 9002]))
+        ).all()
+    }
+    assert stored[9001].image_mime_type == "image/png"
+    assert stored[9001].image_filename == "product_9001.png"
+    assert not stored[9001].image_is_placeholder
+    assert stored[9001].image_preview
+    assert stored[9002].image_is_placeholder
+    assert stored[9002].image_blob_id is None
+
+
+def test_seed_products_skips_existing_products(
+    session: Session, fake_image_server: FakeImageServer
+):
+    """Test that re-seeding doesn't download images for existing products"""
+    category = create_test_category(session)
+    products = [_product_data(9101, category.name, fake_image_server.url_for(1))]
+    fetcher = ImageFetcher(max_workers=2)
+
+    seed_products(session, products, {category.name: category.id}, fetcher)
+    seed_products(session, products, {category.name: category.id}, fetcher)
+
+    assert fake_image_server.requests == 1
@@ -29,6 +29,9 @@ export interface Product {
   created_at: string
   updated_at: string
   image_url?: string
+  image_width?: number
+  image_height?: number
+  image_preview?: string // data: URI of a tiny thumbnail to show while loading
   category?: Category
   delivery_summary?: DeliverySummary
 }